@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.rollups import roll_up
+
+
+def day(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"{value} is not a YYYY-MM-DD date.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll up the borrowings of every complete day after the last run into "
+        "the usage statistics. --since rebuilds from an earlier day."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=day)
+        parser.add_argument("--until", type=day, help="Yesterday by default.")
+
+    def handle(self, *args, **options):
+        result = roll_up(since=options["since"], until=options["until"])
+        self.stdout.write(
+            f"Rolled up {result['days']} days into {result['rows']} rows."
+        )
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db import models
+
+from books.models import Book
+
+
+class Period(models.TextChoices):
+    DAY = "DAY"
+    MONTH = "MONTH"
+
+
+class Usage(models.Model):
+    """Borrowings started and returned over one day or one calendar month.
+
+    loan_days is the total length of the loans returned in the period.
+    A MONTH row is the sum of the month's DAY rows.
+    """
+
+    period = models.CharField(max_length=5, choices=Period.choices)
+    start = models.DateField()
+    borrowed = models.PositiveIntegerField(default=0)
+    returned = models.PositiveIntegerField(default=0)
+    returned_late = models.PositiveIntegerField(default=0)
+    loan_days = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class BookUsage(Usage):
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "period", "start"], name="book_usage_once_per_period"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["period", "start", "book"], name="book_usage_period_idx"
+            ),
+        ]
+
+
+class UserUsage(Usage):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "period", "start"], name="user_usage_once_per_period"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["period", "start", "user"], name="user_usage_period_idx"
+            ),
+        ]
+
+
+class Watermark(models.Model):
+    """The last day a batch job has processed."""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    day = models.DateField()
+
+    def __str__(self):
+        return f"{self.name}: {self.day}"
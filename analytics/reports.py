@@ -0,0 +1,103 @@
+"""Usage statistics over a range of days, read from the rollups only."""
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import F, FloatField, Q, Sum
+from django.db.models.functions import Cast, NullIf
+
+from analytics.models import BookUsage, Period, UserUsage
+from books.models import Book
+from borrowings.fees import month_bounds
+
+
+def covering(start: date, end: date) -> Q:
+    """Usage rows that add up to the days start to end.
+
+    Whole months are read from MONTH rows and the days around them from DAY
+    rows, so a year is at most 12 rows per book plus two partial months.
+    """
+    first_month = start if start.day == 1 else month_bounds(start)[1]
+    last_month = month_bounds(end + timedelta(days=1))[0]
+    if first_month >= last_month:
+        return Q(period=Period.DAY, start__range=(start, end))
+    return (
+        Q(period=Period.DAY, start__gte=start, start__lt=first_month)
+        | Q(period=Period.MONTH, start__gte=first_month, start__lt=last_month)
+        | Q(period=Period.DAY, start__gte=last_month, start__lte=end)
+    )
+
+
+def ratio(numerator, denominator):
+    return Cast(Sum(numerator), FloatField()) / NullIf(
+        Cast(Sum(denominator), FloatField()), 0.0
+    )
+
+
+TOTALS = {
+    "borrowings": Sum("borrowed"),
+    "returns": Sum("returned"),
+    "late_returns": Sum("returned_late"),
+    "average_loan_days": ratio("loan_days", "returned"),
+    "overdue_rate": ratio("returned_late", "returned"),
+}
+
+
+def top(model, start, end, key, ordering, limit) -> list[dict]:
+    descending = ordering.startswith("-")
+    order = F(ordering.lstrip("-"))
+    rows = (
+        model.objects.filter(covering(start, end))
+        .order_by()
+        .values(key)
+        .annotate(**TOTALS)
+        .order_by(
+            order.desc(nulls_last=True) if descending else order.asc(nulls_last=True),
+            key,
+        )[:limit]
+    )
+    return [rounded(row) for row in rows]
+
+
+def rounded(row: dict) -> dict:
+    for name in ("average_loan_days", "overdue_rate"):
+        if row[name] is not None:
+            row[name] = round(row[name], 3)
+    return row
+
+
+def book_usage(start, end, ordering, limit) -> list[dict]:
+    rows = top(BookUsage, start, end, "book_id", ordering, limit)
+    books = Book.objects.only("title", "author").in_bulk(
+        [row["book_id"] for row in rows]
+    )
+    usage = []
+    for row in rows:
+        book = books[row.pop("book_id")]
+        usage.append(
+            {"book": book.id, "title": book.title, "author": book.author, **row}
+        )
+    return usage
+
+
+def author_usage(start, end, ordering, limit) -> list[dict]:
+    rows = top(BookUsage, start, end, "book__author", ordering, limit)
+    return [{"author": row.pop("book__author"), **row} for row in rows]
+
+
+def user_usage(start, end, ordering, limit) -> list[dict]:
+    rows = top(UserUsage, start, end, "user_id", ordering, limit)
+    emails = dict(
+        get_user_model()
+        .objects.filter(id__in=[row["user_id"] for row in rows])
+        .values_list("id", "email")
+    )
+    usage = []
+    for row in rows:
+        user = row.pop("user_id")
+        usage.append({"user": user, "email": emails[user], **row})
+    return usage
+
+
+def summary(start, end, **ranking) -> dict:
+    """Totals of the whole library; there is nothing to rank."""
+    return rounded(BookUsage.objects.filter(covering(start, end)).aggregate(**TOTALS))
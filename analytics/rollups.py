@@ -0,0 +1,155 @@
+"""Daily and monthly usage rollups of borrowings, kept by a nightly job.
+
+Each complete day after the watermark gets a DAY row per book and per user
+with the borrowings started and returned that day, computed by the
+database in one INSERT ... SELECT. The MONTH row of each month rolled up is
+then recomputed from its DAY rows. Rolling up a day again replaces its
+rows, so a run can be repeated or overlap another safely.
+
+Today is left out until it is over and shows up in the next run.
+Borrowings edited after their day was rolled up are only picked up by a
+rebuild from an earlier day.
+"""
+from datetime import date, timedelta
+
+from django.db import connections, transaction
+from django.db.models import Count, DateField, F, Min, Q, Sum, Value
+
+from analytics.models import BookUsage, Period, UserUsage, Watermark
+from borrowings.fees import DaysBetween, month_bounds
+from borrowings.models import Borrowing
+
+USAGE_COLUMNS = (
+    "period", "start", "borrowed", "returned", "returned_late", "loan_days"
+)
+COUNTS = USAGE_COLUMNS[2:]
+WATERMARK = "usage"
+
+
+def day_events(key, low, high):
+    """Borrowings started and returned from low to high, per day and key."""
+    borrowings = Borrowing.objects.order_by()
+    zero = Value(0)
+    started = (
+        borrowings.filter(borrow_date__range=(low, high))
+        .values(event_day=F("borrow_date"), event_key=F(key))
+        .annotate(
+            borrowed=Count("id"), returned=zero, returned_late=zero, loan_days=zero
+        )
+    )
+    ended = (
+        borrowings.filter(actual_return_date__range=(low, high))
+        .values(event_day=F("actual_return_date"), event_key=F(key))
+        .annotate(
+            borrowed=zero,
+            returned=Count("id"),
+            returned_late=Count(
+                "id", filter=Q(actual_return_date__gt=F("expected_return_date"))
+            ),
+            loan_days=Sum(DaysBetween("actual_return_date", "borrow_date")),
+        )
+    )
+    return started.union(ended, all=True)
+
+
+def insert_rows(model, columns, sql, params) -> int:
+    connection = connections[model.objects.db]
+    quote = connection.ops.quote_name
+    names = ", ".join(quote(model._meta.get_field(name).column) for name in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(model._meta.db_table)} ({names}) {sql}", params
+        )
+        return cursor.rowcount
+
+
+def insert_days(model, key, low, high) -> int:
+    events = day_events(key, low, high)
+    sql, params = events.query.get_compiler(events.db).as_sql()
+    sums = ", ".join(f"SUM({name})" for name in COUNTS)
+    return insert_rows(
+        model,
+        (key, *USAGE_COLUMNS),
+        f"SELECT event_key, %s, event_day, {sums} FROM ({sql}) events "
+        f"GROUP BY event_key, event_day",
+        (Period.DAY.value, *params),
+    )
+
+
+def insert_month(model, key, month: date) -> int:
+    start, end = month_bounds(month)
+    totals = (
+        model.objects.filter(period=Period.DAY, start__gte=start, start__lt=end)
+        .order_by()
+        .values(key)
+        .annotate(
+            month_period=Value(Period.MONTH.value),
+            month_start=Value(start, output_field=DateField()),
+            **{f"month_{name}": Sum(name) for name in COUNTS},
+        )
+        .values_list(
+            key, "month_period", "month_start", *(f"month_{name}" for name in COUNTS)
+        )
+    )
+    sql, params = totals.query.get_compiler(totals.db).as_sql()
+    return insert_rows(model, (key, *USAGE_COLUMNS), sql, params)
+
+
+def roll_up_days(low: date, high: date) -> int:
+    """Recompute the usage rows of the days low to high, all in one month.
+
+    Returns the number of rows written.
+    """
+    written = 0
+    for model, key in ((BookUsage, "book"), (UserUsage, "user")):
+        model.objects.filter(period=Period.DAY, start__range=(low, high)).delete()
+        written += insert_days(model, key, low, high)
+        model.objects.filter(period=Period.MONTH, start=low.replace(day=1)).delete()
+        written += insert_month(model, key, low)
+    return written
+
+
+def month_spans(first: date, last: date):
+    """(low, high) day ranges covering first to last, one per month."""
+    while first <= last:
+        end = month_bounds(first)[1]
+        yield first, min(last, end - timedelta(days=1))
+        first = end
+
+
+def rolled_up_to() -> date | None:
+    return (
+        Watermark.objects.filter(name=WATERMARK).values_list("day", flat=True).first()
+    )
+
+
+def roll_up(since: date = None, until: date = None) -> dict:
+    """Roll up the days after the watermark, or from since, to until.
+
+    until defaults to yesterday. With no watermark the first run starts at
+    the oldest borrowing. Each month is rolled up in its own transaction
+    that moves the watermark forward. Returns the days rolled up and the
+    rows written.
+    """
+    until = until or date.today() - timedelta(days=1)
+    if since is None:
+        watermark = rolled_up_to()
+        if watermark is not None:
+            since = watermark + timedelta(days=1)
+        else:
+            since = Borrowing.objects.aggregate(first=Min("borrow_date"))["first"]
+
+    days = rows = 0
+    if since is None:
+        return {"days": days, "rows": rows}
+    for low, high in month_spans(since, until):
+        with transaction.atomic():
+            watermark, _ = Watermark.objects.select_for_update().get_or_create(
+                name=WATERMARK, defaults={"day": high}
+            )
+            rows += roll_up_days(low, high)
+            if watermark.day < high:
+                watermark.day = high
+                watermark.save(update_fields=["day"])
+        days += (high - low).days + 1
+    return {"days": days, "rows": rows}
@@ -0,0 +1,28 @@
+from datetime import date, timedelta
+
+from rest_framework import serializers
+
+STATISTICS = (
+    "borrowings", "returns", "late_returns", "average_loan_days", "overdue_rate"
+)
+
+
+class UsageQuerySerializer(serializers.Serializer):
+    """Days to report on, a year up to yesterday by default."""
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    ordering = serializers.ChoiceField(
+        choices=[
+            prefix + statistic for statistic in STATISTICS for prefix in ("-", "")
+        ],
+        default="-borrowings",
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+    def validate(self, attrs):
+        end = attrs.get("end") or date.today() - timedelta(days=1)
+        start = attrs.get("start") or end - timedelta(days=364)
+        if start > end:
+            raise serializers.ValidationError({"start": "Must not be after end."})
+        return {**attrs, "start": start, "end": end}
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from analytics.rollups import roll_up
+
+
+@shared_task
+def roll_up_usage():
+    return roll_up()
@@ -0,0 +1,239 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from analytics.models import BookUsage, Period, UserUsage
+from analytics.rollups import roll_up, rolled_up_to
+from books.models import Book
+from borrowings.models import Borrowing
+
+BOOKS_URL = reverse("analytics-books")
+AUTHORS_URL = reverse("analytics-authors")
+USERS_URL = reverse("analytics-users")
+SUMMARY_URL = reverse("analytics-summary")
+
+
+BOOK_NUMBERS = count(1)
+
+
+def sample_book(**params):
+    # Titled apart, as (title, author, cover) is unique.
+    defaults = {
+        "title": f"Test Title {next(BOOK_NUMBERS)}",
+        "author": "Test Author",
+        "cover": "HARD",
+        "inventory": 2,
+        "daily_fee": Decimal("0.5"),
+    }
+    defaults.update(params)
+
+    return Book.objects.create(**defaults)
+
+
+class UsageRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_superuser(
+            "analytics@test.com", "testpassword", is_staff=True
+        )
+        self.client.force_authenticate(self.staff)
+        self.reader = get_user_model().objects.create_user(
+            "reader@test.com", "testpassword"
+        )
+
+        self.first = sample_book(title="First", author="Author One")
+        self.second = sample_book(title="Second", author="Author One")
+        self.third = sample_book(title="Third", author="Author Two")
+
+        self.borrowing(self.first, self.staff, "2024-01-10", "2024-01-24", "2024-01-20")
+        self.borrowing(
+            self.first, self.reader, "2024-01-15", "2024-01-29", "2024-02-05"
+        )
+        self.borrowing(self.second, self.staff, "2024-02-01", "2024-02-15")
+        self.borrowing(
+            self.third, self.reader, "2024-02-10", "2024-02-24", "2024-02-12"
+        )
+        self.borrowing(self.first, self.staff, "2024-03-31", "2024-04-14")
+        roll_up(until=date(2024, 3, 31))
+
+    def borrowing(self, book, user, borrow_date, expected, actual=None):
+        borrowing = Borrowing.objects.create(book=book, user=user)
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            borrow_date=borrow_date,
+            expected_return_date=expected,
+            actual_return_date=actual,
+        )
+        return borrowing
+
+    def report(self, url, **params):
+        response = self.client.get(
+            url, {"start": "2024-01-01", "end": "2024-03-31", **params}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
+
+    def test_books_ranked_by_borrowings(self):
+        results = self.report(BOOKS_URL)
+
+        self.assertEqual(
+            results[0],
+            {
+                "book": self.first.id,
+                "title": "First",
+                "author": "Author One",
+                "borrowings": 3,
+                "returns": 2,
+                "late_returns": 1,
+                "average_loan_days": 15.5,
+                "overdue_rate": 0.5,
+            },
+        )
+        self.assertEqual(
+            [row["book"] for row in results],
+            [self.first.id, self.second.id, self.third.id],
+        )
+
+    def test_ordering_and_limit(self):
+        results = self.report(BOOKS_URL, ordering="average_loan_days", limit=2)
+
+        self.assertEqual(
+            [row["book"] for row in results], [self.third.id, self.first.id]
+        )
+
+    def test_authors(self):
+        results = self.report(AUTHORS_URL)
+
+        self.assertEqual(
+            [
+                (row["author"], row["borrowings"], row["returns"], row["overdue_rate"])
+                for row in results
+            ],
+            [("Author One", 4, 2, 0.5), ("Author Two", 1, 1, 0.0)],
+        )
+
+    def test_users(self):
+        results = self.report(USERS_URL, ordering="-returns")
+
+        self.assertEqual(
+            [(row["email"], row["borrowings"], row["returns"]) for row in results],
+            [("reader@test.com", 2, 2), ("analytics@test.com", 3, 1)],
+        )
+
+    def test_partial_months_match_day_rows(self):
+        results = self.report(BOOKS_URL, start="2024-01-15", end="2024-02-10")
+
+        self.assertEqual(
+            [(row["book"], row["borrowings"], row["returns"]) for row in results],
+            [(self.first.id, 1, 2), (self.second.id, 1, 0), (self.third.id, 1, 0)],
+        )
+
+    def test_summary(self):
+        response = self.client.get(
+            SUMMARY_URL, {"start": "2024-01-01", "end": "2024-03-31"}
+        )
+
+        self.assertEqual(response.data["rolled_up_to"], date(2024, 3, 31))
+        self.assertEqual(
+            response.data["results"],
+            {
+                "borrowings": 5,
+                "returns": 3,
+                "late_returns": 1,
+                "average_loan_days": 11.0,
+                "overdue_rate": 0.333,
+            },
+        )
+
+    def test_reports_do_not_read_borrowings(self):
+        for url in (BOOKS_URL, AUTHORS_URL, USERS_URL, SUMMARY_URL):
+            with CaptureQueriesContext(connection) as queries:
+                self.report(url)
+
+            self.assertFalse(
+                any(Borrowing._meta.db_table in query["sql"] for query in queries)
+            )
+
+    def test_month_rows_sum_day_rows(self):
+        self.assertEqual(
+            BookUsage.objects.get(
+                book=self.first, period=Period.MONTH, start=date(2024, 1, 1)
+            ).borrowed,
+            2,
+        )
+        self.assertEqual(
+            UserUsage.objects.get(
+                user=self.reader, period=Period.MONTH, start=date(2024, 2, 1)
+            ).returned,
+            2,
+        )
+
+    def test_roll_up_resumes_after_watermark(self):
+        self.borrowing(self.third, self.reader, "2024-04-02", "2024-04-16")
+        march = list(BookUsage.objects.filter(start__lt=date(2024, 4, 1)).values())
+
+        result = roll_up(until=date(2024, 4, 5))
+
+        self.assertEqual(result["days"], 5)
+        self.assertEqual(rolled_up_to(), date(2024, 4, 5))
+        self.assertEqual(
+            list(BookUsage.objects.filter(start__lt=date(2024, 4, 1)).values()), march
+        )
+        self.assertEqual(
+            BookUsage.objects.get(
+                book=self.third, period=Period.MONTH, start=date(2024, 4, 1)
+            ).borrowed,
+            1,
+        )
+
+    def test_today_is_left_out(self):
+        Borrowing.objects.create(book=self.second, user=self.reader)
+
+        roll_up()
+
+        self.assertEqual(rolled_up_to(), date.today() - timedelta(days=1))
+        self.assertFalse(BookUsage.objects.filter(start=date.today()).exists())
+
+    def test_rebuild_replaces_rows(self):
+        Borrowing.objects.filter(book=self.second).update(
+            actual_return_date="2024-02-20"
+        )
+
+        call_command(
+            "roll_up_usage",
+            "--since",
+            "2024-01-01",
+            "--until",
+            "2024-03-31",
+            stdout=StringIO(),
+        )
+
+        results = self.report(BOOKS_URL)
+        self.assertEqual(
+            [(row["borrowings"], row["returns"]) for row in results],
+            [(3, 2), (1, 1), (1, 1)],
+        )
+        self.assertEqual(rolled_up_to(), date(2024, 3, 31))
+
+    def test_start_after_end_is_rejected(self):
+        response = self.client.get(
+            BOOKS_URL, {"start": "2024-03-01", "end": "2024-02-01"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.reader)
+
+        response = self.client.get(BOOKS_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,8 @@
+from rest_framework import routers
+
+from analytics.views import UsageViewSet
+
+router = routers.DefaultRouter()
+router.register("analytics", UsageViewSet, basename="analytics")
+
+app_name = "analytics"
@@ -0,0 +1,64 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.viewsets import ViewSet
+
+from analytics import reports
+from analytics.rollups import rolled_up_to
+from analytics.serializers import UsageQuerySerializer
+
+
+class UsageViewSet(ViewSet):
+    """Usage statistics for staff, answered from the daily rollups.
+
+    Days after rolled_up_to are not counted yet.
+    """
+
+    permission_classes = [IsAdminUser]
+    throttle_scope = "analytics"
+
+    def report(self, request, results):
+        params = UsageQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(
+            {
+                "start": params.validated_data["start"],
+                "end": params.validated_data["end"],
+                "rolled_up_to": rolled_up_to(),
+                "results": results(**params.validated_data),
+            }
+        )
+
+    @extend_schema(
+        parameters=[UsageQuerySerializer], responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(methods=["GET"], detail=False)
+    def books(self, request):
+        """Endpoint for the most borrowed books, or by another statistic."""
+        return self.report(request, reports.book_usage)
+
+    @extend_schema(
+        parameters=[UsageQuerySerializer], responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(methods=["GET"], detail=False)
+    def authors(self, request):
+        """Endpoint for borrowing statistics per author."""
+        return self.report(request, reports.author_usage)
+
+    @extend_schema(
+        parameters=[UsageQuerySerializer], responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(methods=["GET"], detail=False)
+    def users(self, request):
+        """Endpoint for borrowing statistics per user."""
+        return self.report(request, reports.user_usage)
+
+    @extend_schema(
+        parameters=[UsageQuerySerializer], responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(methods=["GET"], detail=False)
+    def summary(self, request):
+        """Endpoint for the statistics of the whole library."""
+        return self.report(request, reports.summary)
@@ -0,0 +1,250 @@
+"""Scenarios, transports and the concurrent runner of the API load benchmark.
+
+A scenario turns a request count into a list of ready-made requests,
+tokens included, so only the requests themselves are timed. A transport
+sends one request and returns its status, either through the Django test
+client in this process or over HTTP to a running server. Each client
+thread has its own transport.
+"""
+import http.client
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from itertools import cycle, islice
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import Client
+
+from benchmarks.seed import BENCH_EMAIL_DOMAIN, BENCH_PASSWORD
+from benchmarks.utils import percentile, timer
+from books.models import Book
+from borrowings.models import Borrowing
+from user.serializers import TokenObtainPairSerializer
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+@dataclass(frozen=True)
+class Request:
+    method: str
+    path: str
+    body: dict = None
+    token: str = None
+
+
+def access_tokens(users) -> dict[int, str]:
+    return {
+        user.id: str(TokenObtainPairSerializer.get_token(user).access_token)
+        for user in users
+    }
+
+
+def register(count):
+    run = uuid.uuid4().hex[:8]
+    return [
+        Request(
+            "POST",
+            "/users/register/",
+            {
+                "email": f"load-{run}-{n}{BENCH_EMAIL_DOMAIN}",
+                "password": BENCH_PASSWORD,
+            },
+        )
+        for n in range(count)
+    ]
+
+
+def token(count):
+    emails = (
+        get_user_model()
+        .objects.filter(email__startswith="bench", email__endswith=BENCH_EMAIL_DOMAIN)
+        .order_by("id")
+        .values_list("email", flat=True)[:1000]
+    )
+    return [
+        Request("POST", "/users/token/", {"email": email, "password": BENCH_PASSWORD})
+        for email in islice(cycle(list(emails)), count)
+    ]
+
+
+def list_books(count):
+    pages = max(1, min(50, Book.objects.count() // 20))
+    return [Request("GET", f"/api/books/?page={n % pages + 1}") for n in range(count)]
+
+
+def borrow(count):
+    """One borrowing per user with none active, of books still on the shelf."""
+    users = list(
+        get_user_model().objects.filter(active_borrowings=0).order_by("id")[:count]
+    )
+    books = (
+        Book.objects.filter(inventory__gt=0)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    tokens = access_tokens(users)
+    return [
+        Request("POST", "/api/borrowings/", {"book": book_id}, tokens[user.id])
+        for user, book_id in zip(cycle(users), books[:count])
+    ]
+
+
+def return_borrowing(count):
+    """Return the most recent active borrowings, such as those just borrowed."""
+    active = list(
+        Borrowing.objects.filter(actual_return_date__isnull=True)
+        .select_related("user")
+        .order_by("-id")[:count]
+    )
+    tokens = access_tokens({borrowing.user for borrowing in active})
+    return [
+        Request(
+            "POST",
+            f"/api/borrowings/{borrowing.id}/return/",
+            {},
+            tokens[borrowing.user_id],
+        )
+        for borrowing in active
+    ]
+
+
+# In the order a run goes through them: return gives back what borrow took.
+SCENARIOS = {
+    "register": register,
+    "token": token,
+    "list_books": list_books,
+    "borrow": borrow,
+    "return": return_borrowing,
+}
+
+
+class InProcessTransport:
+    """Send requests through the Django test client, without a server."""
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def send(self, request: Request) -> int:
+        headers = {"HTTP_ACCEPT": "application/json"}
+        if request.token:
+            headers["HTTP_AUTHORIZE"] = f"Bearer {request.token}"
+        body = "" if request.body is None else json.dumps(request.body)
+        return self.client.generic(
+            request.method,
+            request.path,
+            body,
+            content_type="application/json",
+            **headers,
+        ).status_code
+
+    def close(self):
+        connections.close_all()
+
+
+class HttpTransport:
+    """Send requests to a server at url over one keep-alive connection."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.prefix = parts.path.rstrip("/")
+        self.connection = http.client.HTTPConnection(
+            parts.hostname, parts.port or 80, timeout=60
+        )
+
+    def send(self, request: Request) -> int:
+        headers = {"Accept": "application/json", "Content-Type": "application/json"}
+        if request.token:
+            headers["Authorize"] = f"Bearer {request.token}"
+        body = None if request.body is None else json.dumps(request.body)
+        try:
+            self.connection.request(
+                request.method, self.prefix + request.path, body, headers
+            )
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            return 0
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+def run(requests, transport, concurrency) -> dict:
+    """Send requests from concurrency threads, each with its own transport().
+
+    Returns the throughput, latency percentiles in milliseconds and the
+    count of each status; 0 stands for a connection error.
+    """
+    pending = iter(requests)
+    lock = threading.Lock()
+    latencies = []
+    statuses = Counter()
+
+    def client():
+        sender = transport()
+        try:
+            while True:
+                with lock:
+                    request = next(pending, None)
+                if request is None:
+                    return
+                start = time.perf_counter()
+                status = sender.send(request)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] += 1
+        finally:
+            sender.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    with timer() as elapsed:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    result = {
+        "requests": len(latencies),
+        "errors": sum(n for status, n in statuses.items() if not 200 <= status < 300),
+        "req_per_s": round(len(latencies) / elapsed["elapsed"], 1),
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+    }
+    for fraction in PERCENTILES:
+        result[f"p{round(fraction * 100)}_ms"] = (
+            round(percentile(latencies, fraction) * 1000, 2)
+            if len(latencies) > 1
+            else None
+        )
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Describe each scenario slower than in baseline by more than tolerance."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["req_per_s"] < before["req_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: req/s {before['req_per_s']} -> {result['req_per_s']}"
+            )
+        for fraction in PERCENTILES:
+            key = f"p{round(fraction * 100)}_ms"
+            if None in (result[key], before.get(key)):
+                continue
+            if result[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {before[key]} -> {result[key]}")
+        if result["errors"] > before.get("errors", 0):
+            regressions.append(
+                f"{name}: errors {before.get('errors', 0)} -> {result['errors']}"
+            )
+    return regressions
@@ -0,0 +1,204 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from benchmarks.load import (
+    SCENARIOS,
+    HttpTransport,
+    InProcessTransport,
+    Request,
+    compare,
+    run,
+)
+from benchmarks.seed import BORROWINGS_SQL, seed
+from benchmarks.utils import free_port, scratch_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the register, token, list books, borrow and return flows with "
+        "concurrent clients, in process or over HTTP, and report p50/p95/p99 "
+        "latency and req/s. Optionally fail on regressions against a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+        )
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--transport",
+            choices=("inprocess", "http"),
+            default="inprocess",
+            help="http starts gunicorn on the configured database unless --url is set.",
+        )
+        parser.add_argument("--url", help="Base URL of a running server to load.")
+        parser.add_argument(
+            "--wsgi-workers", type=int, default=2 * os.cpu_count() + 1
+        )
+        parser.add_argument(
+            "--existing",
+            action="store_true",
+            help="Use the configured database, as filled by seed_bench_data, "
+            "instead of a freshly seeded scratch one.",
+        )
+        parser.add_argument("--books", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=2_000)
+        parser.add_argument("--borrowings", type=int, default=100_000)
+        parser.add_argument("--format", choices=("table", "json"), default="table")
+        parser.add_argument("--output", help="Also write the JSON results here.")
+        parser.add_argument("--baseline", help="JSON results to compare against.")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.10,
+            help="Slowdown over the baseline tolerated before flagging it.",
+        )
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            options["transport"] = "http"
+        if options["transport"] == "http" and not (
+            options["url"] or options["existing"]
+        ):
+            raise CommandError(
+                "A local server serves the configured database: pass --existing "
+                "or point --url at a running server."
+            )
+
+        if options["existing"]:
+            database = override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                THROTTLE_ENABLED=False,
+            )
+        else:
+            database = scratch_database()
+        if not options["existing"] and connection.vendor not in BORROWINGS_SQL:
+            raise CommandError(f"Unsupported database vendor: {connection.vendor}")
+        with database:
+            if not options["existing"]:
+                seed(options["books"], options["users"], options["borrowings"])
+            results = self.run(**options)
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+        self.report(results, options["format"])
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                regressions = compare(
+                    results["scenarios"],
+                    json.load(baseline)["scenarios"],
+                    options["tolerance"],
+                )
+            for regression in regressions:
+                self.stderr.write(f"REGRESSION {regression}")
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} regressions against the baseline."
+                )
+
+    def run(self, scenarios, requests, warmup, concurrency, transport, **options):
+        with self.server(transport, **options) as url:
+            if url:
+                transport_factory = partial(HttpTransport, url)
+            else:
+                transport_factory = InProcessTransport
+
+            results = {}
+            for name in scenarios:
+                prepared = SCENARIOS[name](warmup + requests)
+                if len(prepared) < warmup + requests:
+                    raise CommandError(
+                        f"{name}: only {len(prepared)} requests could be prepared."
+                    )
+                run(prepared[:warmup], transport_factory, concurrency)
+                results[name] = run(prepared[warmup:], transport_factory, concurrency)
+
+        return {
+            "settings": {
+                "transport": transport,
+                "database": connection.vendor,
+                "requests": requests,
+                "concurrency": concurrency,
+            },
+            "scenarios": results,
+        }
+
+    @contextmanager
+    def server(self, transport, url, wsgi_workers, **options):
+        """Yield the URL to load, starting gunicorn when none is given."""
+        if transport == "inprocess" or url:
+            yield url
+            return
+
+        port = free_port()
+        env = {
+            **os.environ,
+            "DJANGO_ENV": "prod",
+            "ALLOWED_HOSTS": "127.0.0.1",
+            "THROTTLE_ENABLED": "0",
+        }
+        env.pop("DJANGO_SETTINGS_MODULE", None)
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "gunicorn",
+                "library_service.wsgi:application",
+                "--bind",
+                f"127.0.0.1:{port}",
+                "--workers",
+                str(wsgi_workers),
+                "--log-level",
+                "warning",
+            ],
+            env=env,
+        )
+        try:
+            url = f"http://127.0.0.1:{port}"
+            self.wait_until_up(url, server)
+            yield url
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait_until_up(self, url, server, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        probe = HttpTransport(url)
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn exited with {server.returncode}")
+            if probe.send(Request("GET", "/api/books/")) == 200:
+                probe.close()
+                return
+            time.sleep(0.2)
+        raise CommandError(f"{url} did not come up within {timeout:.0f}s")
+
+    def report(self, results, output_format):
+        if output_format == "json":
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'scenario':<12} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+            f"{'p99 ms':>9} {'errors':>7}"
+        )
+        for name, result in results["scenarios"].items():
+            self.stdout.write(
+                f"{name:<12} {result['req_per_s']:>9.1f} {result['p50_ms']:>9} "
+                f"{result['p95_ms']:>9} {result['p99_ms']:>9} {result['errors']:>7}"
+            )
@@ -0,0 +1,66 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from benchmarks.utils import scratch_database, timer
+from books.models import Book
+from books.views import BookViewSet
+from user.authentication import ClaimsJWTAuthentication
+from user.serializers import TokenObtainPairSerializer
+
+BOOKS_URL = "/api/books/"
+
+AUTHENTICATION_CLASSES = {
+    "lookup": JWTAuthentication,
+    "claims": ClaimsJWTAuthentication,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare GET /api/books/ throughput with the database-backed and the "
+        "claims-based JWT authentication classes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--books", type=int, default=100)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run(**options)
+
+    def measure(self, client, token, requests):
+        client.get(BOOKS_URL, HTTP_AUTHORIZE=f"Bearer {token}")  # warm caches
+        with timer() as elapsed:
+            for _ in range(requests):
+                response = client.get(BOOKS_URL, HTTP_AUTHORIZE=f"Bearer {token}")
+                assert response.status_code == 200, response.content
+        return requests / elapsed["elapsed"]
+
+    def run(self, requests, books, **options):
+        Book.objects.bulk_create(
+            Book(
+                title=f"Bench {i}",
+                author="Bench Author",
+                cover=Book.Cover.HARD,
+                inventory=1,
+                daily_fee=Decimal("1.00"),
+            )
+            for i in range(books)
+        )
+        user = get_user_model().objects.create_user("auth@bench.local", "password")
+        token = TokenObtainPairSerializer.get_token(user).access_token
+        client = Client()
+
+        self.stdout.write(f"{'authentication':<16} {'req/s':>10}")
+        for name, authentication_class in AUTHENTICATION_CLASSES.items():
+            with mock.patch.object(
+                BookViewSet, "authentication_classes", [authentication_class]
+            ):
+                rate = self.measure(client, token, requests)
+            self.stdout.write(f"{name:<16} {rate:>10.0f}")
@@ -0,0 +1,178 @@
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from benchmarks.utils import scratch_database, timer
+from books.models import Book
+from borrowings.fees import bill_month, month_bounds
+from borrowings.models import Borrowing, Payment
+
+BOOKS = 1000
+USERS = 1000
+
+# Borrowings n in [%(low)s, %(high)s): borrowed up to 20 days before the
+# month, due two weeks later and returned on day n % 28 of the month, so
+# about half are late. Dates are generated by the database.
+SEED_SQL = {
+    "sqlite": """
+        WITH RECURSIVE seq(n) AS (
+            SELECT %(low)s UNION ALL SELECT n + 1 FROM seq WHERE n + 1 < %(high)s
+        )
+        INSERT INTO borrowings_borrowing
+            (borrow_date, expected_return_date, actual_return_date, book_id, user_id)
+        SELECT
+            date(%(start)s, '-' || (n %% 20) || ' days'),
+            date(%(start)s, '-' || (n %% 20) || ' days', '+14 days'),
+            date(%(start)s, '+' || (n %% 28) || ' days'),
+            %(book)s + n %% %(books)s,
+            %(user)s + n %% %(users)s
+        FROM seq
+    """,
+    "postgresql": """
+        INSERT INTO borrowings_borrowing
+            (borrow_date, expected_return_date, actual_return_date, book_id, user_id)
+        SELECT
+            %(start)s::date - n %% 20,
+            %(start)s::date - n %% 20 + 14,
+            %(start)s::date + n %% 28,
+            %(book)s + n %% %(books)s,
+            %(user)s + n %% %(users)s
+        FROM generate_series(%(low)s, %(high)s - 1) AS n
+    """,
+}
+
+
+def python_charges(borrowing, fine_multiplier):
+    """The fee rules of borrowings.fees, one model instance at a time."""
+    cent = Decimal("0.01")
+    fee = borrowing.book.daily_fee
+    paid_until = min(borrowing.actual_return_date, borrowing.expected_return_date)
+    days = max((paid_until - borrowing.borrow_date).days, 1)
+    yield Payment(
+        borrowing=borrowing,
+        type=Payment.Type.PAYMENT,
+        days=days,
+        money_to_pay=(fee * days).quantize(cent, ROUND_HALF_UP),
+    )
+    late = (borrowing.actual_return_date - borrowing.expected_return_date).days
+    if late > 0:
+        yield Payment(
+            borrowing=borrowing,
+            type=Payment.Type.FINE,
+            days=late,
+            money_to_pay=(fee * late * fine_multiplier).quantize(cent, ROUND_HALF_UP),
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Time a monthly billing run over borrowings all returned in the same "
+        "month, against a Python loop over model instances on a sample."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000_000)
+        parser.add_argument("--seed-batch", type=int, default=1_000_000)
+        parser.add_argument("--chunk-size", type=int, default=500_000)
+        parser.add_argument(
+            "--loop-rows",
+            type=int,
+            default=100_000,
+            help="Borrowings billed by the Python loop; 0 skips it.",
+        )
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            if connection.vendor not in SEED_SQL:
+                raise CommandError(f"Unsupported database vendor: {connection.vendor}")
+            self.run(**options)
+
+    def seed(self, rows, batch, month_start):
+        book = Book.objects.bulk_create(
+            Book(
+                title=f"Billing {i}",
+                author="Bench Author",
+                cover=Book.Cover.HARD,
+                inventory=1,
+                daily_fee=Decimal(i % 300 + 1) / 100,
+            )
+            for i in range(BOOKS)
+        )[0].id
+        user = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"billing{i}@bench.local") for i in range(USERS)
+        )[0].id
+        for low in range(0, rows, batch):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    SEED_SQL[connection.vendor],
+                    {
+                        "low": low,
+                        "high": min(rows, low + batch),
+                        "start": month_start.isoformat(),
+                        "book": book,
+                        "books": BOOKS,
+                        "user": user,
+                        "users": USERS,
+                    },
+                )
+
+    def loop(self, rows, month_start):
+        start, end = month_bounds(month_start)
+        borrowings = (
+            Borrowing.objects.filter(
+                actual_return_date__gte=start, actual_return_date__lt=end
+            )
+            .select_related("book")
+            .order_by("id")[:rows]
+        )
+        with transaction.atomic():
+            batch = []
+            for borrowing in borrowings.iterator(chunk_size=5000):
+                batch.extend(python_charges(borrowing, settings.FINE_MULTIPLIER))
+                if len(batch) >= 5000:
+                    Payment.objects.bulk_create(batch)
+                    batch = []
+            Payment.objects.bulk_create(batch)
+
+    def run(self, rows, seed_batch, chunk_size, loop_rows, **options):
+        month_start = (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+
+        with timer() as seeding:
+            self.seed(rows, seed_batch, month_start)
+        self.stdout.write(f"seeded {rows} borrowings in {seeding['elapsed']:.1f}s")
+
+        if loop_rows:
+            with timer() as looped:
+                self.loop(loop_rows, month_start)
+            sample = list(
+                Payment.objects.order_by("borrowing_id", "type").values_list(
+                    "borrowing_id", "type", "days", "money_to_pay"
+                )
+            )
+            Payment.objects.all().delete()
+            per_row = looped["elapsed"] / loop_rows
+            self.stdout.write(
+                f"python loop: {loop_rows} borrowings in {looped['elapsed']:.1f}s, "
+                f"{per_row * 1e6:.1f}us each, ~{per_row * rows:.0f}s for {rows}"
+            )
+
+        with timer() as billed:
+            result = bill_month(month_start, chunk_size=chunk_size)
+        self.stdout.write(
+            f"bill_month: {rows} borrowings in {billed['elapsed']:.1f}s, "
+            f"{billed['elapsed'] / rows * 1e6:.2f}us each; wrote "
+            f"{result['written']} payments totalling {result['total']}"
+        )
+
+        if loop_rows:
+            billed_sample = list(
+                Payment.objects.filter(borrowing_id__lte=sample[-1][0])
+                .order_by("borrowing_id", "type")
+                .values_list("borrowing_id", "type", "days", "money_to_pay")
+            )
+            if billed_sample != sample:
+                raise CommandError("bill_month and the Python loop disagree.")
@@ -0,0 +1,84 @@
+import random
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from benchmarks.utils import scratch_database, timer
+from books.models import Book
+from borrowings.models import Borrowing
+from user.serializers import TokenObtainPairSerializer
+
+EXPORT_URL = "/api/borrowings/export/"
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the borrowings export at increasing sizes and report "
+        "throughput and peak Python memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+        )
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run(**options)
+
+    def seed(self, rows, batch_size, staff, books, rng):
+        start = date.today()
+        for low in range(0, rows, batch_size):
+            Borrowing.objects.bulk_create(
+                Borrowing(
+                    book=rng.choice(books),
+                    user=staff,
+                    expected_return_date=start + timedelta(days=rng.randrange(365)),
+                )
+                for _ in range(low, min(rows, low + batch_size))
+            )
+
+    def run(self, rows, batch_size, **options):
+        staff = get_user_model().objects.create_superuser(
+            "export@bench.local", "password"
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Bench {i}",
+                author="Bench Author",
+                cover=Book.Cover.SOFT,
+                inventory=1,
+                daily_fee=Decimal("1.00"),
+            )
+            for i in range(100)
+        )
+        token = TokenObtainPairSerializer.get_token(staff).access_token
+        client = Client(HTTP_AUTHORIZE=f"Bearer {token}")
+        rng = random.Random(0)
+
+        seeded = 0
+        self.stdout.write(
+            f"{'rows':>10} {'output':>7} {'MB':>8} {'rows/s':>10} {'peak KiB':>9}"
+        )
+        for target in sorted(rows):
+            self.seed(target - seeded, batch_size, staff, books, rng)
+            seeded = target
+            for output in ("csv", "ndjson"):
+                size = 0
+                tracemalloc.start()
+                with timer() as elapsed:
+                    response = client.get(EXPORT_URL, {"output": output})
+                    assert response.status_code == 200, response.content
+                    for chunk in response.streaming_content:
+                        size += len(chunk)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(
+                    f"{target:>10} {output:>7} {size / 2**20:>8.1f} "
+                    f"{target / elapsed['elapsed']:>10.0f} {peak / 1024:>9.0f}"
+                )
@@ -0,0 +1,109 @@
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from benchmarks.utils import scratch_database, timer
+from books.models import Book
+from borrowings.models import Borrowing
+from borrowings.views import BorrowingCursorPagination, BorrowingsViewSet
+
+BORROWINGS_URL = "/api/borrowings/"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare page-number and keyset page latency on the borrowings list "
+        "at increasing offsets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--offsets",
+            type=int,
+            nargs="+",
+            default=[0, 10_000, 1_000_000],
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run(**options)
+
+    def seed(self, rows, batch_size):
+        staff = get_user_model().objects.create_user(
+            "staff@bench.local", "password", is_staff=True
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Bench {i}",
+                author="Bench Author",
+                cover=Book.Cover.SOFT,
+                inventory=1,
+                daily_fee=Decimal("1.00"),
+            )
+            for i in range(100)
+        )
+        start = date.today()
+        rng = random.Random(0)
+        for low in range(0, rows, batch_size):
+            Borrowing.objects.bulk_create(
+                Borrowing(
+                    book=rng.choice(books),
+                    user=staff,
+                    expected_return_date=start + timedelta(days=rng.randrange(365)),
+                )
+                for _ in range(low, min(rows, low + batch_size))
+            )
+        return staff
+
+    def cursor_url(self, offset):
+        if not offset:
+            return f"{BORROWINGS_URL}?pagination=cursor"
+        ordering = BorrowingCursorPagination.ordering
+        anchor = Borrowing.objects.order_by(*ordering).values_list(*ordering)[
+            offset - 1
+        ]
+        paginator = BorrowingCursorPagination()
+        paginator.base_url = f"http://testserver{BORROWINGS_URL}"
+        position = json.dumps([str(value) for value in anchor], separators=(",", ":"))
+        return paginator.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position)
+        )
+
+    def measure(self, view, factory, user, url, repeat):
+        samples = []
+        for _ in range(repeat):
+            request = factory.get(url)
+            force_authenticate(request, user=user)
+            start = time.perf_counter()
+            response = view(request)
+            response.render()
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.data
+        return statistics.median(samples) * 1000
+
+    def run(self, offsets, repeat, batch_size, **options):
+        page_size = BorrowingCursorPagination.page_size
+        rows = max(offsets) + page_size
+        with timer() as seeding:
+            staff = self.seed(rows, batch_size)
+        self.stdout.write(f"seeded {rows} borrowings in {seeding['elapsed']:.1f}s")
+
+        view = BorrowingsViewSet.as_view({"get": "list"})
+        factory = APIRequestFactory()
+        self.stdout.write(f"{'offset':>10} {'page (ms)':>12} {'cursor (ms)':>12}")
+        for offset in offsets:
+            page_url = f"{BORROWINGS_URL}?page={offset // page_size + 1}"
+            page_ms = self.measure(view, factory, staff, page_url, repeat)
+            cursor_url = self.cursor_url(offset)
+            cursor_ms = self.measure(view, factory, staff, cursor_url, repeat)
+            self.stdout.write(f"{offset:>10} {page_ms:>12.2f} {cursor_ms:>12.2f}")
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from contextlib import ExitStack
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.serializers import ModelSerializer
+
+from benchmarks.load import InProcessTransport, Request, register, run, token
+from benchmarks.seed import BENCH_PASSWORD, seed_users
+from benchmarks.utils import percentile, scratch_database
+from books.models import Book
+from user.serializers import UserSerializer
+
+BOOKS_REQUEST = Request("GET", "/api/books/")
+
+
+def legacy_create(serializer, validated_data):
+    """The sign-up the single insert replaced: save, hash, save again."""
+    user = ModelSerializer.create(serializer, validated_data)
+    user.set_password(validated_data["password"])
+    user.save()
+    return user
+
+
+def list_books_until(stop: threading.Event, latencies: list) -> None:
+    """GET /api/books/ back to back until stop is set."""
+    transport = InProcessTransport()
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            transport.send(BOOKS_REQUEST)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        transport.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sign-ups/s and logins/s with the old two-write registration, "
+        "inline hashing and the thread and process hashing pools, and the "
+        "latency of book listings served during the logins."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=max(1, os.cpu_count() // 2),
+            help="Size of the hashing pools.",
+        )
+        parser.add_argument(
+            "--iterations", type=int, default=settings.PASSWORD_HASH_ITERATIONS
+        )
+
+    def handle(self, *args, **options):
+        # Pool processes load their settings afresh, from the environment.
+        os.environ["PASSWORD_HASH_ITERATIONS"] = str(options["iterations"])
+        with scratch_database(), override_settings(
+            PASSWORD_HASH_ITERATIONS=options["iterations"]
+        ):
+            self.run(**options)
+
+    def modes(self, workers):
+        inline = override_settings(PASSWORD_HASHING_WORKERS=0)
+        return {
+            "legacy": (
+                inline,
+                mock.patch.object(UserSerializer, "create", legacy_create),
+            ),
+            "inline": (inline,),
+            "threads": (
+                override_settings(
+                    PASSWORD_HASHING_POOL="thread", PASSWORD_HASHING_WORKERS=workers
+                ),
+            ),
+            "processes": (
+                override_settings(
+                    PASSWORD_HASHING_POOL="process", PASSWORD_HASHING_WORKERS=workers
+                ),
+            ),
+        }
+
+    def writes_per_signup(self, name) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            Client().post(
+                "/users/register/",
+                {"email": f"writes-{name}@bench.local", "password": BENCH_PASSWORD},
+                content_type="application/json",
+            )
+        return sum(
+            query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+            for query in queries
+        )
+
+    def run(self, requests, concurrency, workers, **options):
+        Book.objects.bulk_create(
+            Book(
+                title=f"Bench {i}",
+                author="Bench Author",
+                cover=Book.Cover.HARD,
+                inventory=1,
+                daily_fee=Decimal("1.00"),
+            )
+            for i in range(100)
+        )
+        seed_users(concurrency * 4)
+
+        self.stdout.write(
+            f"{'mode':<10} {'writes':>7} {'sign-ups/s':>11} {'logins/s':>9} "
+            f"{'login p95 ms':>13} {'books p95 ms':>13}"
+        )
+        for name, patches in self.modes(workers).items():
+            with ExitStack() as stack:
+                for patch in patches:
+                    stack.enter_context(patch)
+                self.stdout.write(self.measure(name, requests, concurrency))
+
+    def measure(self, name, requests, concurrency) -> str:
+        writes = self.writes_per_signup(name)
+        # Warm the pool up.
+        run(token(concurrency), InProcessTransport, concurrency)
+
+        signups = run(register(requests), InProcessTransport, concurrency)
+
+        stop = threading.Event()
+        listings = []
+        lister = threading.Thread(target=list_books_until, args=(stop, listings))
+        lister.start()
+        try:
+            logins = run(token(requests), InProcessTransport, concurrency)
+        finally:
+            stop.set()
+            lister.join()
+
+        return (
+            f"{name:<10} {writes:>7} {signups['req_per_s']:>11.1f} "
+            f"{logins['req_per_s']:>9.1f} {logins['p95_ms']:>13.1f} "
+            f"{percentile(listings, 0.95) * 1000:>13.1f}"
+        )
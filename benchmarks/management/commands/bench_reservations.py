@@ -0,0 +1,113 @@
+import threading
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from benchmarks.utils import scratch_database, timer
+from books.models import Book
+from borrowings.models import Borrowing
+from borrowings.views import BorrowingsViewSet
+
+
+def legacy_borrow(book_id, user):
+    """The read-modify-write checkout the reservation layer replaced."""
+    book = Book.objects.get(pk=book_id)
+    if book.inventory > 0:
+        book.inventory -= 1
+        book.save()
+        Borrowing.objects.create(book=book, user=user)
+        return True
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer the borrow endpoint with concurrent borrowers per book and "
+        "report throughput and oversells."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=4)
+        parser.add_argument("--copies", type=int, default=10)
+        parser.add_argument("--borrowers-per-book", type=int, default=50)
+        parser.add_argument(
+            "--strategy",
+            choices=("atomic", "legacy"),
+            default="atomic",
+            help="atomic: the current endpoint, legacy: read-modify-write.",
+        )
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run(**options)
+
+    def run(self, books, copies, borrowers_per_book, strategy, **options):
+        book_ids = [
+            Book.objects.create(
+                title=f"Bench {i}",
+                author="Bench Author",
+                cover=Book.Cover.HARD,
+                inventory=copies,
+                daily_fee=Decimal("1.00"),
+            ).id
+            for i in range(books)
+        ]
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"borrower{i}@bench.local")
+            for i in range(books * borrowers_per_book)
+        )
+
+        view = BorrowingsViewSet.as_view({"post": "create"})
+        factory = APIRequestFactory()
+        barrier = threading.Barrier(len(users))
+        lock = threading.Lock()
+        stats = {"granted": 0, "refused": 0, "errors": 0}
+
+        def borrow(book_id, user):
+            if strategy == "legacy":
+                return legacy_borrow(book_id, user)
+            request = factory.post("/api/borrowings/", {"book": book_id})
+            force_authenticate(request, user=user)
+            return view(request).status_code == 201
+
+        def worker(book_id, user):
+            barrier.wait()
+            try:
+                outcome = "granted" if borrow(book_id, user) else "refused"
+            except OperationalError:
+                outcome = "errors"
+            finally:
+                close_old_connections()
+                connection.close()
+            with lock:
+                stats[outcome] += 1
+
+        threads = [
+            threading.Thread(target=worker, args=(book_ids[i % books], user))
+            for i, user in enumerate(users)
+        ]
+        with timer() as elapsed:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        oversold = drift = 0
+        for book in Book.objects.filter(pk__in=book_ids):
+            borrowed = Borrowing.objects.filter(book=book).count()
+            oversold += max(borrowed - copies, 0)
+            drift += abs(copies - borrowed - book.inventory)
+
+        attempts = len(users)
+        self.stdout.write(
+            f"strategy={strategy} books={books} copies={copies} "
+            f"borrowers_per_book={borrowers_per_book}\n"
+            f"attempts={attempts} granted={stats['granted']} "
+            f"refused={stats['refused']} errors={stats['errors']}\n"
+            f"elapsed={elapsed['elapsed']:.3f}s "
+            f"throughput={attempts / elapsed['elapsed']:.1f} req/s\n"
+            f"oversold={oversold} inventory_drift={drift}"
+        )
@@ -0,0 +1,104 @@
+import itertools
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from benchmarks.utils import scratch_database, timer
+from books.models import Book
+from books.search import search_books
+
+SYLLABLES = (
+    "ka", "ri", "mo", "ten", "sha", "lo", "vin", "dra", "el", "qua",
+    "zor", "bel", "un", "fi", "gar", "po", "ste", "wy", "nox", "ad",
+)
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def icontains_books(queryset, query):
+    for term in query.split():
+        queryset = queryset.filter(Q(title__icontains=term) | Q(author__icontains=term))
+    return queryset.order_by("id")
+
+
+class Command(BaseCommand):
+    help = "Compare full-text book search with icontains filtering."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run(**options)
+
+    def seed(self, books, batch_size, rng):
+        vocabulary = make_vocabulary(20_000, rng)
+        # Zipf-like skew so some words are common and most are rare.
+        weights = list(
+            itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary)))
+        )
+        for low in range(0, books, batch_size):
+            Book.objects.bulk_create(
+                (
+                    Book(
+                        title=" ".join(
+                            rng.choices(vocabulary, cum_weights=weights, k=3)
+                        ).title(),
+                        author=" ".join(
+                            rng.choices(vocabulary, cum_weights=weights, k=2)
+                        ).title(),
+                        cover=Book.Cover.HARD,
+                        inventory=1,
+                        daily_fee=Decimal("1.00"),
+                    )
+                    for _ in range(low, min(books, low + batch_size))
+                ),
+                # The odd random (title, author) repeat is dropped.
+                ignore_conflicts=True,
+            )
+        return vocabulary
+
+    def measure(self, search, query, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset = search(Book.objects.all(), query)
+            count = queryset.count()
+            list(queryset[:20])
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples) * 1000, count
+
+    def run(self, books, repeat, batch_size, **options):
+        rng = random.Random(0)
+        with timer() as seeding:
+            vocabulary = self.seed(books, batch_size, rng)
+        self.stdout.write(f"seeded {books} books in {seeding['elapsed']:.1f}s")
+
+        queries = {
+            "common word": vocabulary[0],
+            "rare word": vocabulary[-1],
+            "prefix": vocabulary[len(vocabulary) // 2][:4],
+            "short prefix": vocabulary[len(vocabulary) // 2][:2],
+            "one letter": vocabulary[len(vocabulary) // 2][:1],
+            "two words": f"{vocabulary[1]} {vocabulary[2][:3]}",
+        }
+        self.stdout.write(
+            f"{'query':<14} {'matches':>9} {'icontains (ms)':>15} {'fts (ms)':>10}"
+        )
+        for name, query in queries.items():
+            slow_ms, _ = self.measure(icontains_books, query, repeat)
+            fast_ms, matches = self.measure(search_books, query, repeat)
+            self.stdout.write(
+                f"{name:<14} {matches:>9} {slow_ms:>15.2f} {fast_ms:>10.2f}"
+            )
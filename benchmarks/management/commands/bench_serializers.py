@@ -0,0 +1,131 @@
+import statistics
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from benchmarks.utils import scratch_database, timer
+from books.models import Book
+from books.serializers import BookSerializer, BookValuesSerializer
+from borrowings.models import Borrowing
+from borrowings.serializers import (
+    BorrowingListSerializer,
+    BorrowingListValuesSerializer,
+)
+from library_service.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Serialize and render a list of books and one of borrowings with the "
+        "model serializers and DRF's renderer, then with the values "
+        "serializers and the orjson renderer, and compare timings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.seed(options["rows"])
+            if orjson is None:
+                self.stdout.write("orjson is not installed, so both render with DRF.")
+            self.stdout.write(
+                f"{'list':<11} {'serializer':<10} {'fetch ms':>9} "
+                f"{'serialize ms':>13} {'render ms':>10} {'total ms':>9}"
+            )
+            self.compare(
+                "books",
+                Book.objects.order_by("id"),
+                BookSerializer,
+                BookValuesSerializer,
+                options["repeat"],
+            )
+            self.compare(
+                "borrowings",
+                Borrowing.objects.select_related("book", "user")
+                .only(
+                    "id",
+                    "borrow_date",
+                    "expected_return_date",
+                    "actual_return_date",
+                    "book__title",
+                    "user__first_name",
+                    "user__last_name",
+                )
+                .order_by("id"),
+                BorrowingListSerializer,
+                BorrowingListValuesSerializer,
+                options["repeat"],
+            )
+
+    def seed(self, rows):
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Bench Title {i}",
+                author=f"Bench Author {i % 100}",
+                cover=Book.Cover.HARD if i % 2 else Book.Cover.SOFT,
+                inventory=i % 7,
+                daily_fee=Decimal(i % 500) / 100,
+            )
+            for i in range(rows)
+        )
+        user = get_user_model().objects.create_user(
+            "serializers@bench.local", "password", first_name="Bench", last_name="User"
+        )
+        today = date.today()
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                book=book,
+                user=user,
+                expected_return_date=today + timedelta(days=i % 30),
+                actual_return_date=today if i % 3 == 0 else None,
+            )
+            for i, book in enumerate(books)
+        )
+
+    def compare(self, name, queryset, model_serializer, values_serializer, repeat):
+        regular = self.measure(
+            lambda: list(queryset.all()),
+            lambda objects: model_serializer(objects, many=True).data,
+            JSONRenderer(),
+            repeat,
+        )
+        fast = self.measure(
+            lambda: list(values_serializer.rows(queryset)),
+            lambda rows: values_serializer(rows).data,
+            FastJSONRenderer(),
+            repeat,
+        )
+        if regular.pop("content") != fast.pop("content"):
+            raise CommandError(f"The {name} outputs differ.")
+
+        for label, timings in (("model", regular), ("values", fast)):
+            self.stdout.write(
+                f"{name:<11} {label:<10} "
+                f"{timings['fetch'] * 1000:>9.1f} "
+                f"{timings['serialize'] * 1000:>13.1f} "
+                f"{timings['render'] * 1000:>10.1f} "
+                f"{sum(timings.values()) * 1000:>9.1f}"
+            )
+
+    def measure(self, fetch, serialize, renderer, repeat) -> dict:
+        """Median seconds of each stage over repeat runs, and the output."""
+        stages = {"fetch": [], "serialize": [], "render": []}
+        for _ in range(repeat):
+            with timer() as fetched:
+                objects = fetch()
+            with timer() as serialized:
+                data = serialize(objects)
+            with timer() as rendered:
+                content = renderer.render(data)
+            stages["fetch"].append(fetched["elapsed"])
+            stages["serialize"].append(serialized["elapsed"])
+            stages["render"].append(rendered["elapsed"])
+
+        timings = {stage: statistics.median(runs) for stage, runs in stages.items()}
+        timings["content"] = content
+        return timings
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.utils import free_port, percentile
+
+SERVERS = {
+    "wsgi": ["library_service.wsgi:application"],
+    "asgi": [
+        "library_service.asgi:application",
+        "-c",
+        "python:library_service.gunicorn_asgi",
+    ],
+}
+
+
+def request_bytes(url: str) -> bytes:
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {parts.netloc}\r\n"
+        "Accept: application/json\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode()
+
+
+async def fetch(url: str, trickle: float = 0.0) -> tuple[int, float]:
+    """GET url over a fresh connection, returning (status, seconds).
+
+    With trickle set the request is sent one byte at a time, spread over
+    trickle seconds, the way a client on a poor mobile link would.
+    """
+    parts = urlsplit(url)
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        payload = request_bytes(url)
+        if trickle:
+            for byte in range(len(payload)):
+                writer.write(payload[byte : byte + 1])
+                await writer.drain()
+                await asyncio.sleep(trickle / len(payload))
+        else:
+            writer.write(payload)
+            await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1]), time.perf_counter() - start
+
+
+async def slow_client(url: str, trickle: float, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            await fetch(url, trickle)
+        except OSError:
+            await asyncio.sleep(0.1)
+
+
+async def load(url, requests, concurrency, slow_clients, trickle) -> list[float]:
+    """Latencies of requests fast GETs while slow_clients trickle alongside."""
+    stop = asyncio.Event()
+    slow = [
+        asyncio.create_task(slow_client(url, trickle, stop))
+        for _ in range(slow_clients)
+    ]
+    # Let the slow clients take their connections first.
+    await asyncio.sleep(min(trickle, 1.0))
+
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def fast_client():
+        for _ in remaining:
+            status, seconds = await fetch(url)
+            if status != 200:
+                raise CommandError(f"{url} answered {status}")
+            latencies.append(seconds)
+
+    try:
+        await asyncio.gather(*(fast_client() for _ in range(concurrency)))
+    finally:
+        stop.set()
+        for task in slow:
+            task.cancel()
+        await asyncio.gather(*slow, return_exceptions=True)
+    return latencies
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the API under gunicorn in WSGI and ASGI mode with a mix of "
+        "fast clients and slow clients trickling their requests, and report "
+        "latency percentiles of the fast ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/api/books/")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--slow-clients", type=int, nargs="+", default=[0, 16])
+        parser.add_argument(
+            "--trickle",
+            type=float,
+            default=2.0,
+            help="Seconds each slow client takes to send its request.",
+        )
+        parser.add_argument(
+            "--wsgi-workers", type=int, default=2 * os.cpu_count() + 1
+        )
+        parser.add_argument(
+            "--server",
+            action="append",
+            dest="servers",
+            metavar="NAME=URL",
+            help="Benchmark a running server instead of starting gunicorn.",
+        )
+
+    def handle(self, *args, **options):
+        if options["servers"]:
+            for target in options["servers"]:
+                name, _, url = target.partition("=")
+                self.report(name, url.rstrip("/") + options["path"], **options)
+            return
+
+        for name in SERVERS:
+            port = free_port()
+            server = self.start(name, port, options["wsgi_workers"])
+            try:
+                url = f"http://127.0.0.1:{port}{options['path']}"
+                self.wait_until_up(url, server)
+                self.report(name, url, **options)
+            finally:
+                server.terminate()
+                server.wait()
+
+    def start(self, name, port, wsgi_workers):
+        command = [sys.executable, "-m", "gunicorn", *SERVERS[name]]
+        command += ["--bind", f"127.0.0.1:{port}", "--log-level", "warning"]
+        if name == "wsgi":
+            command += ["--workers", str(wsgi_workers)]
+        # The WSGI server runs the prod profile, which the ASGI one builds on.
+        env = {
+            **os.environ,
+            "DJANGO_ENV": "prod",
+            "ALLOWED_HOSTS": "127.0.0.1",
+            "THROTTLE_ENABLED": "0",
+        }
+        env.pop("DJANGO_SETTINGS_MODULE", None)
+        return subprocess.Popen(command, env=env)
+
+    def wait_until_up(self, url, server, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn exited with {server.returncode}")
+            try:
+                asyncio.run(fetch(url))
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"{url} did not come up within {timeout:.0f}s")
+
+    def report(
+        self, name, url, requests, concurrency, slow_clients, trickle, **options
+    ):
+        asyncio.run(load(url, concurrency, concurrency, 0, trickle))  # warm up
+
+        for slow in slow_clients:
+            latencies = asyncio.run(load(url, requests, concurrency, slow, trickle))
+            self.stdout.write(
+                f"{name:<6} slow={slow:<4} "
+                + " ".join(
+                    f"p{round(fraction * 100)}="
+                    f"{percentile(latencies, fraction) * 1000:.1f}ms"
+                    for fraction in (0.5, 0.95, 0.99)
+                )
+            )
@@ -0,0 +1,135 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from benchmarks.utils import scratch_database, timer
+from books.models import Book
+from borrowings.models import Borrowing
+from user.serializers import TokenObtainPairSerializer
+
+PROFILES = ("dev", "prod")
+
+STARTUP_SCRIPT = "from library_service.wsgi import application"
+
+
+def profile_env(profile: str) -> dict:
+    # One client sends every request; throttling would refuse most of them.
+    env = {**os.environ, "DJANGO_ENV": profile, "THROTTLE_ENABLED": "0"}
+    env.pop("DJANGO_SETTINGS_MODULE", None)
+    return env
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the settings profiles: time to load the WSGI application in "
+        "a fresh interpreter, and per-request overhead of GET requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--paths", nargs="+", default=["/api/books/", "/api/borrowings/"]
+        )
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--startups", type=int, default=5)
+        parser.add_argument("--profiles", nargs="+", default=list(PROFILES))
+        parser.add_argument(
+            "--measure-requests",
+            action="store_true",
+            help="Measure requests under the current profile and print JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if options["measure_requests"]:
+            with scratch_database(debug=settings.DEBUG):
+                self.stdout.write(json.dumps(self.measure_requests(**options)))
+            return
+
+        self.stdout.write(f"{'profile':<8} {'startup ms':>11}")
+        for profile in options["profiles"]:
+            startup = self.measure_startup(profile, options["startups"])
+            self.stdout.write(f"{profile:<8} {startup * 1000:>11.0f}")
+
+        self.stdout.write(
+            f"\n{'profile':<8} {'path':<18} {'us/request':>11} {'queries logged':>15}"
+        )
+        for profile in options["profiles"]:
+            result = subprocess.run(
+                [
+                    sys.executable,
+                    "manage.py",
+                    "bench_settings",
+                    "--measure-requests",
+                    "--requests",
+                    str(options["requests"]),
+                    "--paths",
+                    *options["paths"],
+                ],
+                env=profile_env(profile),
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            measured = json.loads(result.stdout.strip().splitlines()[-1])
+            for path, numbers in measured.items():
+                self.stdout.write(
+                    f"{profile:<8} {path:<18} "
+                    f"{numbers['seconds_per_request'] * 1e6:>11.0f} "
+                    f"{numbers['queries_logged']:>15}"
+                )
+
+    def measure_startup(self, profile, startups) -> float:
+        """Median seconds a fresh interpreter takes to load the application."""
+        durations = []
+        for _ in range(startups):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT],
+                env=profile_env(profile),
+                cwd=settings.BASE_DIR,
+                check=True,
+            )
+            durations.append(time.perf_counter() - start)
+        return statistics.median(durations)
+
+    def measure_requests(self, paths, requests, **options) -> dict:
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Bench {i}",
+                author="Bench Author",
+                cover=Book.Cover.HARD,
+                inventory=1,
+                daily_fee=Decimal("1.00"),
+            )
+            for i in range(20)
+        )
+        user = get_user_model().objects.create_user("settings@bench.local", "password")
+        Borrowing.objects.bulk_create(Borrowing(book=book, user=user) for book in books)
+        token = TokenObtainPairSerializer.get_token(user).access_token
+        client = Client(
+            HTTP_AUTHORIZE=f"Bearer {token}", HTTP_ACCEPT="application/json"
+        )
+
+        measured = {}
+        for path in paths:
+            client.get(path)  # warm caches
+            connection.queries_log.clear()
+            with timer() as elapsed:
+                for _ in range(requests):
+                    response = client.get(path)
+                    assert response.status_code == 200, response.content
+            measured[path] = {
+                "seconds_per_request": elapsed["elapsed"] / requests,
+                "queries_logged": len(connection.queries_log),
+            }
+        return measured
@@ -0,0 +1,90 @@
+import os
+import tempfile
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from benchmarks.utils import percentile, scratch_database, timer
+from books.models import Book
+from library_service.throttling import RedisBuckets, SharedMemoryBuckets
+
+# Large enough that no request is refused while timing.
+RATES = {
+    **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"],
+    "books.list": "1000000000/s",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time one token taken from the shared-memory and Redis bucket stores, "
+        "and the latency throttling adds to GET /api/books/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--takes", type=int, default=100_000)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument(
+            "--redis-url",
+            default=settings.THROTTLE_REDIS_URL,
+            help="Also time the Redis store; unset skips it.",
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.join(tempfile.mkdtemp(), "throttle")
+        stores = {"shared memory": SharedMemoryBuckets(path, settings.THROTTLE_SLOTS)}
+        if options["redis_url"]:
+            stores["redis"] = RedisBuckets(options["redis_url"])
+
+        takes = options["takes"]
+        for name, store in stores.items():
+            with timer() as taken:
+                for i in range(takes):
+                    store.take(f"bench:{i % 1000}", 1_000_000_000, 1e9)
+            self.stdout.write(
+                f"{name}: {taken['elapsed'] / takes * 1e6:.2f}us per take"
+            )
+
+        rest_framework = {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": RATES,
+        }
+        with scratch_database(), override_settings(
+            REST_FRAMEWORK=rest_framework,
+            THROTTLE_REDIS_URL=None,
+            THROTTLE_SHARED_MEMORY_PATH=path,
+        ):
+            Book.objects.bulk_create(
+                Book(
+                    title=f"Bench {i}",
+                    author="Bench Author",
+                    cover=Book.Cover.HARD,
+                    inventory=1,
+                    daily_fee=Decimal("1.00"),
+                )
+                for i in range(100)
+            )
+            self.stdout.write(f"{'throttling':<11} {'p50 ms':>8} {'p95 ms':>8}")
+            for enabled in (False, True):
+                with override_settings(THROTTLE_ENABLED=enabled):
+                    latencies = self.list_books(options["requests"])
+                self.stdout.write(
+                    f"{'on' if enabled else 'off':<11} "
+                    f"{percentile(latencies, 0.5) * 1000:>8.3f} "
+                    f"{percentile(latencies, 0.95) * 1000:>8.3f}"
+                )
+
+    def list_books(self, requests) -> list:
+        client = Client()
+        latencies = []
+        # The first requests warm the cache and the connection.
+        for i in range(requests + 100):
+            with timer() as elapsed:
+                response = client.get("/api/books/", HTTP_ACCEPT="application/json")
+            assert response.status_code == 200, response.status_code
+            if i >= 100:
+                latencies.append(elapsed["elapsed"])
+        return latencies
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from benchmarks.seed import BENCH_PASSWORD, BORROWINGS_SQL, seed
+from benchmarks.utils import timer
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the configured, empty database with books, users and borrowings "
+        "for bench_api --existing. Every user logs in with the same password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--borrowings", type=int, default=20_000_000)
+        parser.add_argument(
+            "--days", type=int, default=730, help="Days the borrowings span."
+        )
+        parser.add_argument("--batch-size", type=int, default=1_000_000)
+
+    def handle(self, *args, **options):
+        if Book.objects.exists():
+            raise CommandError("The database already has books; seed an empty one.")
+        if connection.vendor not in BORROWINGS_SQL:
+            raise CommandError(f"Unsupported database vendor: {connection.vendor}")
+
+        with timer() as elapsed:
+            seed(
+                options["books"],
+                options["users"],
+                options["borrowings"],
+                days=options["days"],
+                batch_size=options["batch_size"],
+            )
+        self.stdout.write(
+            f"Seeded {options['books']} books, {options['users']} users and "
+            f"{options['borrowings']} borrowings into {connection.vendor} in "
+            f"{elapsed['elapsed']:.0f}s. Users log in with {BENCH_PASSWORD!r}."
+        )
@@ -0,0 +1,150 @@
+"""Realistic volumes of books, users and borrowings for the load benchmarks.
+
+Books and users go through bulk_create so every column gets its model
+default. All users share one password hash, of BENCH_PASSWORD, so seeding
+100k of them does not hash 100k times. Borrowings are generated by the
+database, so tens of millions never pass through Python.
+"""
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+
+from books.models import Book
+from borrowings.models import Borrowing
+
+BENCH_PASSWORD = "bench-password"
+BENCH_EMAIL_DOMAIN = "@bench.local"
+AUTHORS = 50_000
+LOAN_DAYS = 14
+
+# Borrowings n in [%(low)s, %(high)s), borrowed n %% days days ago and
+# returned 0 to 20 days later, so about a third are late. Among those
+# borrowed in the last two weeks one in four is still out.
+BORROWINGS_SQL = {
+    "sqlite": """
+        WITH RECURSIVE seq(n) AS (
+            SELECT %(low)s UNION ALL SELECT n + 1 FROM seq WHERE n + 1 < %(high)s
+        )
+        INSERT INTO borrowings_borrowing
+            (borrow_date, expected_return_date, actual_return_date, book_id, user_id)
+        SELECT
+            date(%(today)s, '-' || (n %% %(days)s) || ' days'),
+            date(%(today)s, '-' || (n %% %(days)s) || ' days', '+14 days'),
+            CASE WHEN n %% %(days)s < 14 AND (n / %(days)s) %% 4 = 0 THEN NULL
+            ELSE min(
+                date(%(today)s, '-' || (n %% %(days)s) || ' days',
+                     '+' || (n %% 21) || ' days'),
+                %(today)s
+            ) END,
+            %(book)s + (n * 7919) %% %(books)s,
+            %(user)s + (n * 104729) %% %(users)s
+        FROM seq
+    """,
+    "postgresql": """
+        INSERT INTO borrowings_borrowing
+            (borrow_date, expected_return_date, actual_return_date, book_id, user_id)
+        SELECT
+            %(today)s::date - n %% %(days)s,
+            %(today)s::date - n %% %(days)s + 14,
+            CASE WHEN n %% %(days)s < 14 AND (n / %(days)s) %% 4 = 0 THEN NULL
+            ELSE least(%(today)s::date - n %% %(days)s + n %% 21, %(today)s::date)
+            END,
+            %(book)s + (n::bigint * 7919) %% %(books)s,
+            %(user)s + (n::bigint * 104729) %% %(users)s
+        FROM generate_series(%(low)s, %(high)s - 1) AS n
+    """,
+}
+
+
+def bench_email(n: int) -> str:
+    return f"bench{n}{BENCH_EMAIL_DOMAIN}"
+
+
+def batched(objects, size):
+    objects = iter(objects)
+    while batch := list(islice(objects, size)):
+        yield batch
+
+
+def seed_books(count, batch_size=10_000) -> int:
+    """Create count books, returning the first id."""
+    first = None
+    books = (
+        Book(
+            title=f"Bench Book {n}",
+            author=f"Bench Author {n % AUTHORS}",
+            cover=Book.Cover.HARD if n % 3 else Book.Cover.SOFT,
+            inventory=5,
+            daily_fee=Decimal(n % 300 + 10) / 100,
+        )
+        for n in range(count)
+    )
+    for batch in batched(books, batch_size):
+        with transaction.atomic():
+            created = Book.objects.bulk_create(batch)
+        first = first or created[0].id
+    return first
+
+
+def seed_users(count, batch_size=10_000) -> int:
+    """Create count users who all log in with BENCH_PASSWORD."""
+    User = get_user_model()
+    password = make_password(BENCH_PASSWORD)
+    first = None
+    users = (User(email=bench_email(n), password=password) for n in range(count))
+    for batch in batched(users, batch_size):
+        with transaction.atomic():
+            created = User.objects.bulk_create(batch)
+        first = first or created[0].id
+    return first
+
+
+def seed_borrowings(count, first_book, books, first_user, users, days, batch_size):
+    for low in range(0, count, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                BORROWINGS_SQL[connection.vendor],
+                {
+                    "low": low,
+                    "high": min(count, low + batch_size),
+                    "today": date.today().isoformat(),
+                    "days": days,
+                    "book": first_book,
+                    "books": books,
+                    "user": first_user,
+                    "users": users,
+                },
+            )
+
+
+def count_active_borrowings() -> None:
+    """Set the users' active_borrowings counters from the seeded borrowings.
+
+    Inventory is what is left on the shelf, so books need no update.
+    """
+    active = Borrowing.objects.filter(actual_return_date__isnull=True).order_by()
+    with transaction.atomic():
+        get_user_model().objects.filter(id__in=active.values("user_id")).update(
+            active_borrowings=Subquery(
+                active.filter(user_id=OuterRef("id"))
+                .values("user_id")
+                .annotate(count=Count("id"))
+                .values("count")
+            )
+        )
+
+
+def seed(books, users, borrowings, days=730, batch_size=1_000_000) -> None:
+    """Fill an empty database with books, users and borrowings.
+
+    Only the vendors in BORROWINGS_SQL are supported; callers check first.
+    """
+    first_book = seed_books(books)
+    first_user = seed_users(users)
+    seed_borrowings(borrowings, first_book, books, first_user, users, days, batch_size)
+    count_active_borrowings()
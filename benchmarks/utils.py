@@ -0,0 +1,61 @@
+import os
+import socket
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import override_settings
+
+
+@contextmanager
+def scratch_database(alias=DEFAULT_DB_ALIAS, debug=False):
+    """Run the block against a freshly migrated throwaway database.
+
+    SQLite gets a file-backed database instead of the in-memory default, so
+    worker threads open real connections and contend for the same locks a
+    production deployment would. DEBUG is set to debug, off by default so
+    query logging does not skew timings, and the test client host is allowed.
+    Throttling is off, as every request comes from the same few clients.
+    """
+    connection = connections[alias]
+    test_settings = connection.settings_dict.setdefault("TEST", {})
+    if connection.vendor == "sqlite" and not test_settings.get("NAME"):
+        test_settings["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(
+            DEBUG=debug,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            THROTTLE_ENABLED=False,
+        ):
+            yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def timer():
+    """Yield a dict whose "elapsed" key is filled in when the block exits."""
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["elapsed"] = time.perf_counter() - start
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[
+        round(fraction * 100) - 1
+    ]
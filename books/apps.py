@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BooksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "books"
+
+    def ready(self):
+        import books.signals
+        from books.search import install_search_index
+
+        post_migrate.connect(install_search_index, sender=self)
@@ -0,0 +1,91 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from rest_framework import exceptions
+
+from books.cache import (
+    adetail_cache_key,
+    alist_cache_key,
+    etag_matches,
+    get_cache,
+)
+from books.views import BookViewSet
+from library_service.async_api import (
+    JSON,
+    async_read_view,
+    authenticate,
+    check_throttles,
+    keyset_requested,
+    paginate,
+    prerendered_response,
+    viewset_for,
+)
+from library_service.replicas import reads_from_replica
+
+
+async def cached(request, key, etag, render):
+    """Async counterpart of BookViewSet.cached_response, sharing its entries."""
+    if etag_matches(request, etag):
+        return HttpResponseNotModified(headers={"ETag": etag})
+
+    cache = get_cache()
+    content = await cache.aget(key)
+    if content is None:
+        content = JSON.render(await render())
+        await cache.aset(key, content, timeout=settings.BOOKS_CACHE_TIMEOUT)
+    return prerendered_response(content, headers={"ETag": etag})
+
+
+async def book_list(request):
+    drf_request = await authenticate(request)
+    view = viewset_for(BookViewSet, drf_request, "list")
+    await check_throttles(view, drf_request)
+    page_size = view.pagination_class.page_size
+
+    async def render():
+        with reads_from_replica(await view.auses_replica()):
+            # Searching reads the index statistics, so it cannot run here.
+            queryset = view.list_queryset(await sync_to_async(view.get_queryset)())
+            page = await paginate(drf_request, queryset, page_size)
+        objects = page.pop("objects")
+        return {**page, "results": view.list_data(objects)}
+
+    key, etag = await alist_cache_key(request)
+    return await cached(request, key, etag, render)
+
+
+async def book_detail(request, pk):
+    drf_request = await authenticate(request)
+    view = viewset_for(BookViewSet, drf_request, "retrieve", pk=pk)
+    await check_throttles(view, drf_request)
+
+    async def render():
+        try:
+            with reads_from_replica(await view.auses_replica()):
+                book = await view.get_queryset().filter(pk=pk).afirst()
+        except (TypeError, ValueError):
+            book = None
+        if book is None:
+            raise exceptions.NotFound()
+        return view.get_serializer(book).data
+
+    key, etag = await adetail_cache_key(request, pk)
+    return await cached(request, key, etag, render)
+
+
+book_list_view = async_read_view(
+    book_list,
+    BookViewSet.as_view({"get": "list", "post": "create"}),
+    use_fallback=keyset_requested(BookViewSet),
+)
+book_detail_view = async_read_view(
+    book_detail,
+    BookViewSet.as_view(
+        {
+            "get": "retrieve",
+            "put": "update",
+            "patch": "partial_update",
+            "delete": "destroy",
+        }
+    ),
+)
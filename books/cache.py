@@ -0,0 +1,136 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import parse_etags
+
+CATALOGUE_VERSION_KEY = "books:catalogue:version"
+# Set for REPLICA_PIN_SECONDS after a catalogue write (a book created,
+# edited, deleted or imported). Pages cached under the new versions must
+# not be rendered from a replica that lags behind. Inventory changes do not
+# pin: they run on every borrow and return, and would keep book reads off
+# the replicas for good.
+CATALOGUE_PIN_KEY = "books:catalogue:pinned"
+
+
+def get_cache():
+    return caches[settings.BOOKS_CACHE_ALIAS]
+
+
+def book_version_key(book_id) -> str:
+    return f"books:book:{book_id}:version"
+
+
+def _fresh_version() -> int:
+    # A version key that was evicted must not come back with a value some
+    # stale entry was stored under, so restart from the clock, not from 1.
+    return time.time_ns()
+
+
+def get_versions(*keys) -> list[int]:
+    """Current values of the given version keys, creating missing ones."""
+    cache = get_cache()
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+async def aget_versions(*keys) -> list[int]:
+    """Async get_versions(), for the ASGI read views."""
+    cache = get_cache()
+    found = await cache.aget_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, _fresh_version(), timeout=None)
+            found[key] = await cache.aget(key)
+        versions.append(found[key])
+    return versions
+
+
+def bump_versions(book_ids=(), pin=False) -> None:
+    cache = get_cache()
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOGUE_VERSION_KEY, _fresh_version(), timeout=None)
+    if book_ids:
+        # One round trip however many books changed: a fresh clock value is
+        # past any version these keys held before.
+        version = _fresh_version()
+        cache.set_many(
+            {book_version_key(book_id): version for book_id in book_ids},
+            timeout=None,
+        )
+    if pin and settings.DATABASE_REPLICAS:
+        cache.set(CATALOGUE_PIN_KEY, True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def catalogue_pinned() -> bool:
+    return get_cache().get(CATALOGUE_PIN_KEY, False)
+
+
+async def acatalogue_pinned() -> bool:
+    return await get_cache().aget(CATALOGUE_PIN_KEY, False)
+
+
+def invalidate_books(book_ids=(), pin=False) -> None:
+    """Invalidate cached list pages and the detail entries of book_ids.
+
+    Versions are bumped right away, so the writing transaction no longer
+    reads its own stale entries, and again on commit, since a concurrent
+    reader may have cached the pre-commit rows under the first bump. pin
+    marks a catalogue write, which also pins book reads to the primary.
+    """
+    book_ids = list(book_ids)
+    bump_versions(book_ids, pin)
+    transaction.on_commit(lambda: bump_versions(book_ids, pin))
+
+
+def list_cache_key(request) -> tuple[str, str]:
+    """Cache key and ETag for a catalogue page."""
+    (version,) = get_versions(CATALOGUE_VERSION_KEY)
+    # Pagination links are absolute, so the host is part of the page.
+    return _key_and_etag(
+        "list", version, request.get_host() + request.get_full_path()
+    )
+
+
+async def alist_cache_key(request) -> tuple[str, str]:
+    (version,) = await aget_versions(CATALOGUE_VERSION_KEY)
+    return _key_and_etag(
+        "list", version, request.get_host() + request.get_full_path()
+    )
+
+
+def detail_cache_key(request, book_id) -> tuple[str, str]:
+    """Cache key and ETag for a single book."""
+    (version,) = get_versions(book_version_key(book_id))
+    return _key_and_etag("detail", version, str(book_id))
+
+
+async def adetail_cache_key(request, book_id) -> tuple[str, str]:
+    (version,) = await aget_versions(book_version_key(book_id))
+    return _key_and_etag("detail", version, str(book_id))
+
+
+def etag_matches(request, etag) -> bool:
+    """Whether the request's If-None-Match names etag.
+
+    Tags are compared weakly, as RFC 9110 asks for If-None-Match, and "*"
+    matches any.
+    """
+    tags = parse_etags(request.headers.get("If-None-Match", ""))
+    return "*" in tags or etag in {tag.removeprefix("W/") for tag in tags}
+
+
+def _key_and_etag(kind, version, identity):
+    digest = hashlib.sha1(f"{kind}:{version}:{identity}".encode()).hexdigest()
+    return f"books:{kind}:{digest}", f'"{digest[:20]}"'
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.importer import IMPORT_FORMATS, import_books, import_format
+
+
+class Command(BaseCommand):
+    help = (
+        "Import books from a CSV or JSON Lines file, adding inventory to "
+        "books that already exist. Rejected rows go to a side file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--input-format",
+            choices=IMPORT_FORMATS,
+            help="Defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--rejects",
+            help="Where to write rejected rows as JSON Lines "
+            "(default: <path>.rejects.jsonl).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, path, input_format, rejects, batch_size, **options):
+        fmt = input_format or import_format(path)
+        if fmt is None:
+            raise CommandError("Cannot tell the format, pass --input-format.")
+        rejects = rejects or f"{path}.rejects.jsonl"
+
+        with open(path, newline="", encoding="utf-8-sig") as stream, open(
+            rejects, "w", encoding="utf-8"
+        ) as rejects_file:
+            report = import_books(
+                stream,
+                fmt,
+                on_reject=lambda rejection: rejects_file.write(
+                    json.dumps(rejection, default=str) + "\n"
+                ),
+                batch_size=batch_size,
+            )
+
+        self.stdout.write(
+            f"Imported {report['rows']} rows in {report['seconds']}s "
+            f"({report['rows_per_second']} rows/s): {report['created']} created, "
+            f"{report['merged']} merged, {report['rejected']} rejected"
+            + (f" (see {rejects})" if report["rejected"] else "")
+            + "."
+        )
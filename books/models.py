@@ -1,6 +1,73 @@
+from collections import defaultdict
+
 from django.db import models
+from django.db.models import Case, F, When
 from django.utils.translation import gettext_lazy as _
 
+from books.cache import invalidate_books
+
+
+class BookQuerySet(models.QuerySet):
+    def reserve(self, book_id: int) -> bool:
+        """Take one copy out of inventory, returns False if none are left."""
+        reserved = self.filter(pk=book_id, inventory__gt=0).update(
+            inventory=F("inventory") - 1
+        )
+        if reserved:
+            invalidate_books([book_id])
+        return bool(reserved)
+
+    def release(self, book_id: int) -> bool:
+        """Put one copy back into inventory."""
+        released = self.filter(pk=book_id).update(inventory=F("inventory") + 1)
+        if released:
+            invalidate_books([book_id])
+        return bool(released)
+
+    def reserve_many(self, counts: dict[int, int]) -> dict[int, int]:
+        """Take up to counts[book_id] copies of each book in one UPDATE.
+
+        Must run inside a transaction: inventories are read with
+        select_for_update, so the copies granted here cannot be handed out
+        by a concurrent request before the update lands.
+        Returns the number of copies granted per existing book.
+        """
+        inventories = dict(
+            self.select_for_update()
+            .filter(pk__in=counts)
+            .values_list("pk", "inventory")
+        )
+        granted = {
+            book_id: min(counts[book_id], inventory)
+            for book_id, inventory in inventories.items()
+        }
+        self._shift_inventory({book_id: -n for book_id, n in granted.items()})
+        return granted
+
+    def release_many(self, counts: dict[int, int]) -> None:
+        """Put counts[book_id] copies of each book back in one UPDATE."""
+        self._shift_inventory(counts)
+
+    def _shift_inventory(self, deltas: dict[int, int]) -> None:
+        by_delta = defaultdict(list)
+        for book_id, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(book_id)
+        if not by_delta:
+            return
+
+        self.filter(pk__in=[pk for pks in by_delta.values() for pk in pks]).update(
+            inventory=Case(
+                *(
+                    When(pk__in=pks, then=F("inventory") + delta)
+                    for delta, pks in by_delta.items()
+                ),
+                default=F("inventory"),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+        invalidate_books(pk for pks in by_delta.values() for pk in pks)
+
 
 class Book(models.Model):
     class Cover(models.TextChoices):
@@ -13,5 +80,35 @@ class Book(models.Model):
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Catalogue imports upsert on it, merging copies of known books.
+            models.UniqueConstraint(
+                fields=["title", "author", "cover"], name="book_import_key"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.title} by {self.author}"
+
+
+class BookSearchEntry(models.Model):
+    """A book's row in the SQLite full-text index, see books.search.
+
+    Declared only so book queries can join the index: the table is an FTS5
+    virtual table that books.search creates and keeps in step itself.
+    """
+
+    book = models.OneToOneField(
+        Book,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        related_name="search_entry",
+    )
+
+    class Meta:
+        managed = False
+        db_table = "books_book_fts"
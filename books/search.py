@@ -0,0 +1,213 @@
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "books_book_fts"
+VOCAB_TABLE = "books_book_fts_vocab"
+
+# FTS5 external-content index over books_book, kept in step by triggers so
+# bulk inserts and raw updates are indexed too, not only Model.save().
+SQLITE_SETUP = (
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, author,
+        content='books_book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title, author ON books_book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO {FTS_TABLE}(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+# Per-term document counts, read to tell whether a query has few enough
+# matches to rank.
+SQLITE_VOCAB_SETUP = (
+    f"CREATE VIRTUAL TABLE {VOCAB_TABLE} USING fts5vocab({FTS_TABLE}, 'row')",
+)
+
+POSTGRES_VECTOR = "to_tsvector('simple', books_book.title || ' ' || books_book.author)"
+
+POSTGRES_SETUP = (
+    f"CREATE INDEX IF NOT EXISTS books_book_search_idx "
+    f"ON books_book USING GIN ({POSTGRES_VECTOR})",
+)
+
+# Title hits outrank author hits in SQLite's bm25().
+TITLE_WEIGHT = 10.0
+AUTHOR_WEIGHT = 1.0
+
+# Matches past which a query is listed by id instead of ranked. Ranking
+# scores every match, so a common word or a short prefix would cost more
+# than the substring scan the search replaced.
+RANKED_MATCHES_LIMIT = 10_000
+# Shortest last term matched as a prefix; the FTS5 table keeps prefix
+# indexes from two characters, and one letter would match most books.
+MIN_PREFIX_LENGTH = 2
+# Words in most titles, left out of queries that have other terms. A fixed
+# list, so what a query matches does not change as the catalogue grows.
+STOPWORDS = frozenset(
+    ("a", "an", "and", "at", "by", "for", "from", "in", "of", "on", "or", "the", "to")
+)
+
+
+def install_search_index(using="default", **kwargs):
+    """Create the full-text index for the database behind ``using``.
+
+    Hooked to post_migrate, so it runs for new databases (including the test
+    database) and is a no-op once the index exists.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            tables = connection.introspection.table_names(cursor)
+            if "books_book" in tables:
+                setup = () if FTS_TABLE in tables else SQLITE_SETUP
+                if VOCAB_TABLE not in tables:
+                    setup += SQLITE_VOCAB_SETUP
+                for statement in setup:
+                    cursor.execute(statement)
+        elif connection.vendor == "postgresql":
+            for statement in POSTGRES_SETUP:
+                cursor.execute(statement)
+
+
+def search_terms(query: str) -> list[str]:
+    """The terms of query that are searched for.
+
+    A last term too short to match as a prefix is left out, and so are
+    stopwords unless nothing else is left.
+    """
+    terms = re.findall(r"\w+", query.lower())
+    if terms and len(terms[-1]) < MIN_PREFIX_LENGTH:
+        terms.pop()
+    return [term for term in terms if term not in STOPWORDS] or terms
+
+
+def sqlite_matches_estimate(using, terms: list[str], stop: int) -> int:
+    """Upper bound on the books matching every term, the last as a prefix.
+
+    Read from the FTS5 vocabulary: the least frequent term bounds the
+    matches. A prefix sums its completions, counting a book once per
+    completion it holds. Counting a term stops once it passes stop.
+    """
+    estimate = stop + 1
+    with connections[using].cursor() as cursor:
+        for position, term in enumerate(terms):
+            # The index folds diacritics, so the vocabulary holds them folded.
+            term = "".join(
+                char
+                for char in unicodedata.normalize("NFKD", term)
+                if not unicodedata.combining(char)
+            )
+            if position < len(terms) - 1:
+                cursor.execute(
+                    f"SELECT doc FROM {VOCAB_TABLE} WHERE term = %s", [term]
+                )
+            else:
+                cursor.execute(
+                    f"SELECT doc FROM {VOCAB_TABLE} WHERE term >= %s AND term < %s",
+                    [term, term[:-1] + chr(ord(term[-1]) + 1)],
+                )
+            docs = 0
+            for (count,) in iter(cursor.fetchone, None):
+                docs += count
+                if docs > stop:
+                    break
+            estimate = min(estimate, docs)
+    return estimate
+
+
+def many_matches(using, matching: str, params) -> bool:
+    """Whether the query matching selects more than RANKED_MATCHES_LIMIT rows.
+
+    Stops counting at the limit, so it is cheap however many rows match.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT count(*) FROM ({matching} LIMIT %s) AS matches",
+            [*params, RANKED_MATCHES_LIMIT + 1],
+        )
+        return cursor.fetchone()[0] > RANKED_MATCHES_LIMIT
+
+
+def search_books(queryset, query: str):
+    """Filter queryset to books with a word starting with each term, best first.
+
+    Terms come from search_terms(). Every term but the last must match a
+    whole word; the last is matched as a prefix so the search works for
+    type-ahead. Queries with more than RANKED_MATCHES_LIMIT matches are
+    ordered by id rather than ranked. Backends without a full-text index
+    fall back to icontains.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "sqlite":
+        match = " ".join(f'"{term}"' for term in terms) + "*"
+        matches = sqlite_matches_estimate(queryset.db, terms, RANKED_MATCHES_LIMIT)
+        if matches > RANKED_MATCHES_LIMIT:
+            return queryset.filter(
+                id__in=RawSQL(
+                    f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                    [match],
+                )
+            ).order_by("id")
+        # Joined rather than filtered by id so bm25() is read from the rows
+        # the MATCH yields, instead of running the MATCH again for each book.
+        rank = RawSQL(
+            f"bm25({FTS_TABLE}, {TITLE_WEIGHT}, {AUTHOR_WEIGHT})",
+            [],
+            output_field=FloatField(),
+        )
+        matching = RawSQL(f"{FTS_TABLE} MATCH %s", [match], output_field=BooleanField())
+        return (
+            queryset.filter(search_entry__isnull=False)
+            .filter(matching)
+            .annotate(search_rank=rank)
+            .order_by("search_rank", "id")
+        )
+
+    if vendor == "postgresql":
+        tsquery = " & ".join(terms) + ":*"
+        matching = f"{POSTGRES_VECTOR} @@ to_tsquery('simple', %s)"
+        queryset = queryset.filter(
+            RawSQL(matching, [tsquery], output_field=BooleanField())
+        )
+        if many_matches(
+            queryset.db, f"SELECT 1 FROM books_book WHERE {matching}", [tsquery]
+        ):
+            return queryset.order_by("id")
+        rank = RawSQL(
+            f"ts_rank({POSTGRES_VECTOR}, to_tsquery('simple', %s))",
+            [tsquery],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(search_rank=rank).order_by("-search_rank", "id")
+
+    for term in terms:
+        queryset = queryset.filter(Q(title__icontains=term) | Q(author__icontains=term))
+    return queryset.order_by("id")
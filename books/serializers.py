@@ -1,9 +1,33 @@
 from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator
 
 from books.models import Book
+from library_service.fast_serializers import Column, ValuesSerializer, decimal_string
 
 
 class BookSerializer(serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = ("id", "title", "author", "cover", "inventory", "daily_fee")
+        validators = [
+            UniqueTogetherValidator(
+                queryset=Book.objects.all(), fields=("title", "author", "cover")
+            )
+        ]
+
+
+class BookValuesSerializer(ValuesSerializer):
+    """BookSerializer for list pages."""
+
+    columns = (
+        Column("id"),
+        Column("title"),
+        Column("author"),
+        Column("cover"),
+        Column("inventory"),
+        Column("daily_fee", convert=decimal_string),
+    )
+
+
+class BookImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
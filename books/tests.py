@@ -1,13 +1,29 @@
+import json
+import os
+import tempfile
+from datetime import date, datetime, timezone
 from decimal import Decimal
+from io import StringIO
+from itertools import count
+from unittest import mock
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
+from books.cache import get_cache
+from books.importer import import_books, read_rows, upsert_batch, validate_batch
 from books.models import Book
-from books.serializers import BookSerializer
+from books.serializers import BookSerializer, BookValuesSerializer
+from library_service.metrics import registry
+from library_service.renderers import FastJSONRenderer
+from user.serializers import TokenObtainPairSerializer
 
 
 BOOKS_URL = reverse("books-list")
@@ -25,9 +41,13 @@ def detail_url(book_id):
     return reverse("books-detail", args=[book_id])
 
 
+BOOK_NUMBERS = count(1)
+
+
 def sample_book(**params):
+    # Titled apart, as (title, author, cover) is unique.
     defaults = {
-        "title": "Test Title",
+        "title": f"Test Title {next(BOOK_NUMBERS)}",
         "author": "Test Author",
         "cover": "HARD",
         "inventory": 2,
@@ -101,6 +121,14 @@ class AdminBooksApiTest(TestCase):
         for key in BOOK_PAYLOAD.keys():
             self.assertEqual(BOOK_PAYLOAD[key], getattr(book, key))
 
+    def test_create_duplicate_book_refused(self):
+        self.client.post(BOOKS_URL, BOOK_PAYLOAD)
+
+        res = self.client.post(BOOKS_URL, BOOK_PAYLOAD)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Book.objects.count(), 1)
+
     def test_update_book(self):
         book = sample_book()
         payload = {
@@ -128,3 +156,389 @@ class AdminBooksApiTest(TestCase):
 
         book = Book.objects.first()
         self.assertEqual(None, book)
+
+
+class BookKeysetPaginationTests(TestCase):
+    def test_cursor_pages_by_id(self):
+        client = APIClient()
+        ids = [sample_book().id for _ in range(25)]
+
+        first = client.get(BOOKS_URL, {"pagination": "cursor"})
+        second = client.get(first.data["next"])
+
+        self.assertEqual([book["id"] for book in first.data["results"]], ids[:20])
+        self.assertEqual([book["id"] for book in second.data["results"]], ids[20:])
+        self.assertIsNone(second.data["next"])
+
+
+class BookCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.book = sample_book()
+
+    def test_list_served_from_cache(self):
+        first = self.client.get(BOOKS_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(BOOKS_URL)
+
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get(detail_url(self.book.id))["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(detail_url(self.book.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_none_match_compares_whole_tags(self):
+        etag = self.client.get(detail_url(self.book.id))["ETag"]
+        url = detail_url(self.book.id)
+
+        for header in (f'"other", W/{etag}', "*"):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED, header)
+        for header in (f'"a{etag}"', f"{etag[:-2]}\""):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(res.status_code, status.HTTP_200_OK, header)
+
+    def test_save_invalidates_detail_and_list(self):
+        detail_etag = self.client.get(detail_url(self.book.id))["ETag"]
+        list_etag = self.client.get(BOOKS_URL)["ETag"]
+
+        self.book.title = "Renamed"
+        self.book.save()
+
+        detail = self.client.get(detail_url(self.book.id))
+        self.assertNotEqual(detail["ETag"], detail_etag)
+        self.assertEqual(detail.json()["title"], "Renamed")
+        listing = self.client.get(BOOKS_URL)
+        self.assertNotEqual(listing["ETag"], list_etag)
+        self.assertEqual(listing.json()["results"][0]["title"], "Renamed")
+
+    def test_inventory_change_invalidates_detail(self):
+        self.client.get(detail_url(self.book.id))
+
+        Book.objects.reserve(self.book.id)
+
+        res = self.client.get(detail_url(self.book.id))
+        self.assertEqual(res.json()["inventory"], 1)
+
+
+class BookSearchTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.hobbit = sample_book(title="The Hobbit", author="J. R. R. Tolkien")
+        self.dune = sample_book(title="Dune", author="Frank Herbert")
+        self.about = sample_book(title="Reading Tolkien", author="Hobbit Scholar")
+
+    def search(self, query):
+        res = self.client.get(BOOKS_URL, {"q": query})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [book["id"] for book in res.data["results"]]
+
+    def test_search_by_title_and_author(self):
+        self.assertEqual(self.search("dune"), [self.dune.id])
+        self.assertEqual(self.search("herbert"), [self.dune.id])
+
+    def test_prefix_match_on_last_term(self):
+        self.assertEqual(self.search("frank herb"), [self.dune.id])
+        self.assertEqual(self.search("du"), [self.dune.id])
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.search("hobbit"), [self.hobbit.id, self.about.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.dune.title = "Children of Dune"
+        self.dune.save()
+        self.assertEqual(self.search("children"), [self.dune.id])
+
+        self.dune.delete()
+        self.assertEqual(self.search("dune"), [])
+
+    def test_blank_query_matches_nothing(self):
+        self.assertEqual(self.search("  "), [])
+
+    def test_short_last_term_is_left_out(self):
+        self.assertEqual(self.search("dune h"), [self.dune.id])
+        self.assertEqual(self.search("d"), [])
+
+    def test_stopwords_are_left_out(self):
+        self.assertEqual(self.search("the hobbit"), [self.hobbit.id, self.about.id])
+        self.assertEqual(self.search("the"), [self.hobbit.id])
+
+    def test_matches_word_starts_only(self):
+        self.assertEqual(self.search("olkien"), [])
+
+    @mock.patch("books.search.RANKED_MATCHES_LIMIT", 1)
+    def test_many_matches_listed_by_id(self):
+        self.assertEqual(self.search("tolkien"), [self.hobbit.id, self.about.id])
+
+
+IMPORT_CSV = """title,author,cover,inventory,daily_fee
+Dune,Frank Herbert,HARD,3,1.50
+Dune,Frank Herbert,hard,2,1.50
+Emma,Jane Austen,SOFT,1,0.75
+,Nobody,HARD,1,1.00
+Bad Cover,Someone,SPIRAL,1,1.00
+Negative,Someone,SOFT,-1,1.00
+Too Precise,Someone,SOFT,1,1.005
+"""
+
+
+class BookImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            "import@test.com", "testpassword"
+        )
+        self.client.force_authenticate(self.admin)
+        self.existing = sample_book(
+            title="Emma", author="Jane Austen", cover="SOFT", inventory=4
+        )
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, "books.csv")
+        with open(self.path, "w") as stream:
+            stream.write(IMPORT_CSV)
+
+    def test_command_upserts_and_writes_rejects(self):
+        out = StringIO()
+
+        call_command("import_books", self.path, stdout=out)
+
+        dune = Book.objects.get(title="Dune")
+        self.assertEqual(dune.inventory, 5)
+        self.assertEqual(dune.daily_fee, Decimal("1.50"))
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.inventory, 5)
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertIn("1 created, 1 merged, 4 rejected", out.getvalue())
+
+        with open(f"{self.path}.rejects.jsonl") as stream:
+            rejects = [json.loads(line) for line in stream]
+        self.assertEqual([reject["line"] for reject in rejects], [5, 6, 7, 8])
+        self.assertEqual(
+            [list(reject["errors"]) for reject in rejects],
+            [["title"], ["cover"], ["inventory"], ["daily_fee"]],
+        )
+
+    def test_command_reads_json_lines(self):
+        path = os.path.join(os.path.dirname(self.path), "books.jsonl")
+        with open(path, "w") as stream:
+            stream.write(
+                '{"title": "Dune", "author": "Frank Herbert", "cover": "SOFT", '
+                '"inventory": 2, "daily_fee": 1.25}\n'
+                "not json\n"
+            )
+
+        call_command("import_books", path, stdout=StringIO())
+
+        self.assertEqual(Book.objects.get(title="Dune").daily_fee, Decimal("1.25"))
+
+    def test_endpoint_imports_upload(self):
+        upload = SimpleUploadedFile("books.csv", IMPORT_CSV.encode())
+
+        res = self.client.post(
+            reverse("books-import-books"), {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 1)
+        self.assertEqual(res.data["rejected"], 4)
+        self.assertEqual(len(res.data["rejected_rows"]), 4)
+
+    def test_reimport_adds_copies_without_duplicates(self):
+        self.assertEqual(upsert_batch(self.rows()), (1, 1))
+        self.assertEqual(upsert_batch(self.rows()), (0, 2))
+
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(Book.objects.get(title="Dune").inventory, 10)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.inventory, 6)
+
+    def test_last_row_sets_daily_fee(self):
+        import_books(
+            StringIO(
+                "title,author,cover,inventory,daily_fee\n"
+                "Dune,Frank Herbert,HARD,1,1.50\n"
+                "Dune,Frank Herbert,HARD,1,2.00\n"
+                "Emma,Jane Austen,SOFT,1,3.00\n"
+            ),
+            "csv",
+        )
+
+        self.assertEqual(Book.objects.get(title="Dune").daily_fee, Decimal("2.00"))
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.daily_fee, Decimal("3.00"))
+
+    def test_batch_bumps_cache_versions_once(self):
+        cache = get_cache()
+        with mock.patch.object(cache, "incr", wraps=cache.incr) as incr:
+            with mock.patch.object(cache, "set_many", wraps=cache.set_many) as set_many:
+                upsert_batch(self.rows())
+
+        self.assertEqual(incr.call_count, 1)
+        self.assertEqual(set_many.call_count, 1)
+        self.assertEqual(len(set_many.call_args.args[0]), 2)
+
+    def test_out_of_range_inventory_rejected_per_row(self):
+        report = import_books(
+            StringIO(
+                "title,author,cover,inventory,daily_fee\n"
+                "Huge,Someone,SOFT,99999999999999999999,1.00\n"
+                "Small,Someone,SOFT,1,1.00\n"
+            ),
+            "csv",
+        )
+
+        self.assertEqual((report["created"], report["rejected"]), (1, 1))
+
+    def rows(self):
+        valid, _ = validate_batch(list(read_rows(StringIO(IMPORT_CSV), "csv")))
+        return valid
+
+    def test_endpoint_is_staff_only(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("reader@test.com", "testpassword")
+        )
+        upload = SimpleUploadedFile("books.csv", IMPORT_CSV.encode())
+
+        res = self.client.post(
+            reverse("books-import-books"), {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Book.objects.filter(title="Dune").exists())
+
+
+@override_settings(ROOT_URLCONF="library_service.asgi_urls")
+class AsyncBookViewTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.async_client = AsyncClient()
+        self.books = [sample_book(title=f"Async {i}") for i in range(25)]
+
+    async def test_list_matches_sync_view(self):
+        for params in ({}, {"page": 2}, {"q": "async"}):
+            res = await self.async_client.get(BOOKS_URL, params)
+            await get_cache().aclear()
+            expected = await sync_to_async(self.client.get)(BOOKS_URL, params)
+            await get_cache().aclear()
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.content, expected.content)
+
+    async def test_detail_and_not_found(self):
+        res = await self.async_client.get(detail_url(self.books[0].id))
+        self.assertEqual(res.json()["title"], "Async 0")
+
+        res = await self.async_client.get(detail_url(999))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = await self.async_client.get(BOOKS_URL, {"page": 9})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_metrics_name_the_viewset_action(self):
+        registry.clear()
+
+        await self.async_client.get(BOOKS_URL)
+
+        listed = registry.collect()["BookViewSet.list"]
+        self.assertEqual(sum(listed.duration.counts), 1)
+        self.assertEqual(listed.queries.sum, 2)
+
+    async def test_etag_revalidation(self):
+        res = await self.async_client.get(BOOKS_URL)
+
+        res = await self.async_client.get(
+            BOOKS_URL, headers={"If-None-Match": res["ETag"]}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_writes_fall_back_to_drf(self):
+        admin = await sync_to_async(get_user_model().objects.create_superuser)(
+            "async-admin@test.com", "testpassword"
+        )
+        token = TokenObtainPairSerializer.get_token(admin).access_token
+
+        res = await self.async_client.post(
+            BOOKS_URL,
+            {**BOOK_PAYLOAD, "title": "Posted"},
+            headers={"Authorize": f"Bearer {token}"},
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = await self.async_client.post(BOOKS_URL, BOOK_PAYLOAD)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class BookValuesSerializerTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        sample_book(
+            title='Quotes " and \\ backslashes',
+            author="Ünïcödé\u2028author",
+            cover="SOFT",
+            daily_fee=Decimal("12.30"),
+        )
+        sample_book(title="Tabs\tand\nnewlines\x01", inventory=0, daily_fee=0)
+        sample_book(title="Plain", daily_fee=Decimal("99999999.99"))
+
+    def test_output_matches_book_serializer(self):
+        queryset = Book.objects.order_by("id")
+        expected = JSONRenderer().render(BookSerializer(queryset, many=True).data)
+
+        data = BookValuesSerializer(BookValuesSerializer.rows(queryset)).data
+
+        self.assertEqual(JSONRenderer().render(data), expected)
+        self.assertEqual(FastJSONRenderer().render(data), expected)
+
+    def test_list_responses_match_regular_serializer(self):
+        for params in ({}, {"q": "plain"}, {"pagination": "cursor"}):
+            with self.subTest(params=params):
+                fast = self.client.get(
+                    BOOKS_URL, params, HTTP_ACCEPT="application/json"
+                )
+                get_cache().clear()
+                with override_settings(FAST_LIST_SERIALIZERS=False):
+                    regular = self.client.get(
+                        BOOKS_URL, params, HTTP_ACCEPT="application/json"
+                    )
+
+                self.assertEqual(fast.status_code, status.HTTP_200_OK)
+                self.assertEqual(fast.content, regular.content)
+
+
+class FastJSONRendererTests(TestCase):
+    DATA = {
+        "text": "Ünïcödé \u2028\u2029 \"quoted\" \\ \x00\x1f\x7f",
+        "decimal": Decimal("1.50"),
+        "date": datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+        "day": date(2024, 1, 2),
+        "numbers": [0, -1, 2**53, 0.5, True, None],
+        1: "integer key",
+    }
+
+    def test_output_matches_json_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.DATA), JSONRenderer().render(self.DATA)
+        )
+
+    def test_indented_output_matches_json_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.DATA, "application/json; indent=4"),
+            JSONRenderer().render(self.DATA, "application/json; indent=4"),
+        )
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch("library_service.renderers.orjson", None):
+            content = FastJSONRenderer().render(self.DATA)
+
+        self.assertEqual(content, JSONRenderer().render(self.DATA))
@@ -1,9 +1,38 @@
-from rest_framework import viewsets
+import io
+import json
+from functools import partial
+
+from django.conf import settings
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
 
+from books.cache import (
+    acatalogue_pinned,
+    catalogue_pinned,
+    detail_cache_key,
+    etag_matches,
+    get_cache,
+    list_cache_key,
+)
+from books.importer import import_books, import_format
 from books.permissions import IsAdminOrReadOnly
-from books.serializers import BookSerializer
+from books.search import search_books
+from books.serializers import (
+    BookImportSerializer,
+    BookSerializer,
+    BookValuesSerializer,
+)
 from books.models import Book
+from borrowings.holds import availability
+from library_service.fast_serializers import ValuesListMixin
+from library_service.pagination import KeysetPagination, KeysetPaginationMixin
+from library_service.replicas import ReplicaReadsMixin
 
 
 class BookPagination(PageNumberPagination):
@@ -11,8 +40,155 @@ class BookPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookCursorPagination(KeysetPagination):
+    page_size = 20
+    ordering = ("id",)
+
+
+class PrerenderedResponse(Response):
+    """Response whose body was rendered earlier and stored as bytes.
+
+    ``data`` is only decoded if something asks for it.
+    """
+
+    def __init__(self, content, **kwargs):
+        super().__init__(**kwargs)
+        self.prerendered_content = content
+
+    @property
+    def data(self):
+        return json.loads(self.prerendered_content)
+
+    @data.setter
+    def data(self, value):
+        pass
+
+    @property
+    def rendered_content(self):
+        self["Content-Type"] = self.accepted_renderer.media_type
+        return self.prerendered_content
+
+
+class BookViewSet(
+    ReplicaReadsMixin,
+    KeysetPaginationMixin,
+    ValuesListMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    values_serializer_class = BookValuesSerializer
     pagination_class = BookPagination
+    keyset_pagination_class = BookCursorPagination
     permission_classes = (IsAdminOrReadOnly,)
+    throttle_scope = "books"
+    # Rejected rows echoed back by the import endpoint; the count covers all.
+    max_reported_rejects = 100
+
+    def uses_replica(self) -> bool:
+        # Writers are pinned per user, but cached pages are shared by all.
+        return super().uses_replica() and not catalogue_pinned()
+
+    async def auses_replica(self) -> bool:
+        return await super().auses_replica() and not await acatalogue_pinned()
+
+    def cached_response(self, request, key, etag, render):
+        """Serve rendered JSON from the catalogue cache, or a 304 for a fresh ETag.
+
+        Only JSON responses are cached; the browsable API always renders.
+        """
+        if request.accepted_renderer.format != "json":
+            return render()
+
+        if etag_matches(request, etag):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+
+        cache = get_cache()
+        content = cache.get(key)
+        if content is None:
+            response = render()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            self.finalize_response(request, response).render()
+            content = response.content
+            cache.set(key, content, timeout=settings.BOOKS_CACHE_TIMEOUT)
+
+        return PrerenderedResponse(content, headers={"ETag": etag})
+
+    def get_serializer_class(self):
+        if self.action == "import_books":
+            return BookImportSerializer
+
+        return BookSerializer
+
+    def get_queryset(self):
+        queryset = self.queryset
+
+        query = self.request.query_params.get("q")
+        if self.action == "list" and query is not None:
+            queryset = search_books(queryset, query)
+
+        return queryset
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "q",
+                type=OpenApiTypes.STR,
+                description=(
+                    "Full-text search over title and author, best matches "
+                    "first; the last word matches as a prefix (ex. ?q=tolk)"
+                ),
+            ),
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        key, etag = list_cache_key(request)
+        return self.cached_response(
+            request, key, etag, partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        key, etag = detail_cache_key(request, kwargs[self.lookup_field])
+        return self.cached_response(
+            request, key, etag, partial(super().retrieve, request, *args, **kwargs)
+        )
+
+    @extend_schema(responses={200: OpenApiTypes.OBJECT})
+    @action(methods=["GET"], detail=True)
+    def availability(self, request, pk=None):
+        """Endpoint for when copies of a book are expected back."""
+        return Response(availability(self.get_object()))
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def import_books(self, request):
+        """Endpoint for importing a CSV or JSON Lines file of books."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+
+        fmt = import_format(upload.name)
+        if fmt is None:
+            raise ValidationError({"file": "Upload a .csv or .jsonl file."})
+
+        rejected = []
+
+        def on_reject(rejection):
+            if len(rejected) < self.max_reported_rejects:
+                rejected.append(rejection)
+
+        report = import_books(
+            io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline=""),
+            fmt,
+            on_reject=on_reject,
+        )
+        report["rejected_rows"] = rejected
+
+        return Response(report, status=status.HTTP_200_OK)
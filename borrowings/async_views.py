@@ -0,0 +1,86 @@
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions
+
+from borrowings.export import aexport_rows, ato_csv, ato_ndjson, export_response
+from borrowings.views import BorrowingsViewSet
+from library_service.async_api import (
+    async_read_view,
+    authenticate,
+    check_throttles,
+    error_response,
+    json_response,
+    keyset_requested,
+    paginate,
+    require_authenticated,
+    viewset_for,
+)
+from library_service.replicas import reads_from_replica
+
+
+async def borrowing_list(request):
+    drf_request = await authenticate(request)
+    require_authenticated(drf_request)
+    view = viewset_for(BorrowingsViewSet, drf_request, "list")
+    await check_throttles(view, drf_request)
+
+    queryset = view.list_queryset(view.filter_queryset(view.get_queryset()))
+    with reads_from_replica(await view.auses_replica()):
+        page = await paginate(drf_request, queryset, view.pagination_class.page_size)
+    objects = page.pop("objects")
+    return json_response({**page, "results": view.list_data(objects)})
+
+
+async def borrowing_detail(request, pk):
+    drf_request = await authenticate(request)
+    require_authenticated(drf_request)
+    view = viewset_for(BorrowingsViewSet, drf_request, "retrieve", pk=pk)
+    await check_throttles(view, drf_request)
+
+    try:
+        with reads_from_replica(await view.auses_replica()):
+            borrowing = await view.get_queryset().filter(pk=pk).afirst()
+    except (TypeError, ValueError):
+        borrowing = None
+    if borrowing is None:
+        raise exceptions.NotFound()
+    return json_response(view.get_serializer(borrowing).data)
+
+
+async def borrowing_export(request):
+    """Stream the export from an async iterator.
+
+    The ASGI handler would collect a sync iterator into a list before
+    sending anything, holding every row in memory.
+    """
+    try:
+        if request.method != "GET":
+            raise exceptions.MethodNotAllowed(request.method)
+        drf_request = await authenticate(request)
+        view = viewset_for(BorrowingsViewSet, drf_request, "export")
+        view.check_permissions(drf_request)
+        await check_throttles(view, drf_request)
+        output, queryset = await sync_to_async(view.export_source)()
+    except exceptions.APIException as exc:
+        return error_response(exc)
+
+    rows = aexport_rows(queryset)
+    chunks = ato_csv(rows) if output == "csv" else ato_ndjson(rows)
+    return export_response(chunks, output)
+
+
+# Only GET is served, which needs no CSRF check.
+borrowing_export.csrf_exempt = True
+# Named after the viewset action it serves, as the DRF view would be.
+borrowing_export.cls = BorrowingsViewSet
+borrowing_export.actions = {"get": "export"}
+
+
+borrowing_list_view = async_read_view(
+    borrowing_list,
+    BorrowingsViewSet.as_view({"get": "list", "post": "create"}),
+    use_fallback=keyset_requested(BorrowingsViewSet),
+)
+borrowing_detail_view = async_read_view(
+    borrowing_detail,
+    BorrowingsViewSet.as_view({"get": "retrieve"}),
+)
@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+# (column name, queryset lookup) of every exported field, in output order.
+EXPORT_FIELDS = (
+    ("id", "id"),
+    ("user_id", "user_id"),
+    ("user_email", "user__email"),
+    ("book_id", "book_id"),
+    ("book_title", "book__title"),
+    ("borrow_date", "borrow_date"),
+    ("expected_return_date", "expected_return_date"),
+    ("actual_return_date", "actual_return_date"),
+)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Stream queryset as row tuples, chunk_size rows per database fetch.
+
+    PostgreSQL reads through a server-side cursor; SQLite fetches the
+    result incrementally. Either way no model instances are built.
+    """
+    return _export_values(queryset).iterator(chunk_size=chunk_size)
+
+
+async def aexport_rows(queryset, chunk_size=2000):
+    """export_rows for async views, each fetch run in a worker thread.
+
+    QuerySet.aiterator() is not used: for values_list() querysets it opens
+    the cursor on the event loop, which Django refuses.
+    """
+    rows = export_rows(queryset, chunk_size)
+    fetch = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while chunk := await fetch():
+        for row in chunk:
+            yield row
+
+
+def _export_values(queryset):
+    return queryset.values_list(*(lookup for _, lookup in EXPORT_FIELDS))
+
+
+def _batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+async def _abatched(rows, size):
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv_encoder():
+    """A function turning a batch of rows into CSV text."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def encode(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        return buffer.getvalue()
+
+    return encode
+
+
+def _ndjson(rows):
+    names = [name for name, _ in EXPORT_FIELDS]
+    return "".join(
+        json.dumps(dict(zip(names, row)), default=str) + "\n" for row in rows
+    )
+
+
+def to_csv(rows, batch_size=500):
+    """Yield CSV text, a header line first, batch_size rows per chunk."""
+    encode = _csv_encoder()
+    yield encode([[name for name, _ in EXPORT_FIELDS]])
+    for batch in _batched(rows, batch_size):
+        yield encode(batch)
+
+
+def to_ndjson(rows, batch_size=500):
+    """Yield one JSON object per line, batch_size rows per chunk."""
+    for batch in _batched(rows, batch_size):
+        yield _ndjson(batch)
+
+
+async def ato_csv(rows, batch_size=500):
+    """to_csv over an async iterator of rows."""
+    encode = _csv_encoder()
+    yield encode([[name for name, _ in EXPORT_FIELDS]])
+    async for batch in _abatched(rows, batch_size):
+        yield encode(batch)
+
+
+async def ato_ndjson(rows, batch_size=500):
+    """to_ndjson over an async iterator of rows."""
+    async for batch in _abatched(rows, batch_size):
+        yield _ndjson(batch)
+
+
+def export_response(chunks, output) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[output])
+    response["Content-Disposition"] = f'attachment; filename="borrowings.{output}"'
+    return response
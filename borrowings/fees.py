@@ -0,0 +1,169 @@
+"""Fees of returned borrowings, computed and stored by the database.
+
+A returned borrowing pays its book's daily fee for each day from
+borrow_date to the expected return date, or to the actual return if that
+came first. It pays for at least one day. This is the PAYMENT row. Each
+day past the expected return date costs FINE_MULTIPLIER daily fees, rounded
+to the cent. This is the FINE row.
+
+Rows are written with one INSERT ... SELECT. The same statement bills a
+single borrowing on return and millions in the monthly run, so both agree
+to the cent. Nothing is loaded into Python. A borrowing is charged at most
+once per type, and billing it again is a no-op.
+
+PostgreSQL computes the amounts in exact numeric. SQLite stores decimals
+as floats, so there an amount that falls on a half cent may round either
+way.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import (
+    BigIntegerField,
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Func,
+    IntegerField,
+    Max,
+    Min,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Cast, Greatest, Least, Round
+
+from borrowings.models import Borrowing, Payment
+
+PAYMENT_COLUMNS = ("borrowing", "type", "days", "money_to_pay")
+
+
+class DaysBetween(Func):
+    """Whole days from the date start to the date end."""
+
+    template = "(%(expressions)s)"
+    arg_joiner = " - "
+    output_field = IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+
+def amount(days, multiplier=None):
+    """days daily fees of the borrowed book, times multiplier, to the cent."""
+    money = days * F("book__daily_fee")
+    if multiplier is not None:
+        money = money * Value(multiplier)
+    return Round(
+        ExpressionWrapper(
+            money, output_field=DecimalField(max_digits=10, decimal_places=2)
+        ),
+        2,
+    )
+
+
+def charges(queryset, fine_multiplier):
+    """One (borrowing, type, days, money_to_pay) row per charge of queryset."""
+    returned = queryset.filter(actual_return_date__isnull=False).order_by()
+    paid_days = Greatest(
+        DaysBetween(
+            Least("actual_return_date", "expected_return_date"), "borrow_date"
+        ),
+        Value(1),
+    )
+    late_days = DaysBetween("actual_return_date", "expected_return_date")
+
+    rentals = returned.annotate(
+        charge_borrowing=F("id"),
+        charge_type=Value(Payment.Type.PAYMENT.value),
+        charge_days=paid_days,
+        charge_amount=amount(paid_days),
+    )
+    fines = returned.filter(actual_return_date__gt=F("expected_return_date")).annotate(
+        charge_borrowing=F("id"),
+        charge_type=Value(Payment.Type.FINE.value),
+        charge_days=late_days,
+        charge_amount=amount(late_days, fine_multiplier),
+    )
+    columns = ("charge_borrowing", "charge_type", "charge_days", "charge_amount")
+    return rentals.values_list(*columns).union(
+        fines.values_list(*columns), all=True
+    )
+
+
+def charge_returned(queryset) -> int:
+    """Store the payments of the returned borrowings in queryset.
+
+    Borrowings already charged are skipped. Returns the number of payment
+    rows written.
+    """
+    rows = charges(queryset, settings.FINE_MULTIPLIER)
+    connection = connections[queryset.db]
+    sql, params = rows.query.get_compiler(connection=connection).as_sql()
+    quote = connection.ops.quote_name
+    columns = ", ".join(
+        quote(Payment._meta.get_field(name).column) for name in PAYMENT_COLUMNS
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(Payment._meta.db_table)} ({columns}) {sql} "
+            f"ON CONFLICT DO NOTHING",
+            params,
+        )
+        return cursor.rowcount
+
+
+def month_bounds(month: date) -> tuple[date, date]:
+    start = month.replace(day=1)
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def bill_month(month: date, chunk_size=500_000) -> dict:
+    """Charge every borrowing returned in the month of month.
+
+    The work is split into id ranges of chunk_size, each in its own
+    transaction. Returns how many payment rows were written and the number
+    and total of the month's payments.
+    """
+    start, end = month_bounds(month)
+    returned = Borrowing.objects.filter(
+        actual_return_date__gte=start, actual_return_date__lt=end
+    )
+
+    written = 0
+    bounds = returned.aggregate(low=Min("id"), high=Max("id"))
+    if bounds["low"] is not None:
+        for low in range(bounds["low"], bounds["high"] + 1, chunk_size):
+            with transaction.atomic():
+                written += charge_returned(
+                    returned.filter(id__gte=low, id__lt=low + chunk_size)
+                )
+
+    # Summed as whole cents, exact even where decimals are stored as floats.
+    totals = Payment.objects.filter(
+        borrowing__actual_return_date__gte=start,
+        borrowing__actual_return_date__lt=end,
+    ).aggregate(
+        payments=Count("id"),
+        cents=Sum(
+            Cast(Round(F("money_to_pay") * 100), output_field=BigIntegerField())
+        ),
+    )
+    return {
+        "written": written,
+        "payments": totals["payments"],
+        "total": Decimal(totals["cents"] or 0).scaleb(-2),
+    }
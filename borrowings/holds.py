@@ -0,0 +1,178 @@
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, OuterRef, Subquery, When
+from django.utils import timezone
+
+from books.models import Book
+from borrowings.models import Borrowing, Hold
+from borrowings.notifications import (
+    enqueue_borrowing_notifications,
+    enqueue_hold_notifications,
+)
+
+COPIES_AVAILABLE = "Copies of this book are available. Borrow it instead."
+ALREADY_HOLDING = "You already hold this book."
+
+
+def lend_to_holds(returned: dict[int, int]) -> Counter:
+    """Lend copies just returned to the oldest pending holds on their books.
+
+    returned maps book ids to the number of copies returned. Must run in
+    the transaction that returns them. Users at their borrowing limit are
+    passed over and keep their place in the queue. Returns the copies lent
+    per book; the caller puts the rest back into inventory.
+    """
+    waiting = set(
+        Hold.objects.filter(book_id__in=returned, fulfilled_at__isnull=True)
+        .values_list("book_id", flat=True)
+        .distinct()
+    )
+    if not waiting:
+        return Counter()
+
+    limit = settings.MAX_ACTIVE_BORROWINGS_PER_USER
+    taken = Counter()
+    holds = []
+    # Book by book in id order, so concurrent returns lock holds and users
+    # in the same order.
+    for book_id in sorted(waiting):
+        queue = (
+            Hold.objects.select_for_update(of=("self", "user"))
+            .select_related("book", "user")
+            .filter(
+                book_id=book_id,
+                fulfilled_at__isnull=True,
+                user__active_borrowings__lt=limit,
+            )
+            .order_by("id")[: returned[book_id]]
+        )
+        for hold in queue:
+            if hold.user.active_borrowings + taken[hold.user_id] < limit:
+                taken[hold.user_id] += 1
+                holds.append(hold)
+    if not holds:
+        return Counter()
+
+    borrowings = Borrowing.objects.bulk_create(
+        Borrowing(book=hold.book, user=hold.user) for hold in holds
+    )
+    now = timezone.now()
+    for hold, borrowing in zip(holds, borrowings):
+        hold.borrowing = borrowing
+        hold.fulfilled_at = now
+    Hold.objects.bulk_update(holds, ["borrowing", "fulfilled_at"])
+    get_user_model().objects.add_borrowing_slots(taken)
+
+    enqueue_borrowing_notifications(borrowings)
+    enqueue_hold_notifications(holds)
+    return Counter(hold.book_id for hold in holds)
+
+
+def lend_shelved(book_id: int) -> Counter:
+    """Lend copies of book_id on the shelf to its pending holds.
+
+    Run after a hold is committed. A copy returned while the hold was being
+    placed can have found no queue and gone back on the shelf, after the
+    shelf was checked. Locking the book waits for such a return to commit.
+    Returns the copies lent.
+    """
+    with transaction.atomic():
+        inventory = (
+            Book.objects.select_for_update()
+            .filter(pk=book_id)
+            .values_list("inventory", flat=True)
+            .first()
+        )
+        if not inventory:
+            return Counter()
+        lent = lend_to_holds({book_id: inventory})
+        Book.objects.reserve_many(lent)
+        return lent
+
+
+def with_positions(queryset):
+    """Annotate each pending hold with its place in its book's queue."""
+    ahead = (
+        Hold.objects.filter(
+            book_id=OuterRef("book_id"),
+            fulfilled_at__isnull=True,
+            id__lte=OuterRef("id"),
+        )
+        .order_by()
+        .values("book_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return queryset.annotate(
+        position=Case(
+            When(fulfilled_at__isnull=True, then=Subquery(ahead)),
+            default=None,
+            output_field=IntegerField(),
+        )
+    )
+
+
+def return_calendar(book_ids) -> dict[int, list[date]]:
+    """Expected return dates of each book's active borrowings, earliest first."""
+    calendar = defaultdict(list)
+    for book_id, expected_return_date in (
+        Borrowing.objects.filter(book_id__in=book_ids, actual_return_date__isnull=True)
+        .order_by("book_id", "expected_return_date")
+        .values_list("book_id", "expected_return_date")
+    ):
+        calendar[book_id].append(expected_return_date)
+    return calendar
+
+
+def expected_on(return_dates, place: int, today: date):
+    """When the place-th copy to come back is due, or None if none is out.
+
+    Overdue copies are counted as due today.
+    """
+    if place > len(return_dates):
+        return None
+    return max(return_dates[place - 1], today)
+
+
+def estimate_availability(holds) -> None:
+    """Set expected_available on holds annotated by with_positions."""
+    today = date.today()
+    pending = [hold for hold in holds if hold.position is not None]
+    calendar = return_calendar({hold.book_id for hold in pending})
+    for hold in holds:
+        hold.expected_available = None
+    for hold in pending:
+        hold.expected_available = expected_on(
+            calendar[hold.book_id], hold.position, today
+        )
+
+
+def availability(book) -> dict:
+    """Inventory, queue length and expected returns of book.
+
+    next_available is when a user joining the queue now can expect a copy.
+    """
+    today = date.today()
+    return_dates = return_calendar([book.id])[book.id]
+    holds = Hold.objects.filter(book=book, fulfilled_at__isnull=True).count()
+
+    if book.inventory > 0:
+        next_available = today
+    else:
+        next_available = expected_on(return_dates, holds + 1, today)
+
+    returns = Counter(max(return_date, today) for return_date in return_dates)
+    return {
+        "book": book.id,
+        "inventory": book.inventory,
+        "holds": holds,
+        "next_available": next_available,
+        "expected_returns": [
+            {"date": return_date, "copies": copies}
+            for return_date, copies in sorted(returns.items())
+        ],
+    }
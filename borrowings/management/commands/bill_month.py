@@ -0,0 +1,31 @@
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from borrowings.fees import bill_month
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the payments of every borrowing returned in a month, the "
+        "previous one by default. Borrowings already charged are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("month", nargs="?", help="YYYY-MM")
+        parser.add_argument("--chunk-size", type=int, default=500_000)
+
+    def handle(self, *args, **options):
+        if options["month"]:
+            try:
+                month = datetime.strptime(options["month"], "%Y-%m").date()
+            except ValueError:
+                raise CommandError("month must look like 2024-01.")
+        else:
+            month = date.today().replace(day=1) - timedelta(days=1)
+
+        result = bill_month(month, chunk_size=options["chunk_size"])
+        self.stdout.write(
+            f"{month:%Y-%m}: wrote {result['written']} payments, "
+            f"{result['payments']} in total for {result['total']}."
+        )
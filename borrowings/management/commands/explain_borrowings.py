@@ -0,0 +1,137 @@
+import random
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from books.models import Book
+from borrowings.models import Borrowing
+from borrowings.views import BorrowingsViewSet
+
+# (name, query string, whether the request is made by staff)
+CANONICAL_LISTINGS = (
+    ("staff: all", {}, True),
+    ("staff: active", {"is_active": "true"}, True),
+    ("staff: by user", {"user_id": None}, True),
+    ("staff: active by user", {"user_id": None, "is_active": "true"}, True),
+    ("user: own", {}, False),
+    ("user: own active", {"is_active": "true"}, False),
+    ("staff: cursor", {"pagination": "cursor"}, True),
+    ("user: cursor", {"pagination": "cursor"}, False),
+)
+
+SEQUENTIAL_SCAN = {
+    "sqlite": re.compile(r"\bSCAN (\w+)(?! USING)"),
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the page queries behind the canonical borrowings listings and "
+        "fail if any of them sequentially scans the borrowings table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help=(
+                "Insert this many borrowings first, inside a transaction that "
+                "is rolled back once the plans are checked."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Unsupported database vendor: {connection.vendor}")
+
+        with transaction.atomic():
+            if options["seed"]:
+                self.seed(options["seed"])
+            offenders = self.check_plans(pattern)
+            transaction.set_rollback(True)
+
+        if offenders:
+            raise CommandError(
+                "Sequential scan on borrowings in: " + ", ".join(offenders)
+            )
+        self.stdout.write("No sequential scans on borrowings.")
+
+    def seed(self, rows):
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"explain{i}@seed.local")
+            for i in range(max(rows // 50, 1))
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Explain {i}",
+                author="Seed Author",
+                cover=Book.Cover.HARD,
+                inventory=1,
+                daily_fee=Decimal("1.00"),
+            )
+            for i in range(max(rows // 100, 1))
+        )
+        rng = random.Random(0)
+        today = date.today()
+        Borrowing.objects.bulk_create(
+            (
+                Borrowing(
+                    book=rng.choice(books),
+                    user=rng.choice(users),
+                    expected_return_date=today + timedelta(days=rng.randrange(60)),
+                    actual_return_date=today if rng.random() < 0.9 else None,
+                )
+                for _ in range(rows)
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def listing_queryset(self, params, user):
+        request = Request(APIRequestFactory().get("/api/borrowings/", params))
+        request.user = user
+        view = BorrowingsViewSet(
+            request=request, action="list", format_kwarg=None, args=(), kwargs={}
+        )
+        queryset = view.filter_queryset(view.get_queryset())
+        if view.uses_keyset_pagination():
+            # Explain the query behind a "next" link rather than the first page.
+            ordering = view.keyset_pagination_class.ordering
+            queryset = queryset.order_by(*ordering)
+            anchor = queryset.values_list(*ordering).first()
+            if anchor is not None:
+                queryset = queryset.filter(
+                    view.paginator.seek(anchor, reverse=False)
+                )
+        return queryset[: view.paginator.page_size]
+
+    def check_plans(self, pattern):
+        table = Borrowing._meta.db_table
+        staff = get_user_model()(id=0, email="staff@explain.local", is_staff=True)
+        sample = Borrowing.objects.order_by("pk").values_list("user_id", flat=True)
+        customer_id = sample.first() or 0
+        customer = get_user_model()(id=customer_id, email="user@explain.local")
+
+        offenders = []
+        for name, params, as_staff in CANONICAL_LISTINGS:
+            params = {
+                key: customer_id if value is None else value
+                for key, value in params.items()
+            }
+            queryset = self.listing_queryset(params, staff if as_staff else customer)
+            plan = queryset.explain()
+            scanned = table in pattern.findall(plan)
+            self.stdout.write(f"== {name}{' [SEQ SCAN]' if scanned else ''}\n{plan}")
+            if scanned:
+                offenders.append(name)
+        return offenders
@@ -0,0 +1,29 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from borrowings.notifications import OutboxWorker
+from borrowings.telegram_helper import get_bot
+
+
+class Command(BaseCommand):
+    help = "Deliver queued Telegram notifications from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--poll-interval", type=float, default=2.0)
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the outbox has been drained.",
+        )
+        parser.add_argument(
+            "--fake",
+            action="store_true",
+            help="Print messages instead of sending them to Telegram.",
+        )
+
+    def handle(self, *args, **options):
+        bot = get_bot(fake=options["fake"], write=self.stdout.write)
+        worker = OutboxWorker(bot, batch_size=options["batch_size"])
+        asyncio.run(worker.run(options["poll_interval"], once=options["once"]))
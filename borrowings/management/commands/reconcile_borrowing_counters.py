@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Case, Count, Value, When
+
+from borrowings.models import Borrowing
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare each user's active_borrowings counter with their unreturned "
+        "borrowings and repair any drift, one batch of users at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted counters without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("pk")
+        last_pk = 0
+        checked = drifted = 0
+
+        while True:
+            with transaction.atomic():
+                # Locking the batch makes borrow and return paths that touch
+                # these users wait, so the counts below cannot go stale.
+                counters = dict(
+                    users.select_for_update()
+                    .filter(pk__gt=last_pk)
+                    .values_list("pk", "active_borrowings")[: options["batch_size"]]
+                )
+                if not counters:
+                    break
+                last_pk = max(counters)
+
+                actual = dict(
+                    Borrowing.objects.filter(
+                        user_id__in=counters, actual_return_date__isnull=True
+                    )
+                    .values("user_id")
+                    .annotate(active=Count("id"))
+                    .values_list("user_id", "active")
+                )
+                fixes = {
+                    pk: actual.get(pk, 0)
+                    for pk, counter in counters.items()
+                    if counter != actual.get(pk, 0)
+                }
+                for pk, active in fixes.items():
+                    self.stdout.write(
+                        f"user {pk}: counter {counters[pk]}, actually {active}"
+                    )
+                if fixes and not options["dry_run"]:
+                    users.filter(pk__in=fixes).update(
+                        active_borrowings=Case(
+                            *(When(pk=pk, then=Value(n)) for pk, n in fixes.items()),
+                            output_field=models.PositiveIntegerField(),
+                        )
+                    )
+
+            checked += len(counters)
+            drifted += len(fixes)
+
+        verb = "found" if options["dry_run"] else "repaired"
+        self.stdout.write(
+            f"Checked {checked} users, {verb} {drifted} drifted counters."
+        )
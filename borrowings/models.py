@@ -3,6 +3,8 @@ from datetime import date, timedelta
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Now
+from django.utils.translation import gettext_lazy as _
 
 from books.models import Book
 
@@ -21,6 +23,33 @@ class Borrowing(models.Model):
 
     class Meta:
         ordering = ["expected_return_date"]
+        indexes = [
+            models.Index(
+                fields=["expected_return_date", "id"],
+                name="borrowing_return_date_id_idx",
+            ),
+            models.Index(
+                fields=["user", "expected_return_date", "id"],
+                name="borrowing_user_return_date_idx",
+            ),
+            models.Index(
+                fields=["expected_return_date", "id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_active_idx",
+            ),
+            models.Index(
+                fields=["user", "expected_return_date", "id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_user_active_idx",
+            ),
+            models.Index(
+                fields=["book", "expected_return_date"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_book_active_idx",
+            ),
+            models.Index(fields=["borrow_date"], name="borrowing_borrowed_idx"),
+            models.Index(fields=["actual_return_date"], name="borrowing_returned_idx"),
+        ]
 
     def message(self) -> str:
         return (
@@ -35,3 +64,117 @@ class Borrowing(models.Model):
 
     def __str__(self):
         return f"{self.book.title}, expected return date: {self.expected_return_date}."
+
+
+class Hold(models.Model):
+    """A user's place in the queue for the next copy of a book.
+
+    Pending holds are served oldest first: a returned copy is lent straight
+    to the next user in the queue instead of going back to the shelf.
+    """
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="holds")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="holds"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    fulfilled_at = models.DateTimeField(null=True, blank=True)
+    borrowing = models.OneToOneField(
+        Borrowing,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="hold",
+    )
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["book", "id"],
+                condition=models.Q(fulfilled_at__isnull=True),
+                name="hold_queue_idx",
+            ),
+            models.Index(fields=["user", "id"], name="hold_user_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "user"],
+                condition=models.Q(fulfilled_at__isnull=True),
+                name="hold_one_pending_per_user",
+            ),
+        ]
+
+    def message(self) -> str:
+        return (
+            f"Your hold on {self.book.title} came through.\n"
+            f"Borrowing {self.borrowing_id}, "
+            f"to be returned on {self.borrowing.expected_return_date}."
+        )
+
+    def __str__(self):
+        return f"Hold {self.id} on book {self.book_id} for user {self.user_id}"
+
+
+class Payment(models.Model):
+    """What a returned borrowing costs, written by borrowings.fees."""
+
+    class Type(models.TextChoices):
+        PAYMENT = "PAYMENT", _("Payment")
+        FINE = "FINE", _("Fine")
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", _("Pending")
+        PAID = "PAID", _("Paid")
+
+    # Indexed by payment_once_per_type, which leads with it.
+    borrowing = models.ForeignKey(
+        Borrowing, on_delete=models.CASCADE, related_name="payments", db_index=False
+    )
+    type = models.CharField(max_length=7, choices=Type.choices)
+    status = models.CharField(
+        max_length=7,
+        choices=Status.choices,
+        default=Status.PENDING,
+        db_default=Status.PENDING,
+    )
+    days = models.PositiveIntegerField()
+    money_to_pay = models.DecimalField(max_digits=10, decimal_places=2)
+    # Database defaults, as payments are written with INSERT ... SELECT.
+    created_at = models.DateTimeField(db_default=Now())
+
+    class Meta:
+        ordering = ["id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["borrowing", "type"], name="payment_once_per_type"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} of {self.money_to_pay} for borrowing {self.borrowing_id}"
+
+
+class Notification(models.Model):
+    """Outbox row for a Telegram message, written with the change it reports."""
+
+    chat_id = models.CharField(max_length=64)
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Set for messages that must be queued at most once, e.g. daily digests.
+    dedup_key = models.CharField(max_length=100, null=True, blank=True, unique=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(sent_at__isnull=True),
+                name="notification_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Notification {self.id} to {self.chat_id}"
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from telegram.error import RetryAfter, TelegramError
+
+from borrowings.models import Notification
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+MAX_ATTEMPTS = 5
+SEPARATOR = "\n\n"
+
+
+def enqueue(texts, chat_id=None) -> None:
+    """Queue messages for the outbox worker.
+
+    Call it inside the transaction that makes the change being reported, so
+    the message is stored if and only if that change commits.
+    """
+    chat_id = chat_id or settings.TELEGRAM_ADMIN_CHAT_ID
+    if not chat_id:
+        return
+    Notification.objects.bulk_create(
+        Notification(chat_id=chat_id, text=text) for text in texts
+    )
+
+
+def enqueue_once(messages) -> None:
+    """Queue (dedup_key, chat_id, text) messages, skipping keys queued before.
+
+    Messages without a chat_id go to the admin chat, or nowhere if none is
+    configured.
+    """
+    notifications = []
+    for key, chat_id, text in messages:
+        chat_id = chat_id or settings.TELEGRAM_ADMIN_CHAT_ID
+        if chat_id:
+            notifications.append(
+                Notification(chat_id=chat_id, text=text, dedup_key=key)
+            )
+    Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+
+
+def enqueue_borrowing_notifications(borrowings) -> None:
+    enqueue(
+        f"New borrowing created! \n{borrowing.message()}" for borrowing in borrowings
+    )
+
+
+def enqueue_hold_notifications(holds) -> None:
+    """Tell the users of fulfilled holds who gave a Telegram chat."""
+    Notification.objects.bulk_create(
+        Notification(chat_id=hold.user.telegram_chat_id, text=hold.message())
+        for hold in holds
+        if hold.user.telegram_chat_id
+    )
+
+
+def coalesce(texts, limit=MAX_MESSAGE_LENGTH):
+    """Pack texts into as few messages of at most limit characters as possible.
+
+    Yields (indexes, message) pairs, where indexes point back into texts.
+    """
+    indexes, parts, length = [], [], 0
+    for index, text in enumerate(texts):
+        text = text[:limit]
+        extra = len(text) + (len(SEPARATOR) if parts else 0)
+        if parts and length + extra > limit:
+            yield indexes, SEPARATOR.join(parts)
+            indexes, parts, length = [], [], 0
+            extra = len(text)
+        indexes.append(index)
+        parts.append(text)
+        length += extra
+    if parts:
+        yield indexes, SEPARATOR.join(parts)
+
+
+class RateLimiter:
+    """Spaces out sends to honour a global and a per-chat minimum interval."""
+
+    def __init__(self, global_interval, chat_interval):
+        self.global_interval = global_interval
+        self.chat_interval = chat_interval
+        self._last_sent = 0.0
+        self._last_sent_to = {}
+
+    async def wait(self, chat_id):
+        now = time.monotonic()
+        ready_at = max(
+            self._last_sent + self.global_interval,
+            self._last_sent_to.get(chat_id, 0.0) + self.chat_interval,
+        )
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+            now = ready_at
+        self._last_sent = self._last_sent_to[chat_id] = now
+
+
+class OutboxWorker:
+    """Drains pending notifications through one long-lived bot session.
+
+    Pending rows are claimed in id order, merged per chat into as few
+    Telegram messages as fit, and marked sent once delivered. A single
+    worker process is expected per outbox.
+    """
+
+    def __init__(self, bot, batch_size=100, limiter=None):
+        self.bot = bot
+        self.batch_size = batch_size
+        self.limiter = limiter or RateLimiter(
+            settings.TELEGRAM_GLOBAL_MIN_INTERVAL,
+            settings.TELEGRAM_CHAT_MIN_INTERVAL,
+        )
+
+    async def _pending(self):
+        return [
+            row
+            async for row in Notification.objects.filter(
+                sent_at__isnull=True, attempts__lt=MAX_ATTEMPTS
+            ).values_list("id", "chat_id", "text")[: self.batch_size]
+        ]
+
+    @staticmethod
+    async def _mark(sent_ids, failed_ids):
+        if sent_ids:
+            await Notification.objects.filter(pk__in=sent_ids).aupdate(
+                sent_at=timezone.now()
+            )
+        if failed_ids:
+            await Notification.objects.filter(pk__in=failed_ids).aupdate(
+                attempts=F("attempts") + 1
+            )
+
+    async def _send(self, chat_id, text):
+        while True:
+            await self.limiter.wait(chat_id)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+                return True
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramError as e:
+                logger.warning("Error sending Telegram message: %s", e)
+                return False
+
+    async def drain_once(self) -> int:
+        """Send one batch of pending notifications, returns how many were sent."""
+        batch = await self._pending()
+
+        by_chat = defaultdict(list)
+        for notification_id, chat_id, text in batch:
+            by_chat[chat_id].append((notification_id, text))
+
+        sent_ids, failed_ids = [], []
+        for chat_id, rows in by_chat.items():
+            for indexes, message in coalesce([text for _, text in rows]):
+                ids = [rows[index][0] for index in indexes]
+                if await self._send(chat_id, message):
+                    sent_ids.extend(ids)
+                else:
+                    failed_ids.extend(ids)
+
+        await self._mark(sent_ids, failed_ids)
+        return len(sent_ids)
+
+    async def run(self, poll_interval=2.0, once=False):
+        async with self.bot:
+            while True:
+                sent = await self.drain_once()
+                if sent < self.batch_size:
+                    if once:
+                        return
+                    await asyncio.sleep(poll_interval)
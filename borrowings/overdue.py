@@ -0,0 +1,69 @@
+from itertools import groupby, islice
+from operator import itemgetter
+
+from borrowings.models import Borrowing
+from borrowings.notifications import enqueue_once
+
+DIGEST_MAX_LINES = 20
+
+
+def overdue_rows(today, chunk_size):
+    """Stream overdue borrowings grouped by user, in index order."""
+    return (
+        Borrowing.objects.filter(
+            actual_return_date__isnull=True, expected_return_date__lt=today
+        )
+        .order_by("user_id", "expected_return_date", "id")
+        .values_list(
+            "user_id",
+            "user__email",
+            "user__telegram_chat_id",
+            "id",
+            "expected_return_date",
+            "book__title",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def digest(today, email, rows) -> str:
+    lines = []
+    total = 0
+    for *_, borrowing_id, expected_return_date, title in rows:
+        total += 1
+        if total <= DIGEST_MAX_LINES:
+            days = (today - expected_return_date).days
+            lines.append(
+                f"- {title} (borrowing {borrowing_id}), due {expected_return_date}, "
+                f"{days} day{'s' if days != 1 else ''} overdue"
+            )
+    if total > DIGEST_MAX_LINES:
+        lines.append(f"... and {total - DIGEST_MAX_LINES} more")
+    return f"Overdue borrowings for {email} ({total}):\n" + "\n".join(lines)
+
+
+def notify_overdue_borrowings(today, chunk_size=2000, flush_size=500) -> int:
+    """Queue one overdue digest per user, at most once per user and day.
+
+    Digests go to the borrower's Telegram chat, or to the admin chat for
+    users who have not given one. Rows are streamed with iterator() and
+    digests flushed in batches, so memory use does not depend on how many
+    borrowings are overdue. Returns the number of users with overdue
+    borrowings.
+    """
+    digests = (
+        (
+            f"overdue:{user_id}:{today.isoformat()}",
+            chat_id,
+            digest(today, email, rows),
+        )
+        for (user_id, email, chat_id), rows in groupby(
+            overdue_rows(today, chunk_size), key=itemgetter(0, 1, 2)
+        )
+    )
+
+    users = 0
+    while batch := list(islice(digests, flush_size)):
+        enqueue_once(batch)
+        users += len(batch)
+    return users
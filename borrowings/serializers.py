@@ -1,7 +1,10 @@
+from datetime import date
+
 from rest_framework import serializers
 
 from books.serializers import BookSerializer
-from borrowings.models import Borrowing
+from borrowings.models import Borrowing, Hold, Payment
+from library_service.fast_serializers import Column, ValuesSerializer, iso_date
 
 
 class BorrowingSerializer(serializers.ModelSerializer):
@@ -28,6 +31,24 @@ class BorrowingListSerializer(BorrowingSerializer):
     )
 
 
+def full_name(first_name, last_name):
+    # What User.get_full_name() gives for the pair.
+    return f"{first_name} {last_name}".strip()
+
+
+class BorrowingListValuesSerializer(ValuesSerializer):
+    """BorrowingListSerializer for list pages."""
+
+    columns = (
+        Column("id"),
+        Column("borrow_date", convert=iso_date),
+        Column("expected_return_date", convert=iso_date),
+        Column("actual_return_date", convert=iso_date),
+        Column("book", "book__title"),
+        Column("user", "user__first_name", "user__last_name", convert=full_name),
+    )
+
+
 class BorrowingDetailSerializer(BorrowingSerializer):
     book = BookSerializer(many=False, read_only=True)
 
@@ -38,3 +59,50 @@ class BorrowingReturnSerializer(serializers.ModelSerializer):
     class Meta:
         model = Borrowing
         fields = ("return_borrowing",)
+
+
+class BorrowingBulkCreateSerializer(serializers.Serializer):
+    books = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=100
+    )
+
+
+class BorrowingBulkReturnSerializer(serializers.Serializer):
+    borrowings = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=100
+    )
+
+
+class HoldSerializer(serializers.ModelSerializer):
+    position = serializers.IntegerField(read_only=True)
+    expected_available = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Hold
+        fields = (
+            "id",
+            "book",
+            "created_at",
+            "fulfilled_at",
+            "borrowing",
+            "position",
+            "expected_available",
+        )
+        read_only_fields = ("id", "created_at", "fulfilled_at", "borrowing")
+
+    def get_expected_available(self, hold) -> date | None:
+        return hold.expected_available
+
+
+class PaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = (
+            "id",
+            "borrowing",
+            "type",
+            "status",
+            "days",
+            "money_to_pay",
+            "created_at",
+        )
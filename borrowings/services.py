@@ -0,0 +1,106 @@
+from collections import Counter
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from books.models import Book
+from borrowings.fees import charge_returned
+from borrowings.holds import lend_to_holds
+from borrowings.models import Borrowing
+from borrowings.notifications import enqueue_borrowing_notifications
+
+NO_COPIES_LEFT = "There are no books left in inventory. Cannot borrow."
+BOOK_NOT_FOUND = "Book not found."
+BORROWING_NOT_FOUND = "Borrowing not found."
+ALREADY_RETURNED = "This borrowing has been already returned."
+LIMIT_REACHED = "Borrowing limit reached. Return a book first."
+
+
+def borrow_books(user, book_ids: list[int]) -> list[dict]:
+    """Borrow one copy per entry of book_ids in a constant number of queries.
+
+    Books past the user's borrowing limit are refused up front. Returns one
+    result per requested book, in request order, carrying either the id of
+    the created borrowing or the reason it was refused.
+    """
+    users = get_user_model().objects
+
+    with transaction.atomic():
+        # Locks the user row too, so concurrent requests cannot both take
+        # the last free slot.
+        user = users.select_for_update().get(pk=user.pk)
+        slots = user.free_borrowing_slots
+        granted = Book.objects.reserve_many(Counter(book_ids[:slots]))
+
+        results = []
+        borrowings = []
+        for index, book_id in enumerate(book_ids):
+            if index >= slots:
+                results.append({"book": book_id, "error": LIMIT_REACHED})
+            elif book_id not in granted:
+                results.append({"book": book_id, "error": BOOK_NOT_FOUND})
+            elif not granted[book_id]:
+                results.append({"book": book_id, "error": NO_COPIES_LEFT})
+            else:
+                granted[book_id] -= 1
+                borrowing = Borrowing(book_id=book_id, user=user)
+                borrowings.append(borrowing)
+                results.append({"book": book_id, "borrowing": borrowing})
+
+        Borrowing.objects.bulk_create(borrowings)
+        users.take_borrowing_slots(user.pk, len(borrowings))
+
+        books = Book.objects.in_bulk({borrowing.book_id for borrowing in borrowings})
+        for borrowing in borrowings:
+            borrowing.book = books[borrowing.book_id]
+        enqueue_borrowing_notifications(borrowings)
+
+    for result in results:
+        if "borrowing" in result:
+            result["borrowing"] = result["borrowing"].id
+    return results
+
+
+def return_borrowings(queryset, borrowing_ids: list[int]) -> list[dict]:
+    """Return every borrowing in borrowing_ids that queryset can see.
+
+    The borrowings are closed with one UPDATE and charged with one INSERT,
+    their copies lent to pending holds or put back with one grouped UPDATE
+    on Book and the borrowers' active counters lowered with one grouped
+    UPDATE on User. Returns one result per requested borrowing.
+    """
+    today = date.today()
+
+    with transaction.atomic():
+        found = {
+            pk: (book_id, actual_return_date, user_id)
+            for pk, book_id, actual_return_date, user_id in queryset.select_for_update()
+            .filter(pk__in=borrowing_ids)
+            .values_list("pk", "book_id", "actual_return_date", "user_id")
+        }
+
+        results = []
+        returning = {}
+        for pk in borrowing_ids:
+            if pk not in found:
+                results.append({"borrowing": pk, "error": BORROWING_NOT_FOUND})
+            elif found[pk][1] or pk in returning:
+                results.append({"borrowing": pk, "error": ALREADY_RETURNED})
+            else:
+                book_id, _, user_id = found[pk]
+                returning[pk] = (book_id, user_id)
+                results.append({"borrowing": pk, "actual_return_date": today})
+
+        if returning:
+            Borrowing.objects.filter(
+                pk__in=returning, actual_return_date__isnull=True
+            ).update(actual_return_date=today)
+            charge_returned(Borrowing.objects.filter(pk__in=returning))
+            copies = Counter(book_id for book_id, _ in returning.values())
+            Book.objects.release_many(copies - lend_to_holds(copies))
+            get_user_model().objects.release_borrowing_slots(
+                Counter(user_id for _, user_id in returning.values())
+            )
+
+    return results
@@ -0,0 +1,17 @@
+from datetime import date, timedelta
+
+from celery import shared_task
+
+from borrowings.fees import bill_month
+from borrowings.overdue import notify_overdue_borrowings
+
+
+@shared_task
+def scan_overdue_borrowings():
+    return notify_overdue_borrowings(date.today())
+
+
+@shared_task
+def bill_previous_month():
+    result = bill_month(date.today().replace(day=1) - timedelta(days=1))
+    return {**result, "total": str(result["total"])}
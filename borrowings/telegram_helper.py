@@ -1,6 +1,45 @@
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from telegram import Bot
 
 
-async def send_telegram_message(bot_token, chat_id, message):
-    bot = Bot(token=bot_token)
-    await bot.send_message(chat_id=chat_id, text=message)
+class FakeBot:
+    """Stand-in for telegram.Bot that records messages instead of sending them.
+
+    Only the last keep messages are recorded. write, if given, is called
+    with each message as it is sent.
+    """
+
+    def __init__(self, token=None, write=None, keep=1000):
+        self.token = token
+        self.write = write
+        self.sent = deque(maxlen=keep)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+        if self.write is not None:
+            self.write(f"[{chat_id}] {text}\n")
+
+
+def get_bot(fake=False, write=None):
+    """Build the bot the outbox worker keeps open for its whole lifetime.
+
+    The fake bot is only used when asked for: without a token the worker
+    would otherwise mark every notification sent without delivering it.
+    """
+    if fake:
+        return FakeBot(write=write)
+    if not settings.TELEGRAM_BOT_TOKEN:
+        raise ImproperlyConfigured(
+            "TELEGRAM_BOT_TOKEN must be set to deliver notifications; "
+            "pass --fake to print them instead."
+        )
+    return Bot(token=settings.TELEGRAM_BOT_TOKEN)
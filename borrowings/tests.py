@@ -1,28 +1,76 @@
+import csv
+import json
 import os
-from datetime import datetime
+import subprocess
+import sys
+import threading
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+from io import StringIO
+from itertools import count
+from unittest import mock
 
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.core.cache import cache
+from django.test import (
+    AsyncClient,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
+from books.cache import CATALOGUE_PIN_KEY
 from books.models import Book
-from borrowings.models import Borrowing
-from borrowings.serializers import BorrowingListSerializer, BorrowingDetailSerializer
+from borrowings.fees import bill_month
+from borrowings.holds import ALREADY_HOLDING, COPIES_AVAILABLE
+from borrowings.models import Borrowing, Hold, Notification, Payment
+from borrowings.notifications import OutboxWorker, RateLimiter
+from borrowings.overdue import DIGEST_MAX_LINES, notify_overdue_borrowings
+from borrowings.services import LIMIT_REACHED
+from borrowings.serializers import (
+    BorrowingListSerializer,
+    BorrowingListValuesSerializer,
+    BorrowingDetailSerializer,
+    HoldSerializer,
+)
+from borrowings.telegram_helper import FakeBot, get_bot
+from borrowings.views import BorrowingsViewSet
+from library_service.metrics import registry
+from library_service.replicas import reads_from_replica
+from user.serializers import TokenObtainPairSerializer
 
 BORROWING_URL = reverse("borrowings-list")
+# library_service.settings.prod without ADMIN_ENABLED.
+PROD_MIDDLEWARE = [
+    "library_service.metrics.MetricsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+HOLD_URL = reverse("holds-list")
 
 
 def sample_borrowing(book: Book, user: settings.AUTH_USER_MODEL):
     return Borrowing.objects.create(book=book, user=user)
 
 
+BOOK_NUMBERS = count(1)
+
+
 def sample_book(**params):
+    # Titled apart, as (title, author, cover) is unique.
     defaults = {
-        "title": "Test Title",
+        "title": f"Test Title {next(BOOK_NUMBERS)}",
         "author": "Test Author",
         "cover": "HARD",
         "inventory": 2,
@@ -164,3 +212,1199 @@ class AdminBorrowingsApiTests(TestCase):
         serializer = BorrowingListSerializer(borrowings, many=True)
 
         self.assertEqual(res.data, serializer.data)
+
+
+class BookReservationTests(TestCase):
+    def test_reserve_stops_at_zero_inventory(self):
+        book = sample_book(inventory=1)
+
+        self.assertTrue(Book.objects.reserve(book.id))
+        self.assertFalse(Book.objects.reserve(book.id))
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+    def test_release_returns_copy(self):
+        book = sample_book(inventory=0)
+
+        self.assertTrue(Book.objects.release(book.id))
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 1)
+
+    def test_return_twice_releases_one_copy(self):
+        user = get_user_model().objects.create_user("reserve@test.com", "testpass")
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        book = sample_book(inventory=1)
+
+        create_res = self.client.post(BORROWING_URL, {"book": book.id})
+        self.assertEqual(create_res.status_code, status.HTTP_201_CREATED)
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+
+        url = reverse("borrowings-return-borrowing", args=[create_res.data["id"]])
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.client.post(url).status_code, status.HTTP_400_BAD_REQUEST
+        )
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 1)
+
+
+class BulkBorrowingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "bulk@test.com", "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_borrow_reports_each_item(self):
+        book = sample_book(inventory=1)
+        other_book = sample_book(inventory=3)
+
+        res = self.client.post(
+            reverse("borrowings-bulk-borrow"),
+            {"books": [book.id, book.id, other_book.id, 999]},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data["results"]
+        self.assertIn("borrowing", results[0])
+        self.assertIn("error", results[1])
+        self.assertIn("borrowing", results[2])
+        self.assertIn("error", results[3])
+        book.refresh_from_db()
+        other_book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+        self.assertEqual(other_book.inventory, 2)
+        self.assertEqual(Borrowing.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_borrow_query_count_does_not_grow(self):
+        books = [sample_book(inventory=5) for _ in range(10)]
+
+        with self.assertNumQueries(8):
+            self.client.post(
+                reverse("borrowings-bulk-borrow"),
+                {"books": [book.id for book in books[:2]]},
+                format="json",
+            )
+        with self.assertNumQueries(8):
+            self.client.post(
+                reverse("borrowings-bulk-borrow"),
+                {"books": [book.id for book in books] * 3},
+                format="json",
+            )
+
+    def test_bulk_return(self):
+        book = sample_book(inventory=0)
+        another_user = get_user_model().objects.create_user(
+            "bulk2@test.com", "testpassword"
+        )
+        first = sample_borrowing(book=book, user=self.user)
+        second = sample_borrowing(book=book, user=self.user)
+        foreign = sample_borrowing(book=book, user=another_user)
+
+        res = self.client.post(
+            reverse("borrowings-bulk-return"),
+            {"borrowings": [first.id, second.id, first.id, foreign.id]},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data["results"]
+        self.assertIn("actual_return_date", results[0])
+        self.assertIn("actual_return_date", results[1])
+        self.assertIn("error", results[2])
+        self.assertIn("error", results[3])
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 2)
+        foreign.refresh_from_db()
+        self.assertIsNone(foreign.actual_return_date)
+
+
+@override_settings(MAX_ACTIVE_BORROWINGS_PER_USER=3)
+class ActiveBorrowingCounterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "counter@test.com", "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(inventory=10)
+
+    def active_borrowings(self):
+        self.user.refresh_from_db(fields=["active_borrowings"])
+        return self.user.active_borrowings
+
+    def test_borrow_and_return_keep_counter_in_step(self):
+        first = self.client.post(BORROWING_URL, {"book": self.book.id}).data["id"]
+        self.client.post(
+            reverse("borrowings-bulk-borrow"),
+            {"books": [self.book.id, self.book.id]},
+            format="json",
+        )
+        self.assertEqual(self.active_borrowings(), 3)
+
+        self.client.post(reverse("borrowings-return-borrowing", args=[first]))
+        self.assertEqual(self.active_borrowings(), 2)
+
+        others = Borrowing.objects.exclude(pk=first).values_list("pk", flat=True)
+        self.client.post(
+            reverse("borrowings-bulk-return"),
+            {"borrowings": list(others)},
+            format="json",
+        )
+        self.assertEqual(self.active_borrowings(), 0)
+
+    def test_limit_is_enforced(self):
+        for _ in range(3):
+            self.client.post(BORROWING_URL, {"book": self.book.id})
+
+        res = self.client.post(BORROWING_URL, {"book": self.book.id})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 7)
+        self.assertEqual(self.active_borrowings(), 3)
+
+    def test_bulk_borrow_refuses_books_past_limit(self):
+        self.client.post(BORROWING_URL, {"book": self.book.id})
+
+        res = self.client.post(
+            reverse("borrowings-bulk-borrow"),
+            {"books": [self.book.id] * 4},
+            format="json",
+        )
+
+        results = res.data["results"]
+        self.assertEqual([("borrowing" in r) for r in results], [1, 1, 0, 0])
+        self.assertEqual(results[3]["error"], LIMIT_REACHED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 7)
+        self.assertEqual(self.active_borrowings(), 3)
+
+    def test_counter_shown_on_profile_without_queries(self):
+        self.client.post(BORROWING_URL, {"book": self.book.id})
+        self.user.refresh_from_db()
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse("user:me"))
+
+        self.assertEqual(res.data["active_borrowings"], 1)
+
+    def test_reconcile_repairs_drift(self):
+        sample_borrowing(book=self.book, user=self.user)
+        sample_borrowing(book=self.book, user=self.user)
+        other = get_user_model().objects.create_user("drift@test.com", "pass")
+        get_user_model().objects.filter(pk=other.pk).update(active_borrowings=4)
+        out = StringIO()
+
+        call_command("reconcile_borrowing_counters", batch_size=1, stdout=out)
+
+        self.assertEqual(self.active_borrowings(), 2)
+        other.refresh_from_db()
+        self.assertEqual(other.active_borrowings, 0)
+        self.assertIn("repaired 2 drifted counters", out.getvalue())
+
+
+@override_settings(TELEGRAM_ADMIN_CHAT_ID="42")
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "outbox@test.com", "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(inventory=5)
+
+    def drain(self, bot):
+        worker = OutboxWorker(bot, limiter=RateLimiter(0, 0))
+        return async_to_sync(worker.run)(once=True)
+
+    def test_create_borrowing_queues_notification(self):
+        res = self.client.post(BORROWING_URL, {"book": self.book.id})
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.chat_id, "42")
+        self.assertIn(f"Borrowing {res.data['id']}", notification.text)
+        self.assertIn("4 left in inventory", notification.text)
+        self.assertIsNone(notification.sent_at)
+
+    def test_bulk_borrow_queues_one_notification_per_borrowing(self):
+        self.client.post(
+            reverse("borrowings-bulk-borrow"),
+            {"books": [self.book.id, self.book.id]},
+            format="json",
+        )
+
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_worker_coalesces_pending_notifications(self):
+        for _ in range(3):
+            self.client.post(BORROWING_URL, {"book": self.book.id})
+        bot = FakeBot()
+
+        self.drain(bot)
+
+        self.assertEqual(len(bot.sent), 1)
+        chat_id, text = bot.sent[0]
+        self.assertEqual(chat_id, "42")
+        self.assertEqual(text.count("New borrowing created!"), 3)
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=True).exists())
+
+    def test_worker_splits_messages_over_telegram_limit(self):
+        Notification.objects.bulk_create(
+            Notification(chat_id="42", text="x" * 3000) for _ in range(3)
+        )
+        bot = FakeBot()
+
+        self.drain(bot)
+
+        self.assertEqual(len(bot.sent), 3)
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=True).exists())
+
+    @override_settings(TELEGRAM_BOT_TOKEN=None)
+    def test_missing_token_leaves_outbox_pending(self):
+        Notification.objects.create(chat_id="42", text="Waiting")
+
+        with self.assertRaises(ImproperlyConfigured):
+            call_command("process_notifications", once=True)
+
+        self.assertTrue(Notification.objects.filter(sent_at__isnull=True).exists())
+        self.assertIsInstance(get_bot(fake=True), FakeBot)
+
+    def test_fake_bot_keeps_recent_messages_only(self):
+        Notification.objects.bulk_create(
+            Notification(chat_id=str(i), text="x" * 3000) for i in range(3)
+        )
+        bot = FakeBot(keep=2)
+
+        self.drain(bot)
+
+        self.assertEqual([chat_id for chat_id, _ in bot.sent], ["1", "2"])
+
+
+@override_settings(TELEGRAM_ADMIN_CHAT_ID="42")
+class OverdueScanTests(TestCase):
+    def setUp(self):
+        self.today = datetime(2024, 3, 10).date()
+        self.book = sample_book(title="Overdue Book", inventory=100)
+        self.first = get_user_model().objects.create_user("late1@test.com", "pass")
+        self.second = get_user_model().objects.create_user("late2@test.com", "pass")
+
+    def borrow(self, user, days_late, returned=False):
+        return Borrowing.objects.create(
+            book=self.book,
+            user=user,
+            expected_return_date=self.today - timedelta(days=days_late),
+            actual_return_date=self.today if returned else None,
+        )
+
+    def digests(self):
+        return Notification.objects.filter(dedup_key__startswith="overdue:")
+
+    def test_one_digest_per_user_with_overdue_borrowings(self):
+        late = self.borrow(self.first, 3)
+        self.borrow(self.first, 1)
+        self.borrow(self.first, 5, returned=True)
+        self.borrow(self.first, 0)
+        self.borrow(self.second, 0)
+
+        users = notify_overdue_borrowings(self.today, chunk_size=1)
+
+        self.assertEqual(users, 1)
+        digest = self.digests().get()
+        self.assertEqual(digest.dedup_key, f"overdue:{self.first.id}:2024-03-10")
+        self.assertIn("late1@test.com (2)", digest.text)
+        self.assertIn(
+            f"borrowing {late.id}), due 2024-03-07, 3 days overdue", digest.text
+        )
+
+    def test_long_digest_is_truncated(self):
+        for _ in range(DIGEST_MAX_LINES + 5):
+            self.borrow(self.first, 2)
+
+        notify_overdue_borrowings(self.today)
+
+        self.assertIn("... and 5 more", self.digests().get().text)
+
+    def test_rerun_on_same_day_queues_nothing(self):
+        self.borrow(self.first, 2)
+        self.borrow(self.second, 2)
+
+        notify_overdue_borrowings(self.today)
+        notify_overdue_borrowings(self.today)
+
+        self.assertEqual(self.digests().count(), 2)
+        notify_overdue_borrowings(self.today + timedelta(days=1))
+        self.assertEqual(self.digests().count(), 4)
+
+    def test_digest_goes_to_borrower_chat(self):
+        self.first.telegram_chat_id = "1001"
+        self.first.save()
+        self.borrow(self.first, 2)
+        self.borrow(self.second, 2)
+
+        notify_overdue_borrowings(self.today)
+
+        self.assertEqual(
+            dict(self.digests().values_list("dedup_key", "chat_id")),
+            {
+                f"overdue:{self.first.id}:2024-03-10": "1001",
+                f"overdue:{self.second.id}:2024-03-10": "42",
+            },
+        )
+
+
+class BorrowingExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_superuser(
+            "export-staff@test.com", "testpassword"
+        )
+        self.user = get_user_model().objects.create_user(
+            "export@test.com", "testpassword"
+        )
+        self.client.force_authenticate(self.staff)
+        self.book = sample_book(title='Book, "quoted"')
+        self.active = sample_borrowing(book=self.book, user=self.user)
+        self.returned = Borrowing.objects.create(
+            book=self.book, user=self.user, actual_return_date=datetime.today().date()
+        )
+        sample_borrowing(book=self.book, user=self.staff)
+
+    def export(self, **params):
+        res = self.client.get(reverse("borrowings-export"), params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b"".join(res.streaming_content).decode()
+
+    def test_csv_export_applies_filters(self):
+        content = self.export(user_id=self.user.id)
+
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0][:3], ["id", "user_id", "user_email"])
+        self.assertEqual(
+            {int(row[0]) for row in rows[1:]}, {self.active.id, self.returned.id}
+        )
+        self.assertEqual(rows[1][4], 'Book, "quoted"')
+
+    def test_ndjson_export(self):
+        content = self.export(output="ndjson", user_id=self.user.id, is_active="true")
+
+        lines = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["id"], self.active.id)
+        self.assertEqual(lines[0]["user_email"], "export@test.com")
+        self.assertIsNone(lines[0]["actual_return_date"])
+
+    def test_unknown_format(self):
+        res = self.client.get(reverse("borrowings-export"), {"output": "xml"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_is_staff_only(self):
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(reverse("borrowings-export"))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "cursor@test.com", "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        book = sample_book(inventory=100)
+        today = datetime.today().date()
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                book=book,
+                user=self.user,
+                expected_return_date=today + timedelta(days=i % 3),
+            )
+            for i in range(25)
+        )
+
+    def test_cursor_pages_follow_ordering(self):
+        expected = list(
+            Borrowing.objects.order_by("expected_return_date", "id").values_list(
+                "id", flat=True
+            )
+        )
+
+        seen = []
+        pages = []
+        url = f"{BORROWING_URL}?pagination=cursor"
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", res.data)
+            seen.extend(item["id"] for item in res.data["results"])
+            pages.append(res.data)
+            url = res.data["next"]
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]["previous"])
+
+        res = self.client.get(pages[2]["previous"])
+        self.assertEqual(
+            [item["id"] for item in res.data["results"]], expected[10:20]
+        )
+
+    def test_invalid_cursor(self):
+        res = self.client.get(BORROWING_URL, {"cursor": "garbage"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BorrowingQueryPlanTests(TestCase):
+    def test_listings_do_not_scan_borrowings(self):
+        out = StringIO()
+
+        call_command("explain_borrowings", seed=2000, stdout=out)
+
+        self.assertIn("No sequential scans on borrowings.", out.getvalue())
+        self.assertFalse(Borrowing.objects.exists())
+
+
+class BorrowingQueryBudgetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "budget@test.com", "testpassword", first_name="Budget"
+        )
+        self.client.force_authenticate(self.user)
+        self.books = [sample_book(title=f"Budget {i}") for i in range(5)]
+        self.borrowings = [
+            sample_borrowing(book=book, user=self.user) for book in self.books
+        ]
+
+    def assertWithinBudget(self, action, request):
+        budget = BorrowingsViewSet.query_budgets[action]
+        with CaptureQueriesContext(connection) as context:
+            res = request()
+        queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        self.assertLessEqual(
+            len(queries), budget, f"{action} over budget:\n" + "\n".join(queries)
+        )
+        return res
+
+    def test_list(self):
+        res = self.assertWithinBudget("list", lambda: self.client.get(BORROWING_URL))
+
+        self.assertEqual(res.data["results"][0]["user"], "Budget")
+        self.assertEqual(res.data["results"][0]["book"], "Budget 0")
+
+    def test_staff_list(self):
+        staff = get_user_model().objects.create_superuser(
+            "budget-staff@test.com", "testpassword"
+        )
+        for book in self.books:
+            sample_borrowing(book=book, user=staff)
+        self.client.force_authenticate(staff)
+
+        self.assertWithinBudget("list", lambda: self.client.get(BORROWING_URL))
+
+    def test_retrieve(self):
+        url = detail_url(self.borrowings[0].id)
+
+        res = self.assertWithinBudget("retrieve", lambda: self.client.get(url))
+
+        self.assertEqual(res.data["book"]["title"], "Budget 0")
+
+    def test_create(self):
+        self.assertWithinBudget(
+            "create",
+            lambda: self.client.post(BORROWING_URL, {"book": self.books[0].id}),
+        )
+
+    def test_return(self):
+        url = reverse("borrowings-return-borrowing", args=[self.borrowings[0].id])
+
+        res = self.assertWithinBudget(
+            "return_borrowing", lambda: self.client.post(url)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bulk_borrow(self):
+        self.assertWithinBudget(
+            "bulk_borrow",
+            lambda: self.client.post(
+                reverse("borrowings-bulk-borrow"),
+                {"books": [book.id for book in self.books]},
+                format="json",
+            ),
+        )
+
+    def test_export(self):
+        staff = get_user_model().objects.create_superuser(
+            "budget-export@test.com", "testpassword"
+        )
+        self.client.force_authenticate(staff)
+
+        res = self.assertWithinBudget(
+            "export",
+            lambda: b"".join(
+                self.client.get(reverse("borrowings-export")).streaming_content
+            ),
+        )
+
+        self.assertEqual(res.count(b"\n"), len(self.borrowings) + 1)
+
+    def test_bulk_return(self):
+        self.assertWithinBudget(
+            "bulk_return",
+            lambda: self.client.post(
+                reverse("borrowings-bulk-return"),
+                {"borrowings": [borrowing.id for borrowing in self.borrowings]},
+                format="json",
+            ),
+        )
+
+
+@override_settings(ROOT_URLCONF="library_service.asgi_urls")
+class AsyncBorrowingViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "async@test.com", "testpassword"
+        )
+        self.other = get_user_model().objects.create_user(
+            "async-other@test.com", "testpassword"
+        )
+        self.book = sample_book()
+        self.own = [sample_borrowing(self.book, self.user) for _ in range(3)]
+        self.foreign = sample_borrowing(self.book, self.other)
+
+        token = TokenObtainPairSerializer.get_token(self.user).access_token
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.async_client = AsyncClient()
+        self.headers = {"Authorize": f"Bearer {token}"}
+
+    def get(self, url, params=None):
+        return self.async_client.get(url, params, headers=self.headers)
+
+    async def test_list_matches_sync_view(self):
+        res = await self.get(BORROWING_URL)
+        expected = await sync_to_async(self.client.get)(BORROWING_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), expected.json())
+        self.assertEqual(res.json()["count"], len(self.own))
+
+    async def test_list_applies_filters(self):
+        await Borrowing.objects.filter(pk=self.own[0].pk).aupdate(
+            actual_return_date=datetime.today().date()
+        )
+
+        res = await self.get(BORROWING_URL, {"is_active": "true"})
+
+        self.assertEqual(res.json()["count"], len(self.own) - 1)
+
+    async def test_detail_of_other_user_not_found(self):
+        res = await self.get(detail_url(self.own[0].id))
+        self.assertEqual(res.json()["id"], self.own[0].id)
+
+        res = await self.get(detail_url(self.foreign.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_authentication_required(self):
+        res = await AsyncClient().get(BORROWING_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn("WWW-Authenticate", res)
+
+    async def test_export_streams_from_async_iterator(self):
+        staff = await sync_to_async(get_user_model().objects.create_superuser)(
+            "async-staff@test.com", "testpassword"
+        )
+        token = TokenObtainPairSerializer.get_token(staff).access_token
+
+        res = await self.async_client.get(
+            reverse("borrowings-export"),
+            {"output": "ndjson"},
+            headers={"Authorize": f"Bearer {token}"},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.is_async)
+        content = b"".join([chunk async for chunk in res.streaming_content])
+        self.assertEqual(len(content.splitlines()), len(self.own) + 1)
+
+    async def test_export_is_staff_only(self):
+        res = await self.get(reverse("borrowings-export"))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class ReplicaRoutingTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A second alias on the test database stands in for a replica. It
+        # is added here, after the runner has set the test databases up.
+        connections.settings["replica_1"] = {
+            **connections["default"].settings_dict,
+            "TEST": {"MIRROR": "default"},
+        }
+        cls.databases = {"default", "replica_1"}
+        cls.addClassCleanup(cls.remove_replica)
+        super().setUpClass()
+
+    @classmethod
+    def remove_replica(cls):
+        connections["replica_1"].close()
+        del connections["replica_1"]
+        del connections.settings["replica_1"]
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "replica@test.com", "testpassword"
+        )
+        self.book = sample_book()
+        self.borrowing = sample_borrowing(self.book, self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertServedBy(self, alias, request):
+        other = "replica_1" if alias == "default" else "default"
+        with CaptureQueriesContext(connections[alias]) as used:
+            with CaptureQueriesContext(connections[other]) as unused:
+                res = request()
+
+        self.assertTrue(used.captured_queries)
+        self.assertEqual(unused.captured_queries, [])
+        return res
+
+    def test_reads_go_to_replica(self):
+        res = self.assertServedBy("replica_1", lambda: self.client.get(BORROWING_URL))
+        self.assertEqual(res.data["count"], 1)
+
+        self.assertServedBy(
+            "replica_1", lambda: self.client.get(detail_url(self.borrowing.id))
+        )
+        # The replicas have caught up with the books written in setUp.
+        cache.delete(CATALOGUE_PIN_KEY)
+        self.assertServedBy("replica_1", lambda: self.client.get("/api/books/"))
+
+    def test_catalogue_write_pins_book_reads_to_primary(self):
+        cache.delete(CATALOGUE_PIN_KEY)
+        # Written by someone else, so this user is not pinned.
+        self.book.inventory = 7
+        self.book.save()
+
+        res = self.assertServedBy(
+            "default", lambda: self.client.get(f"/api/books/{self.book.id}/")
+        )
+        self.assertEqual(res.data["inventory"], 7)
+
+    def test_inventory_change_keeps_book_reads_on_replica(self):
+        cache.delete(CATALOGUE_PIN_KEY)
+        Book.objects.reserve(self.book.id)
+
+        self.assertServedBy("replica_1", lambda: self.client.get("/api/books/"))
+
+    def test_writes_go_to_primary_and_pin_the_writer(self):
+        self.assertServedBy(
+            "default",
+            lambda: self.client.post(BORROWING_URL, {"book": self.book.id}),
+        )
+
+        res = self.assertServedBy("default", lambda: self.client.get(BORROWING_URL))
+        self.assertEqual(res.data["count"], 2)
+
+    def test_return_goes_to_primary(self):
+        url = reverse("borrowings-return-borrowing", args=[self.borrowing.id])
+
+        res = self.assertServedBy("default", lambda: self.client.post(url))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_transactions_read_from_primary(self):
+        with reads_from_replica():
+            self.assertEqual(Borrowing.objects.all().db, "replica_1")
+            with transaction.atomic():
+                self.assertEqual(Borrowing.objects.all().db, "default")
+
+
+class ProductionSettingsTests(SimpleTestCase):
+    def load_settings(self, **env):
+        return subprocess.run(
+            [sys.executable, "-c", "import library_service.settings"],
+            env={
+                **os.environ,
+                "DJANGO_ENV": "prod",
+                "SECRET_KEY": "test",
+                "POSTGRES_HOST": "primary",
+                "POSTGRES_REPLICA_HOSTS": "replica",
+                **env,
+            },
+            capture_output=True,
+            text=True,
+        )
+
+    def test_replicas_need_a_shared_cache(self):
+        result = self.load_settings(REDIS_URL="")
+
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("ImproperlyConfigured", result.stderr)
+
+    def test_replicas_with_redis(self):
+        result = self.load_settings(REDIS_URL="redis://cache:6379/0")
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.user = get_user_model().objects.create_user(
+            "metrics@test.com", "testpassword"
+        )
+        self.book = sample_book()
+        self.borrowing = sample_borrowing(self.book, self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_records_per_action(self):
+        self.client.get(BORROWING_URL)
+        self.client.get(BORROWING_URL)
+        self.client.post(
+            reverse("borrowings-return-borrowing", args=[self.borrowing.id])
+        )
+
+        totals = registry.collect()
+        listed = totals["BorrowingsViewSet.list"]
+        self.assertEqual(sum(listed.duration.counts), 2)
+        self.assertEqual(listed.queries.sum, 4)
+        self.assertGreater(listed.db_seconds, 0)
+        self.assertGreater(listed.serialize_seconds, 0)
+        self.assertGreater(listed.render_seconds, 0)
+        self.assertGreater(listed.size.sum, 0)
+        self.assertEqual(listed.statuses, {200: 2})
+        self.assertIn("BorrowingsViewSet.return_borrowing", totals)
+
+    def test_exited_threads_do_not_keep_shards(self):
+        def record():
+            registry.view("Exited.view").statuses[200] = 1
+
+        before = registry.shard_count()
+        for _ in range(5):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+
+        self.assertLessEqual(registry.shard_count(), before + 1)
+        self.assertEqual(registry.collect()["Exited.view"].statuses, {200: 5})
+
+    def test_metrics_endpoint(self):
+        self.client.get(BORROWING_URL)
+        staff = get_user_model().objects.create_user(
+            "scraper@test.com", "testpassword", is_staff=True
+        )
+        self.client.force_login(staff)
+
+        res = self.client.get(reverse("metrics"))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        body = res.content.decode()
+        self.assertIn(
+            'library_request_duration_seconds_count{view="BorrowingsViewSet.list"} 1',
+            body,
+        )
+        self.assertIn(
+            'library_request_db_queries_bucket{view="BorrowingsViewSet.list",le="+Inf"} 1',
+            body,
+        )
+        self.assertIn(
+            'library_responses_total{view="BorrowingsViewSet.list",status="200"} 1',
+            body,
+        )
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_denied_without_token(self):
+        self.client.force_login(self.user)
+
+        res = self.client.get(reverse("metrics"))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(MIDDLEWARE=PROD_MIDDLEWARE, METRICS_TOKEN=None)
+    def test_metrics_denied_without_auth_middleware(self):
+        self.assertEqual(
+            self.client.get(reverse("metrics")).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        token = TokenObtainPairSerializer.get_token(self.user).access_token
+        res = self.client.get(reverse("metrics"), HTTP_AUTHORIZE=f"Bearer {token}")
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(MIDDLEWARE=PROD_MIDDLEWARE, METRICS_TOKEN="scrape-secret")
+    def test_metrics_for_staff_jwt_without_auth_middleware(self):
+        self.assertEqual(
+            self.client.get(reverse("metrics")).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        staff = get_user_model().objects.create_user(
+            "scraper@test.com", "testpassword", is_staff=True
+        )
+        token = TokenObtainPairSerializer.get_token(staff).access_token
+        res = self.client.get(reverse("metrics"), HTTP_AUTHORIZE=f"Bearer {token}")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_metrics_token(self):
+        self.assertEqual(
+            self.client.get(reverse("metrics")).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        res = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-secret"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(SLOW_REQUEST_SECONDS=0, SLOW_REQUEST_SAMPLE_RATE=1)
+    def test_slow_request_log_includes_sql(self):
+        with self.assertLogs("library_service.slow_requests", "WARNING") as logs:
+            self.client.get(BORROWING_URL)
+
+        self.assertIn("BorrowingsViewSet.list", logs.output[0])
+        self.assertIn("borrowings_borrowing", logs.output[0])
+
+    @override_settings(SLOW_REQUEST_SECONDS=0, SLOW_REQUEST_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_logged(self):
+        with self.assertNoLogs("library_service.slow_requests", "WARNING"):
+            self.client.get(BORROWING_URL)
+
+
+class BorrowingListValuesSerializerTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_user(
+            "values@test.com", "testpassword", is_staff=True
+        )
+        self.client.force_authenticate(self.staff)
+        named = get_user_model().objects.create_user(
+            "named@test.com", "testpassword", first_name="Ada", last_name="Lovelace"
+        )
+        first_only = get_user_model().objects.create_user(
+            "first@test.com", "testpassword", first_name="Grace"
+        )
+        book = sample_book(title="Ünïcödé \"title\"\u2028", inventory=100)
+        for user in (self.staff, named, first_only):
+            sample_borrowing(book=book, user=user)
+        returned = sample_borrowing(book=book, user=named)
+        returned.actual_return_date = returned.expected_return_date
+        returned.save()
+
+    def test_output_matches_list_serializer(self):
+        queryset = Borrowing.objects.select_related("book", "user").order_by("id")
+        expected = JSONRenderer().render(
+            BorrowingListSerializer(queryset, many=True).data
+        )
+
+        data = BorrowingListValuesSerializer(
+            BorrowingListValuesSerializer.rows(queryset)
+        ).data
+
+        self.assertEqual(JSONRenderer().render(data), expected)
+
+    def test_list_responses_match_regular_serializer(self):
+        for params in ({}, {"is_active": "true"}, {"pagination": "cursor"}):
+            with self.subTest(params=params):
+                fast = self.client.get(BORROWING_URL, params)
+                with override_settings(FAST_LIST_SERIALIZERS=False):
+                    regular = self.client.get(BORROWING_URL, params)
+
+                self.assertEqual(fast.status_code, status.HTTP_200_OK)
+                self.assertEqual(fast.content, regular.content)
+
+
+@override_settings(TELEGRAM_ADMIN_CHAT_ID="42")
+class HoldQueueTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        users = get_user_model().objects
+        self.reader = users.create_user("reader@test.com", "testpassword")
+        self.first = users.create_user(
+            "first@test.com", "testpassword", telegram_chat_id="1001"
+        )
+        self.second = users.create_user("second@test.com", "testpassword")
+        self.book = sample_book(inventory=1)
+
+        self.client.force_authenticate(self.reader)
+        res = self.client.post(BORROWING_URL, {"book": self.book.id})
+        self.borrowing_id = res.data["id"]
+
+    def hold(self, user, book=None):
+        self.client.force_authenticate(user)
+        return self.client.post(HOLD_URL, {"book": (book or self.book).id})
+
+    def return_borrowing(self):
+        self.client.force_authenticate(self.reader)
+        url = reverse("borrowings-return-borrowing", args=[self.borrowing_id])
+        return self.client.post(url)
+
+    def test_copy_returned_while_holding_is_lent(self):
+        place_hold = HoldSerializer.save
+
+        def save_after_return(serializer, **kwargs):
+            # The copy comes back, finding no queue, after the shelf check.
+            Book.objects.release(self.book.id)
+            return place_hold(serializer, **kwargs)
+
+        with mock.patch.object(HoldSerializer, "save", save_after_return):
+            res = self.hold(self.first)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        hold = Hold.objects.get(pk=res.data["id"])
+        self.assertIsNotNone(hold.fulfilled_at)
+        self.assertEqual(hold.borrowing.user, self.first)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_hold_refused_while_copies_are_available(self):
+        res = self.hold(self.first, sample_book(inventory=1))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data, [COPIES_AVAILABLE])
+
+    def test_one_pending_hold_per_user_and_book(self):
+        self.assertEqual(self.hold(self.first).status_code, status.HTTP_201_CREATED)
+
+        res = self.hold(self.first)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data, [ALREADY_HOLDING])
+
+    def test_queue_positions_and_expected_dates(self):
+        first = self.hold(self.first)
+        second = self.hold(self.second)
+        expected_return_date = Borrowing.objects.get(
+            pk=self.borrowing_id
+        ).expected_return_date
+
+        self.assertEqual(first.data["position"], 1)
+        self.assertEqual(
+            first.data["expected_available"], expected_return_date
+        )
+        self.assertEqual(second.data["position"], 2)
+        self.assertIsNone(second.data["expected_available"])
+
+    def test_return_lends_copy_to_oldest_hold(self):
+        self.hold(self.first)
+        self.hold(self.second)
+        Notification.objects.all().delete()
+
+        self.assertEqual(self.return_borrowing().status_code, status.HTTP_200_OK)
+
+        hold = Hold.objects.get(user=self.first)
+        self.assertIsNotNone(hold.fulfilled_at)
+        self.assertEqual(hold.borrowing.book_id, self.book.id)
+        self.assertIsNone(hold.borrowing.actual_return_date)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.active_borrowings, 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(
+            sorted(Notification.objects.values_list("chat_id", flat=True)),
+            ["1001", "42"],
+        )
+
+        self.client.force_authenticate(self.second)
+        res = self.client.get(HOLD_URL)
+        self.assertEqual(res.data["results"][0]["position"], 1)
+
+    def test_bulk_return_lends_copies_to_holds(self):
+        self.hold(self.first)
+
+        self.client.force_authenticate(self.reader)
+        self.client.post(
+            reverse("borrowings-bulk-return"),
+            {"borrowings": [self.borrowing_id]},
+            format="json",
+        )
+
+        self.assertIsNotNone(Hold.objects.get(user=self.first).borrowing_id)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    @override_settings(MAX_ACTIVE_BORROWINGS_PER_USER=1)
+    def test_users_at_their_limit_keep_their_place(self):
+        self.hold(self.first)
+        self.hold(self.second)
+        sample_borrowing(book=sample_book(), user=self.first)
+        get_user_model().objects.filter(pk=self.first.pk).update(active_borrowings=1)
+
+        self.return_borrowing()
+
+        self.assertIsNone(Hold.objects.get(user=self.first).fulfilled_at)
+        self.assertIsNotNone(Hold.objects.get(user=self.second).fulfilled_at)
+
+    def test_returned_copy_goes_back_without_holds(self):
+        self.return_borrowing()
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+    def test_cancel_pending_hold(self):
+        hold_id = self.hold(self.first).data["id"]
+
+        res = self.client.delete(reverse("holds-detail", args=[hold_id]))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Hold.objects.exists())
+
+    def test_availability(self):
+        self.hold(self.first)
+        expected_return_date = Borrowing.objects.get(
+            pk=self.borrowing_id
+        ).expected_return_date
+
+        res = self.client.get(reverse("books-availability", args=[self.book.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["inventory"], 0)
+        self.assertEqual(res.data["holds"], 1)
+        # The only copy out goes to the user already waiting.
+        self.assertIsNone(res.data["next_available"])
+        self.assertEqual(
+            res.data["expected_returns"],
+            [{"date": expected_return_date, "copies": 1}],
+        )
+
+
+@override_settings(FINE_MULTIPLIER=Decimal("1.5"))
+class FeeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "fees@test.com", "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(daily_fee=Decimal("0.35"), inventory=10)
+
+    def borrowing(self, borrow_date, expected_return_date, actual_return_date=None):
+        borrowing = sample_borrowing(book=self.book, user=self.user)
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            borrow_date=borrow_date,
+            expected_return_date=expected_return_date,
+            actual_return_date=actual_return_date,
+        )
+        return borrowing
+
+    def days_ago(self, days):
+        return date.today() - timedelta(days=days)
+
+    def charges(self, borrowing):
+        return list(
+            Payment.objects.filter(borrowing=borrowing)
+            .order_by("type")
+            .values_list("type", "days", "money_to_pay")
+        )
+
+    def return_borrowing(self, borrowing):
+        self.client.post(reverse("borrowings-return-borrowing", args=[borrowing.id]))
+
+    def test_return_on_time_charges_days_borrowed(self):
+        borrowing = self.borrowing(self.days_ago(3), self.days_ago(-11))
+
+        self.return_borrowing(borrowing)
+
+        self.assertEqual(self.charges(borrowing), [("PAYMENT", 3, Decimal("1.05"))])
+
+    def test_same_day_return_charges_one_day(self):
+        borrowing = self.borrowing(self.days_ago(0), self.days_ago(-14))
+
+        self.return_borrowing(borrowing)
+
+        self.assertEqual(self.charges(borrowing), [("PAYMENT", 1, Decimal("0.35"))])
+
+    def test_late_return_adds_fine(self):
+        borrowing = self.borrowing(self.days_ago(20), self.days_ago(7))
+
+        self.return_borrowing(borrowing)
+
+        # 7 days at 0.35 * 1.5 is 3.675, rounded to the cent.
+        self.assertEqual(
+            self.charges(borrowing),
+            [("FINE", 7, Decimal("3.68")), ("PAYMENT", 13, Decimal("4.55"))],
+        )
+
+    def test_bulk_return_charges_each_borrowing(self):
+        on_time = self.borrowing(self.days_ago(5), self.days_ago(-9))
+        late = self.borrowing(self.days_ago(16), self.days_ago(2))
+
+        self.client.post(
+            reverse("borrowings-bulk-return"),
+            {"borrowings": [on_time.id, late.id]},
+            format="json",
+        )
+
+        self.assertEqual(self.charges(on_time), [("PAYMENT", 5, Decimal("1.75"))])
+        self.assertEqual(
+            self.charges(late),
+            [("FINE", 2, Decimal("1.05")), ("PAYMENT", 14, Decimal("4.90"))],
+        )
+
+    def test_bill_month_charges_returns_of_the_month_once(self):
+        early = self.borrowing(date(2024, 3, 1), date(2024, 3, 15), date(2024, 3, 4))
+        late = self.borrowing(date(2024, 3, 10), date(2024, 3, 24), date(2024, 3, 31))
+        next_month = self.borrowing(
+            date(2024, 2, 20), date(2024, 3, 5), date(2024, 4, 1)
+        )
+        self.borrowing(date(2024, 3, 1), date(2024, 3, 15))
+
+        result = bill_month(date(2024, 3, 1), chunk_size=1)
+
+        self.assertEqual(
+            result, {"written": 3, "payments": 3, "total": Decimal("9.63")}
+        )
+        self.assertEqual(self.charges(early), [("PAYMENT", 3, Decimal("1.05"))])
+        self.assertEqual(
+            self.charges(late),
+            [("FINE", 7, Decimal("3.68")), ("PAYMENT", 14, Decimal("4.90"))],
+        )
+        self.assertEqual(self.charges(next_month), [])
+        self.assertEqual(bill_month(date(2024, 3, 31))["written"], 0)
+
+    def test_bill_month_command(self):
+        self.borrowing(date(2024, 3, 1), date(2024, 3, 15), date(2024, 3, 4))
+        out = StringIO()
+
+        call_command("bill_month", "2024-03", stdout=out)
+
+        self.assertEqual(
+            out.getvalue().strip(), "2024-03: wrote 1 payments, 1 in total for 1.05."
+        )
+
+    def test_users_see_their_own_payments(self):
+        own = self.borrowing(self.days_ago(3), self.days_ago(-11), date.today())
+        other_user = get_user_model().objects.create_user(
+            "other-fees@test.com", "testpassword"
+        )
+        other = sample_borrowing(book=self.book, user=other_user)
+        Borrowing.objects.filter(pk=other.pk).update(actual_return_date=date.today())
+        bill_month(date.today())
+
+        res = self.client.get(reverse("payments-list"))
+
+        self.assertEqual(
+            [payment["borrowing"] for payment in res.data["results"]], [own.id]
+        )
+        self.assertEqual(res.data["results"][0]["money_to_pay"], "1.05")
@@ -1,9 +1,11 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from borrowings.views import BorrowingsViewSet
+from borrowings.views import BorrowingsViewSet, HoldViewSet, PaymentViewSet
 
 router = routers.DefaultRouter()
 router.register("borrowings", BorrowingsViewSet, basename="borrowings")
+router.register("holds", HoldViewSet, basename="holds")
+router.register("payments", PaymentViewSet, basename="payments")
 
 app_name = "borrowings"
@@ -1,24 +1,57 @@
 from datetime import date
 
-from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, status
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from books.models import Book
+from borrowings.export import (
+    EXPORT_FORMATS,
+    export_response,
+    export_rows,
+    to_csv,
+    to_ndjson,
+)
+from borrowings.fees import charge_returned
 from borrowings.filters import BorrowingsFilter
-from borrowings.models import Borrowing
+from borrowings.holds import (
+    ALREADY_HOLDING,
+    COPIES_AVAILABLE,
+    estimate_availability,
+    lend_shelved,
+    lend_to_holds,
+    with_positions,
+)
+from borrowings.models import Borrowing, Hold, Payment
 from borrowings.serializers import (
     BorrowingSerializer,
     BorrowingListSerializer,
+    BorrowingListValuesSerializer,
     BorrowingDetailSerializer,
     BorrowingReturnSerializer,
+    BorrowingBulkCreateSerializer,
+    BorrowingBulkReturnSerializer,
+    HoldSerializer,
+    PaymentSerializer,
 )
+from borrowings.services import (
+    LIMIT_REACHED,
+    NO_COPIES_LEFT,
+    borrow_books,
+    return_borrowings,
+)
+from library_service.fast_serializers import ValuesListMixin
+from library_service.pagination import KeysetPagination, KeysetPaginationMixin
+from library_service.replicas import ReplicaReadsMixin
+from user.authentication import full_user
 
 
 class BorrowingPagination(PageNumberPagination):
@@ -26,22 +59,67 @@ class BorrowingPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class BorrowingCursorPagination(KeysetPagination):
+    page_size = 10
+    ordering = ("expected_return_date", "id")
+
+
 class BorrowingsViewSet(
+    ReplicaReadsMixin,
+    KeysetPaginationMixin,
+    ValuesListMixin,
     GenericViewSet,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
 ):
     permission_classes = [IsAuthenticated]
+    throttle_scope = "borrowings"
     filterset_class = BorrowingsFilter
     pagination_class = BorrowingPagination
+    keyset_pagination_class = BorrowingCursorPagination
+    values_serializer_class = BorrowingListValuesSerializer
+    replica_actions = ("list", "retrieve", "export")
+
+    # Queries each action may run, transaction control and authentication
+    # aside. Enforced by the tests, so an N+1 shows up as a failing budget.
+    # Returns include the hold queue lookup, with nobody waiting, and
+    # writing the payments.
+    query_budgets = {
+        "list": 2,
+        "retrieve": 1,
+        "create": 6,
+        "return_borrowing": 6,
+        "bulk_borrow": 7,
+        "bulk_return": 6,
+        "export": 1,
+    }
 
     def get_queryset(self):
-        queryset = Borrowing.objects.prefetch_related("book", "user")
+        queryset = Borrowing.objects.all()
+
+        if self.action == "list":
+            queryset = queryset.select_related("book", "user").only(
+                "id",
+                "borrow_date",
+                "expected_return_date",
+                "actual_return_date",
+                "book__title",
+                "user__first_name",
+                "user__last_name",
+            )
+
+        if self.action == "retrieve":
+            queryset = queryset.select_related("book")
+
+        if self.action == "return_borrowing":
+            queryset = queryset.only(
+                "id", "actual_return_date", "book_id", "user_id"
+            )
 
         user = self.request.user
         if not user.is_staff:
-            queryset = queryset.filter(user=user)
+            queryset = queryset.filter(user_id=user.id)
 
         if user.is_staff:
             customer_id = self.request.query_params.get("user_id")
@@ -60,19 +138,26 @@ class BorrowingsViewSet(
         if self.action == "return_borrowing":
             return BorrowingReturnSerializer
 
+        if self.action == "bulk_borrow":
+            return BorrowingBulkCreateSerializer
+
+        if self.action == "bulk_return":
+            return BorrowingBulkReturnSerializer
+
         return BorrowingSerializer
 
     def perform_create(self, serializer):
         book = serializer.validated_data["book"]
-        if book.inventory > 0:
-            book.inventory -= 1
-            book.save()
-        else:
-            raise ValidationError(
-                "There are no books left in inventory. Cannot borrow."
-            )
 
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            if not get_user_model().objects.take_borrowing_slots(self.request.user.pk):
+                raise ValidationError(LIMIT_REACHED)
+            if not Book.objects.reserve(book.id):
+                raise ValidationError(NO_COPIES_LEFT)
+            book.refresh_from_db(fields=["inventory"])
+
+            # The notification names the borrower, so load the full user.
+            serializer.save(user=full_user(self.request.user))
 
     @action(
         methods=["POST"],
@@ -83,7 +168,21 @@ class BorrowingsViewSet(
         """Endpoint for returning borrowing."""
         borrowing = self.get_object()
 
-        if borrowing.actual_return_date:
+        returned = False
+        if not borrowing.actual_return_date:
+            with transaction.atomic():
+                returned = Borrowing.objects.filter(
+                    pk=borrowing.pk, actual_return_date__isnull=True
+                ).update(actual_return_date=date.today())
+                if returned:
+                    charge_returned(Borrowing.objects.filter(pk=borrowing.pk))
+                    if not lend_to_holds({borrowing.book_id: 1}):
+                        Book.objects.release(borrowing.book_id)
+                    get_user_model().objects.release_borrowing_slots(
+                        {borrowing.user_id: 1}
+                    )
+
+        if not returned:
             return Response(
                 {
                     "detail": "This borrowing has been already returned. You cannot return it twice."
@@ -91,15 +190,90 @@ class BorrowingsViewSet(
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        with transaction.atomic():
-            book = borrowing.book
-            book.inventory += 1
-            book.save()
+        return Response(status=status.HTTP_200_OK)
 
-            borrowing.actual_return_date = date.today()
-            borrowing.save()
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk-borrow",
+    )
+    def bulk_borrow(self, request):
+        """Endpoint for borrowing a stack of books at once."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        return Response(status=status.HTTP_200_OK)
+        results = borrow_books(request.user, serializer.validated_data["books"])
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk-return",
+    )
+    def bulk_return(self, request):
+        """Endpoint for returning a stack of borrowings at once."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = return_borrowings(
+            self.get_queryset(),
+            serializer.validated_data["borrowings"],
+        )
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "output",
+                type=OpenApiTypes.STR,
+                enum=list(EXPORT_FORMATS),
+                description="Export format, csv by default (ex. ?output=ndjson)",
+            ),
+            OpenApiParameter(
+                "user_id",
+                type=OpenApiTypes.INT,
+                description="Filter by user id (ex. ?user_id=2)",
+            ),
+            OpenApiParameter(
+                "is_active",
+                type=OpenApiTypes.ANY,
+                description="Only active borrowings (ex. ?is_active=true)",
+            ),
+        ],
+        responses={
+            (200, media_type): OpenApiTypes.STR
+            for media_type in EXPORT_FORMATS.values()
+        },
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        permission_classes=[IsAdminUser],
+        pagination_class=None,
+    )
+    def export(self, request):
+        """Endpoint for streaming every matching borrowing to staff."""
+        output, queryset = self.export_source()
+        rows = export_rows(queryset)
+        chunks = to_csv(rows) if output == "csv" else to_ndjson(rows)
+        return export_response(chunks, output)
+
+    def export_source(self):
+        """The requested export format and the queryset of rows to export."""
+        output = self.request.query_params.get("output", "csv")
+        if output not in EXPORT_FORMATS:
+            raise ValidationError(
+                {"output": f"Choose one of: {', '.join(EXPORT_FORMATS)}."}
+            )
+
+        # The rows are read while streaming, after the view has returned,
+        # so bind the queryset to the database picked for this request now.
+        queryset = self.filter_queryset(self.get_queryset()).order_by(
+            *BorrowingCursorPagination.ordering
+        )
+        return output, queryset.using(queryset.db)
 
     @extend_schema(
         parameters=[
@@ -117,7 +291,85 @@ class BorrowingsViewSet(
                     "(ex. ?is_active=1 or ?is=active=true or ?is_active=any)"
                 ),
             ),
+            OpenApiParameter(
+                "pagination",
+                type=OpenApiTypes.STR,
+                enum=["cursor"],
+                description=(
+                    "Switch to keyset pagination ordered by "
+                    "(expected_return_date, id); follow the next/previous "
+                    "links, which carry a `cursor` parameter"
+                ),
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
+
+
+class HoldViewSet(
+    GenericViewSet,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+):
+    """Queue for out-of-stock books; deleting a pending hold leaves the queue."""
+
+    serializer_class = HoldSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "holds"
+    pagination_class = BorrowingPagination
+
+    def get_queryset(self):
+        queryset = Hold.objects.all()
+
+        if self.action == "destroy":
+            queryset = queryset.filter(fulfilled_at__isnull=True)
+        else:
+            queryset = with_positions(queryset)
+
+        user = self.request.user
+        if not user.is_staff:
+            queryset = queryset.filter(user_id=user.id)
+
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        estimate_availability(page if page is not None else queryset)
+        return page
+
+    def perform_create(self, serializer):
+        book = serializer.validated_data["book"]
+        if book.inventory > 0:
+            raise ValidationError(COPIES_AVAILABLE)
+
+        try:
+            with transaction.atomic():
+                hold = serializer.save(user_id=self.request.user.id)
+        except IntegrityError:
+            raise ValidationError(ALREADY_HOLDING)
+        lend_shelved(book.id)
+
+        serializer.instance = self.get_queryset().get(pk=hold.pk)
+        estimate_availability([serializer.instance])
+
+
+class PaymentViewSet(
+    GenericViewSet,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+):
+    serializer_class = PaymentSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "payments"
+    pagination_class = BorrowingPagination
+
+    def get_queryset(self):
+        queryset = Payment.objects.all()
+
+        user = self.request.user
+        if not user.is_staff:
+            queryset = queryset.filter(borrowing__user_id=user.id)
+
+        return queryset
@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+os.environ.setdefault("DJANGO_ENV", "asgi")
 
 application = get_asgi_application()
@@ -0,0 +1,24 @@
+"""URL configuration for the ASGI profile.
+
+The JSON list and retrieve endpoints of books and borrowings, and the
+borrowings export, are served by async views; every other route is the
+same as in library_service.urls.
+"""
+from django.urls import path
+
+from books.async_views import book_detail_view, book_list_view
+from borrowings.async_views import (
+    borrowing_detail_view,
+    borrowing_export,
+    borrowing_list_view,
+)
+from library_service.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("api/books/", book_list_view, name="books-list"),
+    path("api/books/<pk>/", book_detail_view, name="books-detail"),
+    path("api/borrowings/", borrowing_list_view, name="borrowings-list"),
+    path("api/borrowings/export/", borrowing_export, name="borrowings-export"),
+    path("api/borrowings/<pk>/", borrowing_detail_view, name="borrowings-detail"),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,181 @@
+"""Async read paths for the API, served when running under ASGI.
+
+Only what is hot and read-only is async: GET list and retrieve of JSON
+resources. Every other request, including the browsable API and keyset
+pagination, is handed to the regular DRF view in a worker thread, so the
+two serving modes return the same responses.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from library_service.renderers import FastJSONRenderer
+
+JSON = FastJSONRenderer()
+
+
+def json_response(data, status=200, headers=None) -> HttpResponse:
+    return HttpResponse(
+        JSON.render(data),
+        status=status,
+        content_type=JSON.media_type,
+        headers=headers,
+    )
+
+
+def prerendered_response(content, headers=None) -> HttpResponse:
+    return HttpResponse(content, content_type=JSON.media_type, headers=headers)
+
+
+def error_response(exc: exceptions.APIException) -> HttpResponse:
+    """The response DRF's exception handler would give for exc."""
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {"detail": exc.detail}
+
+    headers = {}
+    if getattr(exc, "auth_header", None):
+        headers["WWW-Authenticate"] = exc.auth_header
+    if getattr(exc, "wait", None):
+        headers["Retry-After"] = "%d" % exc.wait
+    return json_response(data, status=exc.status_code, headers=headers)
+
+
+def wants_json(request) -> bool:
+    """False for requests the browsable API or a format override should see."""
+    if "format" in request.GET:
+        return request.GET["format"] == "json"
+    return "text/html" not in request.headers.get("Accept", "")
+
+
+async def authenticate(request) -> Request:
+    """Wrap request for DRF and run the configured authenticators.
+
+    Authentication may look the token up in the database, so it runs in a
+    worker thread. Requests without a token have nothing to look up and
+    are authenticated inline.
+    """
+    drf_request = Request(
+        request,
+        authenticators=[
+            authenticator()
+            for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ],
+    )
+    try:
+        if request.META.get(jwt_settings.AUTH_HEADER_NAME):
+            await sync_to_async(lambda: drf_request.user)()
+        else:
+            drf_request.user
+    except (exceptions.NotAuthenticated, exceptions.AuthenticationFailed) as exc:
+        exc.auth_header = drf_request.authenticators[0].authenticate_header(drf_request)
+        raise
+    return drf_request
+
+
+async def check_throttles(view, request: Request) -> None:
+    """Run the throttles of view, in a worker thread if they call Redis."""
+    if settings.THROTTLE_REDIS_URL:
+        await sync_to_async(view.check_throttles)(request)
+    else:
+        view.check_throttles(request)
+
+
+def require_authenticated(request: Request) -> None:
+    if not (request.user and request.user.is_authenticated):
+        exc = exceptions.NotAuthenticated()
+        exc.auth_header = request.authenticators[0].authenticate_header(request)
+        raise exc
+
+
+async def paginate(request, queryset, page_size: int) -> dict:
+    """Page-number pagination matching DRF's PageNumberPagination output."""
+    count = await queryset.acount()
+    last_page = max((count + page_size - 1) // page_size, 1)
+
+    page = request.query_params.get("page", 1)
+    try:
+        page = last_page if page == "last" else int(page)
+    except ValueError:
+        raise exceptions.NotFound("Invalid page.")
+    if page < 1 or page > last_page:
+        raise exceptions.NotFound("Invalid page.")
+
+    offset = (page - 1) * page_size
+    objects = [obj async for obj in queryset[offset : offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, "page", page + 1) if page < last_page else None
+    if page == 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, "page")
+    else:
+        previous_url = replace_query_param(url, "page", page - 1)
+
+    return {
+        "count": count,
+        "next": next_url,
+        "previous": previous_url,
+        "objects": objects,
+    }
+
+
+def viewset_for(viewset_class, request: Request, action: str, **kwargs):
+    """An instance of viewset_class set up as DRF would for action."""
+    # Extra actions carry their own permission_classes and the like.
+    initkwargs = getattr(getattr(viewset_class, action), "kwargs", {})
+    return viewset_class(
+        request=request,
+        action=action,
+        format_kwarg=None,
+        args=(),
+        kwargs=kwargs,
+        **initkwargs,
+    )
+
+
+def keyset_requested(viewset_class):
+    """use_fallback check for lists that opted into keyset pagination."""
+
+    def check(request):
+        view = viewset_for(viewset_class, Request(request), "list")
+        return view.uses_keyset_pagination()
+
+    return check
+
+
+def async_read_view(read, fallback, use_fallback=None):
+    """Serve JSON GETs with the coroutine read, anything else with fallback.
+
+    use_fallback(request) may send further GETs to the sync view.
+    """
+    sync_fallback, fallback = fallback, sync_to_async(fallback)
+
+    @wraps(read)
+    async def view(request, *args, **kwargs):
+        if (
+            request.method != "GET"
+            or not wants_json(request)
+            or (use_fallback is not None and use_fallback(request))
+        ):
+            return await fallback(request, *args, **kwargs)
+        try:
+            return await read(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return error_response(exc)
+
+    # The DRF views do their own CSRF checks.
+    view.csrf_exempt = True
+    # Named after the viewset action it serves, as the DRF view would be.
+    view.cls = sync_fallback.cls
+    view.actions = sync_fallback.actions
+    return view
@@ -0,0 +1,98 @@
+"""PostgreSQL backend that borrows its connections from a psycopg pool.
+
+Django 5.0 either opens a connection per request or keeps one per thread
+(CONN_MAX_AGE). Here every process keeps a pool per database instead: a
+connection is taken from it when Django connects and handed back when
+Django closes, so short requests skip the connection handshake and the
+server sees at most max_size connections per process.
+
+OPTIONS["pool"] holds psycopg_pool.ConnectionPool arguments, e.g.
+{"min_size": 2, "max_size": 10, "timeout": 10}. CONN_MAX_AGE must be 0.
+"""
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg import IsolationLevel
+from psycopg_pool import ConnectionPool
+
+from library_service.db.backends.postgresql.creation import DatabaseCreation
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    # Pools are shared by every thread's wrapper of the same database.
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @property
+    def _pool_key(self):
+        return self.alias, self.settings_dict["NAME"]
+
+    @property
+    def pool(self) -> ConnectionPool | None:
+        # Connections to the maintenance database, used to create and drop
+        # the test database, are short-lived and not pooled.
+        if self.alias == NO_DB_ALIAS:
+            return None
+
+        pool = self._pools.get(self._pool_key)
+        if pool is not None:
+            return pool
+
+        if self.settings_dict["CONN_MAX_AGE"]:
+            raise ImproperlyConfigured(
+                f"Database {self.alias!r} is pooled, set its CONN_MAX_AGE to 0."
+            )
+        with self._pools_lock:
+            if self._pool_key not in self._pools:
+                self._pools[self._pool_key] = ConnectionPool(
+                    kwargs=self.get_connection_params(),
+                    name=self.alias,
+                    check=ConnectionPool.check_connection,
+                    open=True,
+                    **self.settings_dict["OPTIONS"].get("pool", {}),
+                )
+            return self._pools[self._pool_key]
+
+    @classmethod
+    def close_pools(cls, database_name) -> None:
+        """Close the pools of every alias connected to database_name."""
+        with cls._pools_lock:
+            keys = [key for key in cls._pools if key[1] == database_name]
+            pools = [cls._pools.pop(key) for key in keys]
+        for pool in pools:
+            pool.close()
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        connection = pool.getconn()
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        if isolation_level is None:
+            self.isolation_level = IsolationLevel.READ_COMMITTED
+        else:
+            self.isolation_level = IsolationLevel(isolation_level)
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
+        # The connection belongs to the pool again.
+        self.connection = None
@@ -0,0 +1,9 @@
+from django.db.backends.postgresql import creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections, including those of test mirrors, would
+        # keep the database from being dropped.
+        self.connection.close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
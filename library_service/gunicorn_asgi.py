@@ -0,0 +1,14 @@
+"""Gunicorn configuration for the ASGI profile.
+
+One event loop per core is enough, since a worker no longer blocks on
+slow clients; sync WSGI deployments usually need 2 * cores + 1.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+keepalive = 5
+graceful_timeout = 30
+raw_env = ["DJANGO_ENV=asgi"]
@@ -0,0 +1,451 @@
+"""Per-view request metrics, exposed in the Prometheus text format.
+
+MetricsMiddleware records, for each view and action, request latency,
+database queries and time, serialization time, response rendering time
+and response size. Every thread aggregates into its own shard, so
+recording takes no lock; /metrics sums the shards when scraped. Metrics
+are per process: under several workers, each worker reports its own.
+
+With SLOW_REQUEST_SECONDS set, a SLOW_REQUEST_SAMPLE_RATE share of the
+requests also keep their SQL, and those that turn out slow are logged
+with it.
+"""
+import functools
+import hmac
+import logging
+import random
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.serializers import BaseSerializer
+
+from user.authentication import ClaimsJWTAuthentication
+
+logger = logging.getLogger("library_service.slow_requests")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Requests that did not resolve to a view share one label, so stray URLs
+# cannot grow the number of series.
+UNMATCHED = "unmatched"
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+
+
+class ViewMetrics:
+    __slots__ = (
+        "duration",
+        "queries",
+        "size",
+        "db_seconds",
+        "serialize_seconds",
+        "render_seconds",
+        "statuses",
+    )
+
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_seconds = 0.0
+        self.statuses = {}
+
+    def merge(self, other):
+        self.duration.merge(other.duration)
+        self.queries.merge(other.queries)
+        self.size.merge(other.size)
+        self.db_seconds += other.db_seconds
+        self.serialize_seconds += other.serialize_seconds
+        self.render_seconds += other.render_seconds
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+
+class Registry:
+    """View name -> ViewMetrics, sharded per thread.
+
+    The shards of threads that have exited are folded into one retired
+    shard, so a server that starts a thread per request does not grow the
+    list of shards without bound.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._shards_lock = threading.Lock()
+
+    def shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            # Taken once per thread, not per request.
+            with self._shards_lock:
+                self._retire_dead_shards()
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+            return shard
+
+    def _retire_dead_shards(self) -> None:
+        # A dead thread no longer writes to its shard, so it merges safely.
+        live = []
+        for thread, shard in self._shards:
+            alive = thread()
+            if alive is not None and alive.is_alive():
+                live.append((thread, shard))
+                continue
+            for name, metrics in shard.items():
+                self._retired.setdefault(name, ViewMetrics()).merge(metrics)
+        self._shards = live
+
+    def view(self, name) -> ViewMetrics:
+        shard = self.shard()
+        metrics = shard.get(name)
+        if metrics is None:
+            metrics = shard[name] = ViewMetrics()
+        return metrics
+
+    def collect(self) -> dict:
+        totals = {}
+        with self._shards_lock:
+            self._retire_dead_shards()
+            shards = [shard for _, shard in self._shards]
+            for name, metrics in self._retired.items():
+                totals.setdefault(name, ViewMetrics()).merge(metrics)
+        for shard in shards:
+            for name, metrics in list(shard.items()):
+                totals.setdefault(name, ViewMetrics()).merge(metrics)
+        return totals
+
+    def shard_count(self) -> int:
+        with self._shards_lock:
+            return len(self._shards)
+
+    def clear(self) -> None:
+        with self._shards_lock:
+            self._retired.clear()
+            for _, shard in self._shards:
+                shard.clear()
+
+
+registry = Registry()
+
+
+class RequestStats:
+    __slots__ = (
+        "view",
+        "queries",
+        "db_seconds",
+        "serialize_seconds",
+        "serializing",
+        "render_seconds",
+        "sql",
+    )
+
+    def __init__(self, keep_sql):
+        self.view = UNMATCHED
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.serializing = False
+        self.render_seconds = 0.0
+        self.sql = [] if keep_sql else None
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if stats.sql is not None:
+            stats.sql.append((elapsed, sql))
+
+
+def timed_serialization(data):
+    """Wrap a serializer's data getter to time it for the current request.
+
+    Serializers that read another serializer's data while serializing are
+    timed once, as part of the outer one.
+    """
+
+    @functools.wraps(data)
+    def timed(serializer):
+        stats = _current.get()
+        if stats is None or stats.serializing:
+            return data(serializer)
+
+        stats.serializing = True
+        start = time.perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            stats.serializing = False
+            stats.serialize_seconds += time.perf_counter() - start
+
+    return timed
+
+
+# Serializer.data and ListSerializer.data both go through BaseSerializer.data.
+BaseSerializer.data = property(timed_serialization(BaseSerializer.data.fget))
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Queries find the request they belong to through a context variable,
+    # which also reaches the threads async views run the ORM in.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def view_name(view_func, method: str) -> str:
+    """"BookViewSet.list" for a viewset action, the view's name otherwise."""
+    cls = getattr(view_func, "cls", None)
+    if cls is None:
+        return getattr(view_func, "__qualname__", type(view_func).__name__)
+    action = (getattr(view_func, "actions", None) or {}).get(method.lower())
+    return f"{cls.__name__}.{action}" if action else cls.__name__
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections opened before this module was loaded missed the signal.
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(sender=None, connection=connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        start, stats, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, start, stats)
+        return response
+
+    async def __acall__(self, request):
+        start, stats, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, start, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = _current.get()
+        if stats is not None:
+            stats.view = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        stats = _current.get()
+        if stats is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                stats.render_seconds += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def start():
+        keep_sql = (
+            settings.SLOW_REQUEST_SECONDS is not None
+            and random.random() < settings.SLOW_REQUEST_SAMPLE_RATE
+        )
+        stats = RequestStats(keep_sql)
+        return time.perf_counter(), stats, _current.set(stats)
+
+    @staticmethod
+    def finish(request, response, start, stats):
+        duration = time.perf_counter() - start
+
+        metrics = registry.view(stats.view)
+        metrics.duration.observe(duration)
+        metrics.queries.observe(stats.queries)
+        metrics.db_seconds += stats.db_seconds
+        metrics.serialize_seconds += stats.serialize_seconds
+        metrics.render_seconds += stats.render_seconds
+        metrics.statuses[response.status_code] = (
+            metrics.statuses.get(response.status_code, 0) + 1
+        )
+        if not response.streaming:
+            metrics.size.observe(len(response.content))
+
+        if stats.sql is not None and duration >= settings.SLOW_REQUEST_SECONDS:
+            logger.warning(
+                "Slow request %s %s (%s): %.3fs, %d queries in %.3fs\n%s",
+                request.method,
+                request.get_full_path(),
+                stats.view,
+                duration,
+                stats.queries,
+                stats.db_seconds,
+                "\n".join(
+                    f"  {elapsed * 1000:.1f}ms {sql}" for elapsed, sql in stats.sql
+                ),
+            )
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram(lines, name, help_text, histogram_of, totals):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for view, metrics in totals.items():
+        histogram = histogram_of(metrics)
+        label = f'view="{_label(view)}"'
+        cumulative = 0
+        for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{label}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{label}}} {cumulative}")
+
+
+def _counter(lines, name, help_text, value_of, totals):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for view, metrics in totals.items():
+        lines.append(f'{name}{{view="{_label(view)}"}} {value_of(metrics)}')
+
+
+def render_metrics() -> str:
+    """All recorded metrics in the Prometheus text exposition format."""
+    totals = registry.collect()
+    lines = []
+    _histogram(
+        lines,
+        "library_request_duration_seconds",
+        "Time from the request reaching the middleware to the response leaving it.",
+        lambda metrics: metrics.duration,
+        totals,
+    )
+    _histogram(
+        lines,
+        "library_request_db_queries",
+        "Database queries run per request.",
+        lambda metrics: metrics.queries,
+        totals,
+    )
+    _histogram(
+        lines,
+        "library_response_size_bytes",
+        "Size of non-streaming response bodies.",
+        lambda metrics: metrics.size,
+        totals,
+    )
+    _counter(
+        lines,
+        "library_db_seconds_total",
+        "Time spent running database queries.",
+        lambda metrics: metrics.db_seconds,
+        totals,
+    )
+    _counter(
+        lines,
+        "library_serialize_seconds_total",
+        "Time spent in serializer data, including the queries it runs.",
+        lambda metrics: metrics.serialize_seconds,
+        totals,
+    )
+    _counter(
+        lines,
+        "library_render_seconds_total",
+        "Time spent rendering response data to bytes.",
+        lambda metrics: metrics.render_seconds,
+        totals,
+    )
+
+    lines.append("# HELP library_responses_total Responses sent, by status code.")
+    lines.append("# TYPE library_responses_total counter")
+    for view, metrics in totals.items():
+        for status, count in sorted(metrics.statuses.items()):
+            lines.append(
+                f'library_responses_total{{view="{_label(view)}",status="{status}"}} '
+                f"{count}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def _is_scraper(request) -> bool:
+    token = settings.METRICS_TOKEN
+    if not token:
+        return False
+    return hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()
+    )
+
+
+def _is_staff(request) -> bool:
+    """Whether the session or the JWT of request belongs to a staff user.
+
+    The production profile may run without the session and auth middleware,
+    so request.user is not always set.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_staff:
+        return True
+    try:
+        authenticated = ClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, for METRICS_TOKEN bearers and staff only."""
+    if not (_is_scraper(request) or _is_staff(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
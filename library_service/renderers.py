@@ -0,0 +1,46 @@
+"""JSON rendering through orjson, when it is installed.
+
+The output is byte for byte what DRF's JSONRenderer gives for the data
+the API returns: compact, UTF-8, with U+2028 and U+2029 escaped, dates
+and datetimes formatted by DRF's encoder. Floats are the exception; in
+exponent notation orjson writes 1e16 where DRF writes 1e+16. Anything
+orjson cannot encode, and every non-default formatting request, is left
+to DRF's renderer.
+"""
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.encoder_class is not JSONEncoder
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            content = orjson.dumps(
+                data, default=self.encoder_class().default, option=OPTIONS
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # As DRF does, escape the separators JavaScript treats as newlines.
+        if b"\xe2\x80\xa8" in content or b"\xe2\x80\xa9" in content:
+            content = content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return content
@@ -0,0 +1,105 @@
+"""Read replica routing.
+
+Reads go to the primary unless a view opts in with ReplicaReadsMixin, and
+even then never inside a transaction: a transaction that writes must read
+its own rows. A user who wrote recently is pinned to the primary for
+REPLICA_PIN_SECONDS, longer than the replicas are expected to lag, so
+they see their own writes on the next request too. Pins are kept in the
+default cache, which every worker must share: the prod profile refuses
+to start with replicas and a per-process cache.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def reads_from_replica(enabled=True):
+    """Route the reads of the block to a replica, if any is configured."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def _pin_key(user_id) -> str:
+    return f"replicas:pin:{user_id}"
+
+
+def pin_to_primary(user) -> None:
+    if settings.DATABASE_REPLICAS and user.is_authenticated:
+        cache.set(_pin_key(user.id), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def pinned_to_primary(user) -> bool:
+    return user.is_authenticated and cache.get(_pin_key(user.id), False)
+
+
+async def apinned_to_primary(user) -> bool:
+    return user.is_authenticated and await cache.aget(_pin_key(user.id), False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            settings.DATABASE_REPLICAS
+            and _replica_reads.get()
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or Django would write back to where an instance was read.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadsMixin:
+    """Serve the safe requests of replica_actions from a read replica.
+
+    Successful writes pin the user to the primary.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def uses_replica(self) -> bool:
+        return (
+            bool(settings.DATABASE_REPLICAS)
+            and self.action in self.replica_actions
+            and self.request.method in SAFE_METHODS
+            and not pinned_to_primary(self.request.user)
+        )
+
+    async def auses_replica(self) -> bool:
+        return (
+            bool(settings.DATABASE_REPLICAS)
+            and self.action in self.replica_actions
+            and self.request.method in SAFE_METHODS
+            and not await apinned_to_primary(self.request.user)
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._replica_reads = _replica_reads.set(self.uses_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if hasattr(self, "_replica_reads"):
+            _replica_reads.reset(self._replica_reads)
+            del self._replica_reads
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
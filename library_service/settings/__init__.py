@@ -0,0 +1,25 @@
+"""Settings profiles, selected by the DJANGO_ENV environment variable.
+
+- dev (default): DEBUG, the debug toolbar and the full middleware stack.
+- prod: the JSON API behind a minimal middleware stack, served over WSGI.
+- asgi: prod served by an ASGI server, with async read views.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DJANGO_ENV = os.getenv("DJANGO_ENV", "dev")
+
+if DJANGO_ENV == "dev":
+    from library_service.settings.dev import *  # noqa: F401,F403
+elif DJANGO_ENV == "prod":
+    from library_service.settings.prod import *  # noqa: F401,F403
+elif DJANGO_ENV == "asgi":
+    from library_service.settings.asgi import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(
+        f"Unknown DJANGO_ENV {DJANGO_ENV!r}, expected dev, prod or asgi."
+    )
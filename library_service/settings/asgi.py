@@ -0,0 +1,15 @@
+"""Production profile served by an ASGI server.
+
+Run it with the bundled gunicorn configuration:
+
+    gunicorn library_service.asgi:application -c python:library_service.gunicorn_asgi
+"""
+from library_service.settings.prod import *  # noqa: F401,F403
+from library_service.settings.prod import DATABASES
+
+ROOT_URLCONF = "library_service.asgi_urls"
+ASGI_APPLICATION = "library_service.asgi.application"
+
+# Async ORM calls run in a shared thread whose connections Django cannot
+# recycle at request end, so do not keep them open between requests.
+DATABASES = {alias: {**db, "CONN_MAX_AGE": 0} for alias, db in DATABASES.items()}
@@ -0,0 +1,339 @@
+"""
+Django settings for library_service project, shared by every profile.
+
+Generated by 'django-admin startproject' using Django 5.0.1.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.0/ref/settings/
+"""
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from celery.schedules import crontab
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.getenv("SECRET_KEY")
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.getenv("ALLOWED_HOSTS", "").split(",") if host]
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    "django.contrib.admin",
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+    "rest_framework",
+    "drf_spectacular",
+    "django_filters",
+    "django_celery_results",
+    "books",
+    "user",
+    "borrowings",
+    "analytics",
+    "benchmarks",
+]
+
+MIDDLEWARE = [
+    "library_service.metrics.MetricsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+
+ROOT_URLCONF = "library_service.urls"
+
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": [],
+        "APP_DIRS": True,
+        "OPTIONS": {
+            "context_processors": [
+                "django.template.context_processors.debug",
+                "django.template.context_processors.request",
+                "django.contrib.auth.context_processors.auth",
+                "django.contrib.messages.context_processors.messages",
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = "library_service.wsgi.application"
+
+
+# Database
+# https://docs.djangoproject.com/en/5.0/ref/settings/#databases
+
+# PostgreSQL when POSTGRES_HOST is set, with a replica alias per host in
+# POSTGRES_REPLICA_HOSTS; SQLite otherwise.
+
+
+def _postgres(host):
+    return {
+        "ENGINE": "library_service.db.backends.postgresql",
+        "NAME": os.getenv("POSTGRES_DB", "library_service"),
+        "USER": os.getenv("POSTGRES_USER", "postgres"),
+        "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
+        "HOST": host,
+        "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        "OPTIONS": {
+            "pool": {
+                "min_size": int(os.getenv("POSTGRES_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.getenv("POSTGRES_POOL_MAX_SIZE", 10)),
+                "timeout": int(os.getenv("POSTGRES_POOL_TIMEOUT", 10)),
+            },
+        },
+    }
+
+
+if os.getenv("POSTGRES_HOST"):
+    DATABASES = {"default": _postgres(os.getenv("POSTGRES_HOST"))}
+    replica_hosts = os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",")
+    for index, host in enumerate(filter(None, replica_hosts), start=1):
+        DATABASES[f"replica_{index}"] = {
+            **_postgres(host),
+            "TEST": {"MIRROR": "default"},
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+        }
+    }
+
+# Aliases ReplicaRouter may send reads to.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith("replica_")]
+DATABASE_ROUTERS = ["library_service.replicas.ReplicaRouter"]
+
+# How long a user who wrote keeps reading from the primary; longer than
+# replication lag is expected to be.
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+if os.getenv("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+    }
+
+BOOKS_CACHE_ALIAS = "default"
+BOOKS_CACHE_TIMEOUT = 300
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.CommonPasswordValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
+    },
+]
+
+PASSWORD_HASHERS = [
+    "user.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# Cost of new password hashes; stored ones are rehashed to it on login.
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", 720_000))
+
+# Passwords are hashed on a pool of this many threads, or processes for
+# hashers holding the GIL, see user.hashing. 0 hashes on the request thread.
+PASSWORD_HASHING_POOL = os.getenv("PASSWORD_HASHING_POOL", "thread")
+PASSWORD_HASHING_WORKERS = int(
+    os.getenv("PASSWORD_HASHING_WORKERS") or os.cpu_count() or 1
+)
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.0/topics/i18n/
+
+LANGUAGE_CODE = "en-us"
+
+TIME_ZONE = "UTC"
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.0/howto/static-files/
+
+STATIC_URL = "static/"
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+AUTH_USER_MODEL = "user.User"
+
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": (
+        "user.authentication.ClaimsJWTAuthentication",
+    ),
+    "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
+    "DEFAULT_RENDERER_CLASSES": (
+        "library_service.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_THROTTLE_CLASSES": ("library_service.throttling.TokenBucketThrottle",),
+    # Per user, or client address when anonymous. A view's throttle_scope and
+    # action, e.g. "books.list", or its throttle_scope alone pick a rate;
+    # everything else shares "user" or "anon". THROTTLE_RATES overrides
+    # these, e.g. "token=10/min,books.list=2000/min".
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "120/min",
+        "user": "600/min",
+        "register": "10/hour",
+        "token": "20/min",
+        "token_refresh": "60/min",
+        "books.list": "1200/min",
+        "borrowings.list": "120/min",
+        "borrowings.export": "10/hour",
+        **dict(
+            rate.split("=", 1)
+            for rate in os.getenv("THROTTLE_RATES", "").split(",")
+            if rate
+        ),
+    },
+}
+
+# Token buckets are kept in Redis when a URL is set, otherwise in shared
+# memory, which only covers the processes of one node.
+THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "1") == "1"
+THROTTLE_REDIS_URL = os.getenv("THROTTLE_REDIS_URL") or os.getenv("REDIS_URL")
+THROTTLE_SHARED_MEMORY_PATH = os.getenv(
+    "THROTTLE_SHARED_MEMORY_PATH",
+    os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+        "library_service_throttle",
+    ),
+)
+THROTTLE_SLOTS = 65536
+
+# List actions serialize values_list() rows instead of model instances,
+# see library_service.fast_serializers.
+FAST_LIST_SERIALIZERS = os.getenv("FAST_LIST_SERIALIZERS", "1") == "1"
+
+SPECTACULAR_SETTINGS = {
+    "TITLE": "Your Project API",
+    "DESCRIPTION": "Your project description",
+    "VERSION": "1.0.0",
+    "SERVE_INCLUDE_SCHEMA": False,
+}
+
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "ROTATE_REFRESH_TOKENS": True,
+    "BLACKLIST_AFTER_ROTATION": True,
+    "AUTH_HEADER_NAME": "HTTP_AUTHORIZE",
+}
+
+# In-process cache of token versions used to revoke JWTs without a user
+# lookup per request; revocations reach other processes within the TTL.
+TOKEN_VERSION_CACHE_SIZE = 10_000
+TOKEN_VERSION_CACHE_TTL = 30
+
+# Revoked JWTs: a Bloom filter sized for this many live entries sits in
+# front of the RevokedToken table, synced and rebuilt at these intervals.
+TOKEN_BLACKLIST_BLOOM_CAPACITY = 1_000_000
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = 0.01
+TOKEN_BLACKLIST_SYNC_INTERVAL = 5
+TOKEN_BLACKLIST_REBUILD_INTERVAL = 3600
+# Ids below the highest one seen that each sync reads again, for rows that
+# committed after rows with higher ids.
+TOKEN_BLACKLIST_SYNC_OVERLAP = 1000
+
+# Request metrics served on /metrics to staff and to bearers of this token;
+# unset leaves it to staff only. A sample of requests keeps its SQL, to log
+# along with the request if it takes SLOW_REQUEST_SECONDS or longer; unset
+# disables the log.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+SLOW_REQUEST_SECONDS = os.getenv("SLOW_REQUEST_SECONDS")
+SLOW_REQUEST_SECONDS = float(SLOW_REQUEST_SECONDS) if SLOW_REQUEST_SECONDS else None
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", 0.1))
+
+MAX_ACTIVE_BORROWINGS_PER_USER = int(os.getenv("MAX_ACTIVE_BORROWINGS_PER_USER", 10))
+
+# Each day past the expected return date costs this many daily fees.
+FINE_MULTIPLIER = Decimal(os.getenv("FINE_MULTIPLIER", "2"))
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_RESULT_BACKEND = "django-db"
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    "scan-overdue-borrowings": {
+        "task": "borrowings.tasks.scan_overdue_borrowings",
+        "schedule": crontab(hour=8, minute=0),
+    },
+    "bill-previous-month": {
+        "task": "borrowings.tasks.bill_previous_month",
+        "schedule": crontab(day_of_month=1, hour=4, minute=0),
+    },
+    "roll-up-usage": {
+        "task": "analytics.tasks.roll_up_usage",
+        "schedule": crontab(hour=2, minute=0),
+    },
+    "purge-revoked-tokens": {
+        "task": "user.tasks.purge_revoked_tokens",
+        "schedule": crontab(hour=3, minute=0),
+    },
+}
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_ADMIN_CHAT_ID = os.getenv("TG_ADMIN_CHAT_ID")
+
+# Telegram allows roughly 30 messages per second per bot and 20 messages per
+# minute into a single group chat.
+TELEGRAM_GLOBAL_MIN_INTERVAL = 1 / 30
+TELEGRAM_CHAT_MIN_INTERVAL = 3.0
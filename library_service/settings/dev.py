@@ -0,0 +1,22 @@
+"""Development profile: DEBUG on, with the debug toolbar."""
+import os
+
+from library_service.settings.base import *  # noqa: F401,F403
+from library_service.settings.base import INSTALLED_APPS, MIDDLEWARE
+
+DEBUG = True
+
+# Off unless asked for, so local runs and the tests are never throttled.
+THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "0") == "1"
+
+INTERNAL_IPS = [
+    "127.0.0.1",
+]
+
+INSTALLED_APPS = [*INSTALLED_APPS, "debug_toolbar"]
+
+MIDDLEWARE = [*MIDDLEWARE]
+MIDDLEWARE.insert(
+    MIDDLEWARE.index("django.middleware.security.SecurityMiddleware") + 1,
+    "debug_toolbar.middleware.DebugToolbarMiddleware",
+)
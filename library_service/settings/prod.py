@@ -0,0 +1,97 @@
+"""Production profile for the JSON API.
+
+Requests authenticate with JWTs, so the session, CSRF and message
+middleware only cost time. They and the admin are left out unless
+ADMIN_ENABLED=1 is set.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from library_service.settings.base import *  # noqa: F401,F403
+from library_service.settings.base import (
+    BOOKS_CACHE_ALIAS,
+    CACHES,
+    DATABASE_REPLICAS,
+    DATABASES,
+    INSTALLED_APPS,
+    MIDDLEWARE,
+    REST_FRAMEWORK,
+    SECRET_KEY,
+    TEMPLATES,
+)
+
+if not SECRET_KEY:
+    raise ImproperlyConfigured("SECRET_KEY must be set in production.")
+
+# Writers pin reads to the primary through the cache; a per-process cache
+# would only pin them in the worker that took the write.
+PER_PROCESS_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+if DATABASE_REPLICAS and any(
+    CACHES[alias]["BACKEND"] in PER_PROCESS_CACHES
+    for alias in ("default", BOOKS_CACHE_ALIAS)
+):
+    raise ImproperlyConfigured(
+        "Read replicas need a cache shared by all workers; set REDIS_URL."
+    )
+
+DEBUG = False
+
+ADMIN_ENABLED = os.getenv("ADMIN_ENABLED", "") == "1"
+
+if not ADMIN_ENABLED:
+    INSTALLED_APPS = [
+        app
+        for app in INSTALLED_APPS
+        if app
+        not in (
+            "django.contrib.admin",
+            "django.contrib.sessions",
+            "django.contrib.messages",
+        )
+    ]
+    MIDDLEWARE = [
+        "library_service.metrics.MetricsMiddleware",
+        "django.middleware.security.SecurityMiddleware",
+        "django.middleware.common.CommonMiddleware",
+    ]
+
+# Pooled databases hand connections back at the end of a request; keep
+# the others open between requests, checking them before reuse.
+DATABASES = {
+    alias: db
+    if "pool" in db.get("OPTIONS", {})
+    else {
+        **db,
+        "CONN_MAX_AGE": int(os.getenv("CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+    }
+    for alias, db in DATABASES.items()
+}
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        "APP_DIRS": False,
+        "OPTIONS": {
+            **TEMPLATES[0]["OPTIONS"],
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                )
+            ],
+        },
+    }
+]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": ("library_service.renderers.FastJSONRenderer",),
+}
@@ -0,0 +1,191 @@
+"""Token-bucket throttling per scope and user, in a store shared by workers.
+
+Every scope has a rate of "N/period": a bucket of N tokens, refilled
+evenly over the period, per user, or per client address for anonymous
+requests. A request takes one token and is refused with 429 while the
+bucket is empty.
+
+Buckets live in Redis when THROTTLE_REDIS_URL is set, updated by one Lua
+script so concurrent workers cannot both take the last token. Without
+Redis they live in a memory-mapped file that every process on the node
+maps, each bucket updated under a lock on its own bytes. Either way a
+check is one round trip or a few microseconds, and no database query.
+"""
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+DURATIONS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+TAKE_SCRIPT = """
+redis.replicate_commands()
+local capacity = tonumber(ARGV[1])
+local per_second = tonumber(ARGV[2])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = capacity
+if bucket[1] then
+    local elapsed = math.max(now - tonumber(bucket[2]), 0)
+    tokens = math.min(capacity, tonumber(bucket[1]) + elapsed * per_second)
+end
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / per_second
+end
+redis.call("HMSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("PEXPIRE", KEYS[1], math.ceil(capacity / per_second * 1000))
+return tostring(wait)
+"""
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate: str) -> tuple[int, float]:
+    """(capacity, tokens per second) of a rate like "100/min"."""
+    count, period = rate.split("/")
+    count = int(count)
+    return count, count / DURATIONS[period[0]]
+
+
+class RedisBuckets:
+    """Token buckets in Redis, shared by every node using the server."""
+
+    def __init__(self, url):
+        import redis
+
+        self.errors = (redis.RedisError,)
+        self.take_script = redis.Redis.from_url(
+            url, socket_timeout=0.1, socket_connect_timeout=0.1
+        ).register_script(TAKE_SCRIPT)
+
+    def take(self, key: str, capacity: int, per_second: float) -> float:
+        """Take a token: 0 if there was one, else seconds until there is."""
+        try:
+            return float(
+                self.take_script(keys=[f"throttle:{key}"], args=[capacity, per_second])
+            )
+        except self.errors:
+            # An unreachable store lets requests through rather than fail them.
+            logger.warning("Throttle store unavailable", exc_info=True)
+            return 0.0
+
+
+class SharedMemoryBuckets:
+    """Token buckets in a file mapped by every process on this node.
+
+    Keys are hashed onto a fixed number of slots, so two keys may share a
+    bucket; with the default 65536 slots that is rare and only throttles
+    early. Each slot holds the tokens left and when that was computed.
+    """
+
+    slot = struct.Struct("dd")
+
+    def __init__(self, path, slots):
+        self.slots = slots
+        size = slots * self.slot.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+        # Record locks exclude other processes, not other threads.
+        self.lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, per_second: float) -> float:
+        """Take a token: 0 if there was one, else seconds until there is."""
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        offset = int.from_bytes(digest, "little") % self.slots * self.slot.size
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, self.slot.size, offset)
+            try:
+                tokens, updated = self.slot.unpack_from(self.map, offset)
+                now = time.time()
+                if updated:
+                    elapsed = max(now - updated, 0)
+                    tokens = min(capacity, tokens + elapsed * per_second)
+                else:
+                    tokens = capacity
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / per_second
+                if not wait:
+                    tokens -= 1
+                self.slot.pack_into(self.map, offset, tokens, now)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, self.slot.size, offset)
+        return wait
+
+
+_buckets = None
+
+
+def buckets():
+    global _buckets
+    if _buckets is None:
+        if settings.THROTTLE_REDIS_URL:
+            _buckets = RedisBuckets(settings.THROTTLE_REDIS_URL)
+        else:
+            _buckets = SharedMemoryBuckets(
+                settings.THROTTLE_SHARED_MEMORY_PATH, settings.THROTTLE_SLOTS
+            )
+    return _buckets
+
+
+@receiver(setting_changed)
+def reset_buckets(setting, **kwargs):
+    global _buckets
+    if setting.startswith("THROTTLE_"):
+        _buckets = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle each user, or anonymous client address, per scope.
+
+    The scope is the view's throttle_scope and action, such as
+    "books.list", when DEFAULT_THROTTLE_RATES has a rate for it, then
+    throttle_scope alone, then "user" or "anon".
+    """
+
+    wait_seconds = 0.0
+
+    def get_scope(self, request, view):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        scope = getattr(view, "throttle_scope", None)
+        action = getattr(view, "action", None)
+        if scope and action and f"{scope}.{action}" in rates:
+            return f"{scope}.{action}"
+        if scope in rates:
+            return scope
+        return "user" if request.user and request.user.is_authenticated else "anon"
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = self.get_ident(request)
+        self.wait_seconds = buckets().take(f"{scope}:{ident}", *parse_rate(rate))
+        return not self.wait_seconds
+
+    def wait(self):
+        return math.ceil(self.wait_seconds)
@@ -14,6 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.apps import apps
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import (
@@ -23,18 +24,20 @@ from drf_spectacular.views import (
 )
 from rest_framework import routers
 
+from analytics.urls import router as analytics_router
 from books.urls import router as book_router
 from borrowings.urls import router as borrowings_router
+from library_service.metrics import metrics_view
 
 router = routers.DefaultRouter()
 router.registry.extend(book_router.registry)
 router.registry.extend(borrowings_router.registry)
+router.registry.extend(analytics_router.registry)
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
-    path("__debug__/", include("debug_toolbar.urls")),
     path("api/", include(router.urls)),
     path("users/", include("user.urls", namespace="user")),
+    path("metrics", metrics_view, name="metrics"),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/schema/swagger/",
@@ -42,3 +45,9 @@ urlpatterns = [
         name="swagger-ui",
     ),
 ]
+
+if apps.is_installed("django.contrib.admin"):
+    urlpatterns.append(path("admin/", admin.site.urls))
+
+if apps.is_installed("debug_toolbar"):
+    urlpatterns.append(path("__debug__/", include("debug_toolbar.urls")))
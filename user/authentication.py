@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from user.blacklist import blacklist
+
+TOKEN_VERSION_CLAIM = "ver"
+
+
+class TokenVersionCache:
+    """Thread-safe LRU of user id -> current token version.
+
+    Entries expire after TOKEN_VERSION_CACHE_TTL seconds, so a revocation
+    made by another process is seen within that window. Inactive and
+    deleted users are cached as None.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        version = (
+            get_user_model()
+            .objects.filter(pk=user_id, is_active=True)
+            .values_list("token_version", flat=True)
+            .first()
+        )
+        with self._lock:
+            self._entries[user_id] = (now + settings.TOKEN_VERSION_CACHE_TTL, version)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > settings.TOKEN_VERSION_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        return version
+
+    def discard(self, user_id) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+token_versions = TokenVersionCache()
+
+
+def add_claims(token, user):
+    """Sign the fields ClaimsUser is built from into token."""
+    token["email"] = user.email
+    token["is_staff"] = user.is_staff
+    token[TOKEN_VERSION_CLAIM] = user.token_version
+    return token
+
+
+def revoke_tokens(user) -> None:
+    """Invalidate every token issued to user so far."""
+    get_user_model().objects.filter(pk=user.pk).update(
+        token_version=F("token_version") + 1
+    )
+    token_versions.discard(user.pk)
+
+
+class ClaimsUser(TokenUser):
+    """Request user built from the signed claims of an access token.
+
+    id, email and is_staff are read from the token. Any other attribute
+    loads the User row on first access.
+    """
+
+    def __str__(self):
+        return self.email
+
+    @cached_property
+    def email(self) -> str:
+        return self.token.get("email", "")
+
+    @cached_property
+    def token_version(self) -> int:
+        return self.token[TOKEN_VERSION_CLAIM]
+
+    @cached_property
+    def instance(self):
+        return get_user_model().objects.get(pk=self.id)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.instance, name)
+
+
+def full_user(user):
+    """The User instance behind request.user, loading it if needed."""
+    return user.instance if isinstance(user, ClaimsUser) else user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWT authentication that skips the per-request user lookup.
+
+    The user is rebuilt from token claims and checked against the cached
+    token version instead. Tokens issued without a version claim fall back
+    to the database lookup. Blacklisted access tokens are refused.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if blacklist.is_revoked(token[api_settings.JTI_CLAIM]):
+            raise InvalidToken(_("Token is blacklisted"))
+        return token
+
+    def get_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        user = ClaimsUser(validated_token)
+        if token_versions.get(user.id) != user.token_version:
+            raise AuthenticationFailed(
+                _("Token has been revoked"), code="token_revoked"
+            )
+        return user
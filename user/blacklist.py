@@ -0,0 +1,183 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from user.models import RevokedToken
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    Membership tests can return false positives at about error_rate once
+    capacity items were added, never false negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * step) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class TokenBlacklist:
+    """Revoked token JTIs, stored in RevokedToken behind a Bloom filter.
+
+    Revoking is a single INSERT on the unique jti index, which doubles as
+    the check that a refresh token is used only once. Lookups ask the
+    in-process Bloom filter first and only query the table on a hit.
+
+    The filter picks up rows revoked by other processes every
+    TOKEN_BLACKLIST_SYNC_INTERVAL seconds. Each sync reads the rows past
+    the highest id seen so far, less TOKEN_BLACKLIST_SYNC_OVERLAP ids: ids
+    are handed out before commit, so a row can become visible after rows
+    with higher ids were already read. The filter is rebuilt from the
+    unexpired rows every TOKEN_BLACKLIST_REBUILD_INTERVAL seconds so purged
+    JTIs drop out.
+    """
+
+    def __init__(self):
+        # Guards the filter. Only held to test or set bits and to swap in a
+        # new filter, never across a query.
+        self._lock = threading.Lock()
+        # Held by the thread bringing the filter up to date.
+        self._sync_lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bloom = None
+            self._watermark = 0
+            self._synced_at = self._built_at = 0.0
+            self._revoked_during_build = None
+
+    def revoke(self, token) -> bool:
+        """Blacklist token, returns False if it already was."""
+        jti = token[api_settings.JTI_CLAIM]
+        expires_at = datetime.fromtimestamp(token["exp"], tz=dt_timezone.utc)
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(
+                    jti=jti, expires_at=expires_at, expiry_bucket=expires_at.date()
+                )
+        except IntegrityError:
+            return False
+
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+            if self._revoked_during_build is not None:
+                self._revoked_during_build.append(jti)
+        return True
+
+    def is_revoked(self, jti: str) -> bool:
+        self._sync()
+        with self._lock:
+            maybe_revoked = jti in self._bloom
+        return maybe_revoked and RevokedToken.objects.filter(jti=jti).exists()
+
+    def purge(self, today=None) -> int:
+        """Delete revoked tokens that have expired, one expiry bucket at a time."""
+        today = today or timezone.now().date()
+        buckets = (
+            RevokedToken.objects.filter(expiry_bucket__lt=today)
+            .order_by("expiry_bucket")
+            .values_list("expiry_bucket", flat=True)
+            .distinct()
+        )
+        deleted = 0
+        for bucket in list(buckets):
+            deleted += RevokedToken.objects.filter(expiry_bucket=bucket).delete()[0]
+        return deleted
+
+    def _sync(self) -> None:
+        if not self._due():
+            return
+        # Other threads keep answering from the current filter meanwhile;
+        # only the very first build is waited for.
+        if not self._sync_lock.acquire(blocking=self._bloom is None):
+            return
+        try:
+            if not self._due():
+                return
+            now = time.monotonic()
+            if (
+                self._bloom is None
+                or now - self._built_at >= settings.TOKEN_BLACKLIST_REBUILD_INTERVAL
+                or self._bloom.count > self._bloom.capacity
+            ):
+                self._rebuild(now)
+            else:
+                self._catch_up(now)
+        finally:
+            self._sync_lock.release()
+
+    def _due(self) -> bool:
+        return (
+            self._bloom is None
+            or time.monotonic() - self._synced_at
+            >= settings.TOKEN_BLACKLIST_SYNC_INTERVAL
+        )
+
+    def _rebuild(self, now) -> None:
+        """Build a filter of the unexpired rows and swap it in."""
+        with self._lock:
+            self._revoked_during_build = []
+
+        rows = RevokedToken.objects.filter(expiry_bucket__gte=timezone.now().date())
+        capacity = max(settings.TOKEN_BLACKLIST_BLOOM_CAPACITY, 2 * rows.count())
+        bloom = BloomFilter(capacity, settings.TOKEN_BLACKLIST_BLOOM_ERROR_RATE)
+        watermark = 0
+        for pk, jti in rows.values_list("pk", "jti").iterator():
+            bloom.add(jti)
+            watermark = max(watermark, pk)
+
+        with self._lock:
+            for jti in self._revoked_during_build:
+                bloom.add(jti)
+            self._revoked_during_build = None
+            self._bloom, self._watermark = bloom, watermark
+            self._synced_at = self._built_at = now
+
+    def _catch_up(self, now) -> None:
+        """Add the rows revoked since the last sync to the current filter."""
+        floor = self._watermark - settings.TOKEN_BLACKLIST_SYNC_OVERLAP
+        rows = list(
+            RevokedToken.objects.filter(pk__gt=floor).values_list("pk", "jti")
+        )
+        with self._lock:
+            for pk, jti in rows:
+                # Rows in the overlap were mostly added already; adding them
+                # again would count towards the capacity twice.
+                if jti not in self._bloom:
+                    self._bloom.add(jti)
+                self._watermark = max(self._watermark, pk)
+            self._synced_at = now
+
+blacklist = TokenBlacklist()
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 at PASSWORD_HASH_ITERATIONS.
+
+    Passwords stored at another cost are rehashed at this one on login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
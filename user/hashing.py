@@ -0,0 +1,89 @@
+"""Password hashing on a bounded pool instead of the request thread.
+
+Hashing is slow on purpose. Inline, every sign-up and login holds a WSGI
+worker's CPU for the whole hash, or an ASGI event loop if called from it.
+Here at most PASSWORD_HASHING_WORKERS hashes run at once. The rest wait in
+the pool's queue while other requests keep being served. PBKDF2 and Argon2
+release the GIL, so a thread pool hashes in parallel. Hashers that hold it
+need PASSWORD_HASHING_POOL = "process". With no workers, passwords are
+hashed inline.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+_pool = None
+_lock = threading.Lock()
+
+
+def pool():
+    """The hashing pool, started on first use; None to hash inline."""
+    global _pool
+    if not settings.PASSWORD_HASHING_WORKERS:
+        return None
+    with _lock:
+        if _pool is None:
+            if settings.PASSWORD_HASHING_POOL == "process":
+                _pool = ProcessPoolExecutor(
+                    settings.PASSWORD_HASHING_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=django.setup,
+                )
+            else:
+                _pool = ThreadPoolExecutor(
+                    settings.PASSWORD_HASHING_WORKERS,
+                    thread_name_prefix="password-hashing",
+                )
+        return _pool
+
+
+@receiver(setting_changed)
+def reset_pool(setting, **kwargs):
+    global _pool
+    if setting.startswith("PASSWORD_HASHING_"):
+        with _lock:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = None
+
+
+def run(function, *args):
+    executor = pool()
+    if executor is None:
+        return function(*args)
+    return executor.submit(function, *args).result()
+
+
+async def arun(function, *args):
+    executor = pool()
+    if executor is None:
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+    return await asyncio.wrap_future(executor.submit(function, *args))
+
+
+def make_password(password) -> str:
+    if password is None:
+        return hashers.make_password(None)
+    return run(hashers.make_password, password)
+
+
+def verify_password(password, encoded) -> tuple[bool, bool]:
+    """Whether password matches encoded, and whether to rehash it."""
+    return run(hashers.verify_password, password, encoded)
+
+
+async def amake_password(password) -> str:
+    if password is None:
+        return hashers.make_password(None)
+    return await arun(hashers.make_password, password)
+
+
+async def averify_password(password, encoded) -> tuple[bool, bool]:
+    return await arun(hashers.verify_password, password, encoded)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user.blacklist import blacklist
+
+
+class Command(BaseCommand):
+    help = "Delete blacklisted tokens that have expired."
+
+    def handle(self, *args, **options):
+        deleted = blacklist.purge()
+        self.stdout.write(f"Purged {deleted} expired revoked tokens.")
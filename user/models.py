@@ -1,8 +1,15 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
 from django.db import models
+from django.db.models import Case, F, When
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 
+from user import hashing
+
 
 class UserManager(BaseUserManager):
     """Define a model manager for User model with no username field."""
@@ -37,19 +44,147 @@ class UserManager(BaseUserManager):
 
         return self._create_user(email, password, **extra_fields)
 
+    def take_borrowing_slots(self, user_id, count: int = 1) -> bool:
+        """Count count more active borrowings, returns False if over the limit."""
+        limit = settings.MAX_ACTIVE_BORROWINGS_PER_USER
+        return bool(
+            self.filter(pk=user_id, active_borrowings__lte=limit - count).update(
+                active_borrowings=F("active_borrowings") + count
+            )
+        )
+
+    def add_borrowing_slots(self, counts: dict[int, int]) -> None:
+        """Count counts[user_id] more active borrowings in one UPDATE.
+
+        Unconditional: the caller has checked the limit on locked rows.
+        """
+        by_count = defaultdict(list)
+        for user_id, count in counts.items():
+            if count:
+                by_count[count].append(user_id)
+        if not by_count:
+            return
+
+        self.filter(pk__in=[pk for pks in by_count.values() for pk in pks]).update(
+            active_borrowings=Case(
+                *(
+                    When(pk__in=pks, then=F("active_borrowings") + count)
+                    for count, pks in by_count.items()
+                ),
+                default=F("active_borrowings"),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+
+    def release_borrowing_slots(self, counts: dict[int, int]) -> None:
+        """Count counts[user_id] fewer active borrowings in one UPDATE."""
+        by_count = defaultdict(list)
+        for user_id, count in counts.items():
+            if count:
+                by_count[count].append(user_id)
+        if not by_count:
+            return
+
+        self.filter(pk__in=[pk for pks in by_count.values() for pk in pks]).update(
+            active_borrowings=Case(
+                *(
+                    # Never below zero, even if the counter has drifted.
+                    When(pk__in=pks, then=Greatest(F("active_borrowings") - count, 0))
+                    for count, pks in by_count.items()
+                ),
+                default=F("active_borrowings"),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+
+
+# Signed into every JWT, so changing one revokes the tokens issued so far.
+CLAIM_FIELDS = ("email", "is_staff", "is_active")
+
 
 class User(AbstractUser):
     username = None
     email = models.EmailField(_("email address"), unique=True)
+    # Borrowings not yet returned, kept in step by the borrowing services and
+    # repaired by the reconcile_borrowing_counters command.
+    active_borrowings = models.PositiveIntegerField(default=0, editable=False)
+    # Signed into every JWT; bumping it revokes the tokens issued so far.
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+    # Where the user is told a held book was lent to them.
+    telegram_chat_id = models.CharField(max_length=64, blank=True)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
     objects = UserManager()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user._saved_claims = user.claims()
+        return user
+
+    def claims(self) -> dict:
+        """The loaded values of CLAIM_FIELDS; deferred ones are left out."""
+        return {
+            name: self.__dict__[name] for name in CLAIM_FIELDS if name in self.__dict__
+        }
+
+    def save(self, *args, **kwargs):
+        saved = getattr(self, "_saved_claims", {})
+        changed = any(
+            self.__dict__.get(name) != value for name, value in saved.items()
+        )
+        super().save(*args, **kwargs)
+        if changed:
+            from user.authentication import revoke_tokens
+
+            revoke_tokens(self)
+            self.refresh_from_db(fields=["token_version"])
+        self._saved_claims = self.claims()
+
     @property
     def full_name(self):
         return self.get_full_name()
 
+    @property
+    def free_borrowing_slots(self) -> int:
+        return max(settings.MAX_ACTIVE_BORROWINGS_PER_USER - self.active_borrowings, 0)
+
+    # Passwords are hashed on the pool of user.hashing. A password stored at
+    # another cost than the configured one is rehashed on a successful check.
+
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        valid, must_update = hashing.verify_password(raw_password, self.password)
+        if valid and must_update:
+            self.password = hashing.make_password(raw_password)
+            self.save(update_fields=["password"])
+        return valid
+
+    async def acheck_password(self, raw_password):
+        valid, must_update = await hashing.averify_password(
+            raw_password, self.password
+        )
+        if valid and must_update:
+            self.password = await hashing.amake_password(raw_password)
+            await self.asave(update_fields=["password"])
+        return valid
+
     def __str__(self):
         return self.email
+
+
+class RevokedToken(models.Model):
+    """JTI of a token that must no longer be accepted.
+
+    Rows are partitioned by expiry day so purging expired ones deletes
+    whole buckets through an index instead of scanning the table.
+    """
+
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField()
+    expiry_bucket = models.DateField(db_index=True)
@@ -1,13 +1,78 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import InvalidToken
 from rest_framework_simplejwt.serializers import (
     TokenObtainPairSerializer as JwtTokenObtainPairSerializer,
+    TokenRefreshSerializer as JwtTokenRefreshSerializer,
 )
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from user.authentication import (
+    TOKEN_VERSION_CLAIM,
+    add_claims,
+    revoke_tokens,
+)
+from user.blacklist import blacklist
 
 
 class TokenObtainPairSerializer(JwtTokenObtainPairSerializer):
     username_field = get_user_model().USERNAME_FIELD
 
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+
+class TokenRefreshSerializer(JwtTokenRefreshSerializer):
+    """Refresh that blacklists the presented token when rotating it.
+
+    The blacklist insert fails for a token used before, so a replayed
+    refresh token is refused without any lookup. The claims of the new
+    tokens are read from the user row, not copied from the old token, so
+    a change made by a queryset update is picked up on the next refresh.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+
+        if TOKEN_VERSION_CLAIM in refresh:
+            user = (
+                get_user_model()
+                .objects.filter(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True)
+                .only("email", "is_staff", "token_version")
+                .first()
+            )
+            if user is None or user.token_version != refresh[TOKEN_VERSION_CLAIM]:
+                raise InvalidToken(_("Token has been revoked"))
+            add_claims(refresh, user)
+
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            if not blacklist.revoke(refresh):
+                raise InvalidToken(_("Token is blacklisted"))
+
+        data = {"access": str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+        return data
+
+
+class TokenBlacklistSerializer(serializers.Serializer):
+    """Log out: blacklist the refresh token and, if given, the access token."""
+
+    refresh = serializers.CharField(write_only=True)
+    access = serializers.CharField(write_only=True, required=False)
+
+    def validate(self, attrs):
+        blacklist.revoke(RefreshToken(attrs["refresh"]))
+        if "access" in attrs:
+            blacklist.revoke(AccessToken(attrs["access"]))
+        return {}
+
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
@@ -16,13 +81,18 @@ class UserSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = get_user_model()
-        fields = ("id", "email", "first_name", "last_name", "password")
+        fields = (
+            "id",
+            "email",
+            "first_name",
+            "last_name",
+            "password",
+            "telegram_chat_id",
+        )
 
     def create(self, validated_data):
-        user = super().create(validated_data)
-        user.set_password(validated_data["password"])
-        user.save()
-        return user
+        """Insert the user with the password already hashed, in one write."""
+        return get_user_model().objects.create_user(**validated_data)
 
     def update(self, instance, validated_data):
         password = validated_data.pop("password", None)
@@ -34,6 +104,8 @@ class UserSerializer(serializers.ModelSerializer):
             instance.set_password(password)
 
         instance.save()
+        if password:
+            revoke_tokens(instance)
         return instance
 
 
@@ -44,4 +116,13 @@ class UserDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = get_user_model()
-        fields = ("id", "email", "first_name", "last_name", "password", "is_staff")
+        fields = (
+            "id",
+            "email",
+            "first_name",
+            "last_name",
+            "password",
+            "is_staff",
+            "active_borrowings",
+            "telegram_chat_id",
+        )
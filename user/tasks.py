@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from user.blacklist import blacklist
+
+
+@shared_task
+def purge_revoked_tokens():
+    return blacklist.purge()
@@ -1,3 +1,438 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model, hashers
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from books.cache import get_cache
+from user import hashing
+from user.authentication import token_versions
+from user.blacklist import BloomFilter, blacklist
+from user.models import RevokedToken
+
+BOOKS_URL = reverse("books-list")
+REGISTER_URL = reverse("user:register_user")
+TOKEN_URL = reverse("user:token_obtain_pair")
+REFRESH_URL = reverse("user:token_refresh")
+BLACKLIST_URL = reverse("user:token_blacklist")
+ME_URL = reverse("user:me")
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        token_versions.clear()
+        blacklist.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "claims@test.com", "testpassword", first_name="Claims"
+        )
+
+    def login(self, password="testpassword"):
+        res = self.client.post(
+            TOKEN_URL, {"email": self.user.email, "password": password}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZE=f"Bearer {res.data['access']}")
+        return AccessToken(res.data["access"])
+
+    def test_token_carries_claims(self):
+        token = self.login()
+
+        self.assertEqual(token["email"], "claims@test.com")
+        self.assertIs(token["is_staff"], False)
+        self.assertEqual(token["ver"], 0)
+
+    def test_version_is_checked_once_per_ttl(self):
+        self.login()
+        # Blacklist filter build (count and load), token version and the
+        # (empty) catalogue count.
+        with self.assertNumQueries(4):
+            self.client.get(BOOKS_URL)
+
+        # The page and the token version are cached; the user is never loaded.
+        with self.assertNumQueries(0):
+            res = self.client.get(BOOKS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_full_user_loads_lazily(self):
+        self.login()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["first_name"], "Claims")
+
+    def test_password_change_revokes_tokens(self):
+        self.login()
+
+        res = self.client.patch(ME_URL, {"password": "newpassword"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.login(password="newpassword")
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+    def test_demotion_revokes_tokens(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.login()
+        refresh = self.client.post(
+            TOKEN_URL, {"email": self.user.email, "password": "testpassword"}
+        ).data["refresh"]
+
+        self.user.is_staff = False
+        self.user.save()
+
+        self.assertEqual(
+            self.client.post(BOOKS_URL, {}).status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+        res = self.client.post(REFRESH_URL, {"refresh": refresh})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_reads_claims_from_the_user(self):
+        self.user.is_staff = True
+        self.user.save()
+        refresh = self.client.post(
+            TOKEN_URL, {"email": self.user.email, "password": "testpassword"}
+        ).data["refresh"]
+        # A queryset update bypasses save() and leaves the version alone.
+        get_user_model().objects.filter(pk=self.user.pk).update(is_staff=False)
+
+        res = self.client.post(REFRESH_URL, {"refresh": refresh})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIs(AccessToken(res.data["access"])["is_staff"], False)
+        self.client.credentials(HTTP_AUTHORIZE=f"Bearer {res.data['access']}")
+        self.assertEqual(
+            self.client.post(BOOKS_URL, {}).status_code, status.HTTP_403_FORBIDDEN
+        )
+
+        res = self.client.post(REFRESH_URL, {"refresh": res.data["refresh"]})
+        self.assertIs(AccessToken(res.data["access"])["is_staff"], False)
+
+    def test_inactive_user_is_rejected(self):
+        self.login()
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        token_versions.clear()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_without_version_falls_back_to_lookup(self):
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZE=f"Bearer {token}")
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], "claims@test.com")
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        token_versions.clear()
+        blacklist.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "blacklist@test.com", "testpassword"
+        )
+        res = self.client.post(
+            TOKEN_URL, {"email": self.user.email, "password": "testpassword"}
+        )
+        self.access, self.refresh = res.data["access"], res.data["refresh"]
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        res = self.client.post(REFRESH_URL, {"refresh": self.refresh})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data["refresh"], self.refresh)
+
+        res = self.client.post(REFRESH_URL, {"refresh": self.refresh})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = self.client.post(REFRESH_URL, {"refresh": res.data.get("refresh", "")})
+        self.assertNotEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_refresh_queries_do_not_grow_with_blacklist(self):
+        expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+        RevokedToken.objects.bulk_create(
+            RevokedToken(
+                jti=f"seed{i}", expires_at=expires_at, expiry_bucket=expires_at.date()
+            )
+            for i in range(1000)
+        )
+
+        # Version lookup, then savepoint, insert and release for the blacklist.
+        with self.assertNumQueries(4):
+            res = self.client.post(REFRESH_URL, {"refresh": self.refresh})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_logout_blacklists_refresh_and_access_tokens(self):
+        res = self.client.post(
+            BLACKLIST_URL, {"refresh": self.refresh, "access": self.access}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.client.credentials(HTTP_AUTHORIZE=f"Bearer {self.access}")
+        self.assertEqual(
+            self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        res = self.client.post(REFRESH_URL, {"refresh": self.refresh})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_purge_deletes_expired_buckets_only(self):
+        today = date.today()
+        for days in (-2, -1, 0, 1):
+            day = today + timedelta(days=days)
+            RevokedToken.objects.create(
+                jti=f"jti{days}",
+                expires_at=datetime.combine(day, datetime.min.time(), timezone.utc),
+                expiry_bucket=day,
+            )
+
+        self.assertEqual(blacklist.purge(today), 2)
+        self.assertEqual(
+            sorted(RevokedToken.objects.values_list("jti", flat=True)),
+            ["jti0", "jti1"],
+        )
+
+    def test_rebuild_does_not_block_lookups(self):
+        self.assertFalse(blacklist.is_revoked("built"))
+        answered = []
+
+        def build(*args):
+            # Look up from another thread while the rebuild is underway.
+            lookup = threading.Thread(
+                target=lambda: answered.append(blacklist.is_revoked("other"))
+            )
+            lookup.start()
+            lookup.join(timeout=5)
+            return BloomFilter(*args)
+
+        with override_settings(
+            TOKEN_BLACKLIST_SYNC_INTERVAL=0, TOKEN_BLACKLIST_REBUILD_INTERVAL=0
+        ), mock.patch("user.blacklist.BloomFilter", side_effect=build):
+            blacklist.is_revoked("rebuilt")
+
+        self.assertEqual(answered, [False])
+
+    def test_sync_sees_rows_committed_out_of_order(self):
+        expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+
+        def revoked(pk):
+            return RevokedToken.objects.create(
+                pk=pk,
+                jti=f"late{pk}",
+                expires_at=expires_at,
+                expiry_bucket=expires_at.date(),
+            )
+
+        revoked(1000)
+        self.assertFalse(blacklist.is_revoked("unknown"))
+        revoked(1002)
+        with override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0):
+            self.assertTrue(blacklist.is_revoked("late1002"))
+            # Took id 1001 first, but committed after 1002 was read.
+            revoked(1001)
+            self.assertTrue(blacklist.is_revoked("late1001"))
+
+
+class BloomFilterTests(TestCase):
+    def test_no_false_negatives_and_few_false_positives(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"in{i}")
+
+        self.assertTrue(all(f"in{i}" in bloom for i in range(1000)))
+        false_positives = sum(f"out{i}" in bloom for i in range(10_000))
+        self.assertLess(false_positives, 300)
+
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_registration_inserts_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                REGISTER_URL, {"email": "new@test.com", "password": "Str0ng-pass"}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        writes = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith(("INSERT", "UPDATE"))
+        ]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith("INSERT"))
+        user = get_user_model().objects.get(email="new@test.com")
+        self.assertTrue(user.check_password("Str0ng-pass"))
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_login_rehashes_at_configured_cost(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=500):
+            user = get_user_model().objects.create_user("old@test.com", "password")
+        self.assertIn("$500$", user.password)
+
+        response = self.client.post(
+            TOKEN_URL, {"email": "old@test.com", "password": "password"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertIn("$1000$", user.password)
+        self.assertTrue(user.check_password("password"))
+
+    def test_wrong_password_is_not_rehashed(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=500):
+            user = get_user_model().objects.create_user("old@test.com", "password")
+
+        response = self.client.post(
+            TOKEN_URL, {"email": "old@test.com", "password": "wrong"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        user.refresh_from_db()
+        self.assertIn("$500$", user.password)
+
+    @override_settings(PASSWORD_HASHING_WORKERS=2)
+    def test_hashes_on_the_pool(self):
+        threads = []
+        original = hashers.make_password
+
+        def make_password(password):
+            threads.append(threading.current_thread().name)
+            return original(password)
+
+        with mock.patch.object(hashing.hashers, "make_password", make_password):
+            encoded = hashing.make_password("password")
+
+        self.assertTrue(threads[0].startswith("password-hashing"))
+        self.assertEqual(hashing.verify_password("password", encoded), (True, False))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=0)
+    def test_no_workers_hashes_inline(self):
+        self.assertIsNone(hashing.pool())
+        encoded = hashing.make_password("password")
+
+        self.assertTrue(hashers.check_password("password", encoded))
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_async_check_rehashes(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=500):
+            user = get_user_model().objects.create_user("old@test.com", "password")
+
+        self.assertTrue(async_to_sync(user.acheck_password)("password"))
+
+        user.refresh_from_db()
+        self.assertIn("$1000$", user.password)
+
+
+class ThrottleTests(TestCase):
+    rates = {
+        "anon": "100/min",
+        "user": "100/min",
+        "token": "3/min",
+        "books.list": "2/min",
+    }
+
+    def setUp(self):
+        get_cache().clear()
+        settings_override = override_settings(
+            THROTTLE_ENABLED=True,
+            THROTTLE_REDIS_URL=None,
+            THROTTLE_SHARED_MEMORY_PATH=os.path.join(tempfile.mkdtemp(), "throttle"),
+            REST_FRAMEWORK={
+                **settings.REST_FRAMEWORK,
+                "DEFAULT_THROTTLE_RATES": self.rates,
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+
+    def login(self, email):
+        user = get_user_model().objects.create_user(email, "testpassword")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZE=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    @mock.patch("library_service.throttling.time")
+    def test_token_refused_with_retry_after_once_bucket_empty(self, clock):
+        clock.time.return_value = 1000.0
+        for _ in range(3):
+            res = self.client.post(
+                TOKEN_URL, {"email": "nobody@test.com", "password": "wrong"}
+            )
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = self.client.post(
+            TOKEN_URL, {"email": "nobody@test.com", "password": "wrong"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "20")
+
+    @mock.patch("library_service.throttling.time")
+    def test_buckets_are_per_user(self, clock):
+        clock.time.return_value = 1000.0
+        first = self.login("first@test.com")
+        second = self.login("second@test.com")
+        for _ in range(2):
+            self.assertEqual(first.get(BOOKS_URL).status_code, status.HTTP_200_OK)
+
+        res = first.get(BOOKS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "30")
+        self.assertEqual(second.get(BOOKS_URL).status_code, status.HTTP_200_OK)
+
+    def test_buckets_are_per_scope(self):
+        client = self.login("scopes@test.com")
+        for _ in range(2):
+            client.get(BOOKS_URL)
+        self.assertEqual(
+            client.get(BOOKS_URL).status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+
+        self.assertEqual(client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+    def test_bucket_refills_over_the_period(self):
+        client = self.login("refill@test.com")
+        with mock.patch("library_service.throttling.time") as clock:
+            clock.time.return_value = 1000.0
+            for _ in range(2):
+                client.get(BOOKS_URL)
+            self.assertEqual(
+                client.get(BOOKS_URL).status_code,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+
+            clock.time.return_value = 1030.0
+            self.assertEqual(client.get(BOOKS_URL).status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                client.get(BOOKS_URL).status_code,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        client = self.login("disabled@test.com")
+
+        for _ in range(5):
+            self.assertEqual(client.get(BOOKS_URL).status_code, status.HTTP_200_OK)
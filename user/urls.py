@@ -1,12 +1,18 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
 
-from user.views import RegisterView, EmailTokenObtainPairView, UserDetailView
+from user.views import (
+    RegisterView,
+    EmailTokenObtainPairView,
+    TokenRefreshView,
+    TokenBlacklistView,
+    UserDetailView,
+)
 
 urlpatterns = [
     path("register/", RegisterView.as_view(), name="register_user"),
     path("token/", EmailTokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("token/blacklist/", TokenBlacklistView.as_view(), name="token_blacklist"),
     path("me/", UserDetailView.as_view(), name="me"),
 ]
 
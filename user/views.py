@@ -3,11 +3,18 @@ from rest_framework.generics import CreateAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status, generics
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import (
+    TokenBlacklistView as JwtTokenBlacklistView,
+    TokenObtainPairView,
+    TokenRefreshView as JwtTokenRefreshView,
+)
 
+from .authentication import full_user
 from .serializers import (
     UserSerializer,
     TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+    TokenBlacklistSerializer,
     UserDetailSerializer,
 )
 
@@ -15,6 +22,7 @@ from .serializers import (
 class RegisterView(CreateAPIView):
     serializer_class = UserSerializer
     queryset = get_user_model().objects.all()
+    throttle_scope = "register"
 
     def create(self, request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
@@ -25,14 +33,26 @@ class RegisterView(CreateAPIView):
 
 class EmailTokenObtainPairView(TokenObtainPairView):
     serializer_class = TokenObtainPairSerializer
+    throttle_scope = "token"
+
+
+class TokenRefreshView(JwtTokenRefreshView):
+    serializer_class = TokenRefreshSerializer
+    throttle_scope = "token_refresh"
+
+
+class TokenBlacklistView(JwtTokenBlacklistView):
+    serializer_class = TokenBlacklistSerializer
+    throttle_scope = "token_blacklist"
 
 
 class UserDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = UserDetailSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "me"
 
     def get_object(self):
-        return self.request.user
+        return full_user(self.request.user)
 
     def get_serializer_class(self):
         if self.request.method == "GET":